@@ -0,0 +1,53 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Benchmark: geo2grid
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+# Compares the single point geo2grid (one Python call per point, as the callers did before geo2grid_array)
+# with the vectorized geo2grid_array, for 1e3, 1e5 and 1e7 random points over the GOES-16 disk. The single
+# point version is timed on at most "scalar_max" points and extrapolated beyond that (marked "est."). No
+# downloads: the ABI fixed grid (x / y scale and offset of the full disk) is created in memory.
+#-----------------------------------------------------------------------------------------------------------
+# Required modules
+import time as t                                 # Time access and conversion
+import numpy as np                               # Import the Numpy package
+from netCDF4 import Dataset                      # Read / Write NetCDF4 files
+from utilities_goes import geo2grid              # Our function for lat / lon to line / column (single point)
+from utilities_goes import geo2grid_array        # Our function for lat / lon to line / column (arrays)
+#-----------------------------------------------------------------------------------------------------------
+# Number of points and maximum number of points of the single point version
+sizes = [10**3, 10**5, 10**7]
+scalar_max = 10**5
+
+# GOES-16 full disk fixed grid (5424 x 5424, 2 km)
+nc = Dataset('fixed_grid.nc', 'w', diskless=True)
+nc.createDimension('x', 5424); nc.createDimension('y', 5424)
+x = nc.createVariable('x', 'i2', ('x',)); x.scale_factor = np.float32(5.6e-05); x.add_offset = np.float32(-0.151844)
+y = nc.createVariable('y', 'i2', ('y',)); y.scale_factor = np.float32(-5.6e-05); y.add_offset = np.float32(0.151844)
+
+rng = np.random.default_rng(0)
+print(f'{"points":>10} {"geo2grid (s)":>16} {"geo2grid_array (s)":>20} {"speedup":>10}')
+for size in sizes:
+
+    # Random points over the disk (some of them off-disk)
+    lats = rng.uniform(-75.0, 75.0, size)
+    lons = rng.uniform(-150.0, 0.0, size)
+
+    # Vectorized
+    start = t.perf_counter()
+    lines, cols, valid = geo2grid_array(lats, lons, nc)
+    vector_time = t.perf_counter() - start
+
+    # Single point (Python loop)
+    n = min(size, scalar_max)
+    start = t.perf_counter()
+    points = [geo2grid(lat, lon, nc) for lat, lon in zip(lats[:n], lons[:n])]
+    scalar_time = (t.perf_counter() - start) * size / n
+
+    # Same lines and columns for the valid points
+    points = np.array(points)
+    assert np.array_equal(points[valid[:n]], np.column_stack((lines[:n], cols[:n]))[valid[:n]])
+
+    estimated = ' est.' if n < size else ''
+    print(f'{size:>10.0e} {scalar_time:>11.3f}{estimated:>5} {vector_time:>20.3f} {scalar_time / vector_time:>9.0f}x')
+
+nc.close()
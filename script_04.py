@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt           # Plotting library
 from datetime import datetime, timedelta  # Basic date and time types
 import cartopy, cartopy.crs as ccrs       # Plot maps
 import cartopy.feature as cfeature        # Common drawing and filtering operations
+from utilities_basemap import add_basemap # Our function for basemap layers (rendered once, cached)
 import numpy as np                        # Import the Numpy package
 #---------------------------------------------------------------------------------------------------------------------------
 # Open the file using the NetCDF4 library
@@ -26,11 +27,10 @@ ax = plt.axes(projection=ccrs.Mercator(central_longitude=0.0))
 ax.set_global()
 
 # Add a background map
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 30), ylocs=np.arange(-90, 90, 10), draw_labels=False)
 
 # Plot the image
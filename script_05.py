@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt           # Plotting library
 from datetime import datetime, timedelta  # Basic date and time types
 import cartopy, cartopy.crs as ccrs       # Plot maps
 import cartopy.feature as cfeature        # Common drawing and filtering operations
+from utilities_basemap import add_basemap # Our function for basemap layers (rendered once, cached)
 import numpy as np                        # Import the Numpy package
 import matplotlib.colors                  # Matplotlib colors  
 #---------------------------------------------------------------------------------------------------------------------------
@@ -31,8 +32,7 @@ ax = plt.axes(projection=ccrs.PlateCarree())
 img_extent = [lons.min(), lons.max(), lats.min(), lats.max()]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 30), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -51,7 +51,7 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a land mask
-ax.add_feature(cfeature.LAND)
+add_basemap(ax, ('land', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
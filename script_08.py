@@ -8,7 +8,10 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 #---------------------------------------------------------------------------------------------------------------------------
@@ -44,8 +47,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -62,17 +64,17 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a background map
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('Metareas.shp').geometries())
+shapefile = shape_geometries('Metareas.zip', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='black',facecolor='none', linewidth=1.0)
 
 # Add a colorbar
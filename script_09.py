@@ -8,13 +8,17 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
 import os                                  # Miscellaneous operating system interfaces
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
+from utilities_ocean import resolve        # Product registry (FTP host, path and file name)
 #---------------------------------------------------------------------------------------------------------------------------
 
 def download_OCEAN(product, date, path_dest):
@@ -99,364 +103,16 @@ def download_OCEAN(product, date, path_dest):
   # 'ASC-A-a-nc', 'ASC-A-d-nc', 'ASC-B-a-nc, 'ASC-A-d-nc' (ASCAT Winds)
   # 'ASC-A-a-hdf', 'ASC-A-d-hdf', 'ASC-B-a-hdf, 'ASC-A-d-hdf' (ASCAT Winds)
 
-  # Desired year (four digit)
-  year = date[0:4]
-  #year = '2021'
-
-  # Desired month (two digit)
-  month = date[4:6]
-  #month = '06'
-
-  # Desired day (two digit)
-  day = date[6:8] 
-  #day = '28' 
-
-  #-----------------------------------------------------------------------------------------------------------
-
-  # FTP Address
-  if (product == 'SST' or product == 'SST-A' or product == 'SST-T' or product == 'BAA' or 
-      product == 'BHS' or product == 'DHW' or product == 'CLO' or product == 'SST-Monthly-Min' or product == 'SST-Monthly-Mean' or 
-      product == 'SST-Monthly-Max' or product == 'SST-Annual-Min' or product == 'SST-Annual-Mean' or 
-      product == 'SST-Annual-Max' or product == 'SST-A-Monthly-Min' or product == 'SST-A-Monthly-Mean' or 
-      product == 'SST-A-Monthly-Max' or product == 'SST-A-Annual-Min' or product == 'SST-A-Annual-Mean' or 
-      product == 'SST-A-Annual-Max' or product == 'BAA-Monthly-Max' or product == 'BHA-Annual-Max' or
-      product == 'BHS-Monthly-Max' or product == 'BHS-Annual-Max' or 
-      product == 'DHW-Monthly-Max' or product == 'DHW-Annual-Max'):
-    ftp = FTP('ftp.star.nesdis.noaa.gov') 
-  elif (product == 'ASC-B-a-nc' or 'ASC-B-d-nc' or 'ASC-C-a-nc' or 'ASC-C-d-nc' or product == 'SLA' or product == 'JAS' or product == 'SST-LEO' or
-        product == 'ASC-B-a-hdf' or 'ASC-B-d-hdf' or 'ASC-C-a-hdf' or 'ASC-C-d-hdf'):
-    ftp = FTP('ftpcoastwatch.noaa.gov') 
+  # Resolve the FTP host, path and file name from the product registry
+  remote = resolve(product, date)
+  ftp = FTP(remote.host)
 
   # FTP Credentials 
   ftp.login('', '') 
 
-  #-----------------------------------------------------------------------------------------------------------
-
-  # Access the FTP folder, based on the desired product
-  if (product == 'SST'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/sst/' + year + '/')
-      naming_convention = 'coraltemp_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Monthly-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Monthly-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-Annual-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-Annual-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/ssta/' + year + '/')
-      naming_convention = 'ct5km_ssta_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-A-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Monthly-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Monthly-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A-Annual-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A-Annual-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-T'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/sst-trend-7d/' + year + '/')
-      naming_convention = 'ct5km_sst-trend-7d_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BAA'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/baa/' + year + '/')
-      naming_convention = 'ct5km_baa_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BAA-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_baa-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'BAA-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_baa-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'BHS'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/hs/' + year + '/')
-      naming_convention = 'ct5km_hs_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BHS-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_hs-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'BHS-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_hs-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'DHW'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/dhw/' + year + '/')
-      naming_convention = 'ct5km_dhw_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'DHW-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_dhw-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'DHW-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_dhw-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'CLO'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/mecb/coastwatch/viirs/nrt/L3/global/chlora/dineof/' + year + '/')
-      naming_convention = '_a1_WW00_chlora'
-      extension = '.nc'
-      file_name = 'V' + year + jday + naming_convention + extension
-
-  elif (product == 'SLA'):
-      # FTP Path
-      path = ('pub/socd/lsa/rads/sla/daily/nrt/' + year + '/')
-      naming_convention = 'rads_global_nrt_sla'
-      extension = '.nc'
-      date_1 = year + month + day
-      date_2 = str(datetime(int(year), int(month), int(day)) + timedelta(days=1))
-      date_2 = datetime.strptime(date_2, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d')   
-      file_name = naming_convention + '_' + date_1 + '_' + date_2 + '_' + '001' + extension
-
-  elif (product == 'ASC-B-a-nc'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd7/coastwatch/metop/ascat/netcdf/day/')
-      naming_convention = 'AS'
-      extension = '.nc'
-      file_name = naming_convention + year + jday + 'Bas_WW' + extension
-
-  elif (product == 'ASC-B-d-nc'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd7/coastwatch/metop/ascat/netcdf/day/')
-      naming_convention = 'AS'
-      extension = '.nc'
-      file_name = naming_convention + year + jday + 'Bds_WW' + extension
-
-  elif (product == 'ASC-C-a-nc'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd7/coastwatch/metop/ascat/netcdf/day/')
-      naming_convention = 'AS'
-      extension = '.nc'
-      file_name = naming_convention + year + jday + 'Cas_WW' + extension
-
-  elif (product == 'ASC-C-d-nc'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd7/coastwatch/metop/ascat/netcdf/day/')
-      naming_convention = 'AS'
-      extension = '.nc'
-      file_name = naming_convention + year + jday + 'Cds_WW' + extension
-      
-  elif (product == 'ASC-B-a-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Bas_WW' + extension
-
-  elif (product == 'ASC-B-d-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Bds_WW' + extension
-
-  elif (product == 'ASC-C-a-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Cas_WW' + extension
-
-  elif (product == 'ASC-C-d-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Cds_WW' + extension
-
-  elif (product == 'JAS'):
-      # FTP Path
-      path = ('pub/socd/lsa/johnk/coastwatch/j3/')
-      naming_convention = 'j3'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-LEO'):
-    # Converting date to julian day
-    import datetime
-    fmt = '%Y%m%d'
-    s = year + month + day
-    dt = datetime.datetime.strptime(s, fmt)
-    tt = dt.timetuple()
-    jday = str(tt.tm_yday).zfill(3)
-    # FTP Path
-    path = ('pub/socd2/coastwatch/sst/nrt/l3s/leo/pm/' + year + '/' + jday)
-    naming_convention = '120000-STAR-L3S_GHRSST-SSTsubskin-LEO_PM_D-ACSPO_V2.80-v02.0-fv01.0'
-    extension = '.nc'
-    file_name = year + month + day + naming_convention + extension
+  # FTP Path and file name
+  path = remote.path
+  file_name = remote.file_name
 
 #-----------------------------------------------------------------------------------------------------------
 
@@ -465,7 +121,7 @@ def download_OCEAN(product, date, path_dest):
   print('Checking the FTP File:') 
   print('---------------------')
   print('Product: ' + product)
-  print('Date: ' + year + month + day)
+  print('Date: ' + date)
   print('File Name: ' + file_name)
 
   try:
@@ -543,8 +199,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -561,17 +216,17 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a background image
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('Metareas.shp').geometries())
+shapefile = shape_geometries('Metareas.zip', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='black',facecolor='none', linewidth=1.0)
 
 # Add a colorbar
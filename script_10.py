@@ -8,7 +8,10 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
@@ -16,6 +19,7 @@ import os                                  # Miscellaneous operating system inte
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
 from utilities_ocean import download_OCEAN # Our function for download
+from utilities_grid import grid_slices, grid_point # Our functions for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
@@ -24,29 +28,21 @@ output = "Output"; os.makedirs(output, exist_ok=True)
 # Time / Date for download
 date = '20220103' # YYYYMMDD
 
-# Download the file (product, date, directory)
-file = download_OCEAN('SST', date, input)
+# Select the extent [min. lon, min. lat, max. lon, max. lat]
+extent = [-93.0, -60.00, -10.00, 18.00] # South America
+
+# Download the file (product, date, directory), keeping only the region of the extent
+file = download_OCEAN('SST', date, input, extent=extent)
 #---------------------------------------------------------------------------------------------------------------------------
 # Open the file using the NetCDF4 library
 file = Dataset(f'{input}/{file}')
 #---------------------------------------------------------------------------------------------------------------------------
-# Select the extent [min. lon, min. lat, max. lon, max. lat]
-extent = [-93.0, -60.00, -10.00, 18.00] # South America
        
-# Reading lats and lons 
-lats = file.variables['lat'][:]
-lons = file.variables['lon'][:]
-
-# Latitude lower and upper index
-latli = np.argmin( np.abs( lats - extent[1] ) )
-latui = np.argmin( np.abs( lats - extent[3] ) )
- 
-# Longitude lower and upper index
-lonli = np.argmin( np.abs( lons - extent[0] ) )
-lonui = np.argmin( np.abs( lons - extent[2] ) )
+# Latitude and longitude index ranges of the extent (see utilities_grid)
+lat_slice, lon_slice = grid_slices(file, extent)
  
 # Extract the Sea Surface Temperature
-data = file.variables['analysed_sst'][ 0 , latli:latui , lonli:lonui ]
+data = file.variables['analysed_sst'][ 0 , lat_slice , lon_slice ]
 #---------------------------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(7,7))
@@ -59,8 +55,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -77,17 +72,17 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a background image
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('Metareas.shp').geometries())
+shapefile = shape_geometries('Metareas.zip', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='black',facecolor='none', linewidth=1.0)
 
 # Add a colorbar
@@ -123,8 +118,7 @@ txt11 = ax.annotate("S", xy=(-22, -17), xycoords=ccrs.PlateCarree()._as_mpl_tran
 # Reading the data from a coordinate
 lat_point = -30
 lon_point = -30
-lat_idx = (np.abs(lats - lat_point)).argmin()
-lon_idx = (np.abs(lons - lon_point)).argmin()
+lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
 data_point = file.variables['analysed_sst'][ : , lat_idx , lon_idx ][0].round(2)
 
 # Adding the data as an annotation
@@ -8,67 +8,47 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
 import os                                  # Miscellaneous operating system interfaces
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
-from utilities_ocean import download_OCEAN # Our function for download
+from utilities_ocean import download_OCEAN_range # Our function for download (date ranges)
+from utilities_grid import grid_slices     # Our function for regional crops (grid indices)
+from utilities_animation import save_animation # Our animation engine (basemap drawn once, parallel frames)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
 output = "Output"; os.makedirs(output, exist_ok=True)
 
-# Time / Date for download
-year = '2021'
-month_ini = 1
-month_end = 5
+# Time / Date for download (start and end months, YYYYMM, and interval in months)
+date_ini = '202101'
+date_end = '202105'
 month_int = 1
 
-for month in range(month_ini, month_end + 1, month_int):
-  # Time / Date for download
-  month = str(month).zfill(2)
-  date = year + month # YYYYMM
+# Select the extent [min. lon, min. lat, max. lon, max. lat]
+extent = [-93.0, -60.00, -10.00, 18.00] # South America
 
-  # Download the file (product, date, directory)
-  file = download_OCEAN('SST-Monthly-Mean', date, input) # options: 'SST', 'SST-A' (Anomaly), 'SST-T' (Trend), 'CLO' (Ocean Color), 'SLA' (Sea Level Anomaly), 'ASC-A-a', ASC-A-d, ASC-B-a, ASC-B-d, (ASCAT Winds), 'JAS' (JASON-3)
-  #---------------------------------------------------------------------------------------------------------------------------
-  # Open the file using the NetCDF4 library
-  file = Dataset(f'{input}/{file}')
-  #---------------------------------------------------------------------------------------------------------------------------
-  # Select the extent [min. lon, min. lat, max. lon, max. lat]
-  extent = [-93.0, -60.00, -10.00, 18.00] # South America
-        
-  # Reading lats and lons 
-  lats = file.variables['lat'][:]
-  lons = file.variables['lon'][:]
-
-  # Latitude lower and upper index
-  latli = np.argmin( np.abs( lats - extent[1] ) )
-  latui = np.argmin( np.abs( lats - extent[3] ) )
-  
-  # Longitude lower and upper index
-  lonli = np.argmin( np.abs( lons - extent[0] ) )
-  lonui = np.argmin( np.abs( lons - extent[2] ) )
-  
-  # Extract the Sea Surface Temperature
-  data = file.variables['sea_surface_temperature'][ 0 , latui:latli , lonli:lonui ]
-  #---------------------------------------------------------------------------------------------------------------------------
+# Define the image extent
+img_extent = [extent[0], extent[2], extent[1], extent[3]]
+#---------------------------------------------------------------------------------------------------------------------------
+# Function to draw the static layers of the animation (called once). Returns the figure, the image and the title
+# updated by each frame
+def basemap():
   # Choose the plot size (width x height, in inches)
-  plt.figure(figsize=(7,7))
+  fig = plt.figure(figsize=(7,7))
 
   # Use the Cilindrical Equidistant projection in cartopy
   ax = plt.axes(projection=ccrs.PlateCarree())
   ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 
-  # Define the image extent
-  img_extent = [extent[0], extent[2], extent[1], extent[3]]
-
   # Add coastlines, borders and gridlines
-  ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-  ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+  add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
   gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
   gl.top_labels = False
   gl.right_labels = False
@@ -85,45 +65,51 @@ for month in range(month_ini, month_end + 1, month_int):
   vmax = 35.0
 
   # Add a background image
-  ax.stock_img()
+  add_basemap(ax, ('stock_img', {}))
 
-  # Plot the image
-  img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='upper', extent=img_extent, cmap=cmap)
+  # Plot the image (the data of each month is set by the frames)
+  img = ax.imshow(np.full((2,2), np.nan), vmin=vmin, vmax=vmax, origin='upper', extent=img_extent, cmap=cmap)
 
   # Add a shapefile
-  shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+  shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
   ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
   # Add a colorbar
   plt.colorbar(img, label='Sea Surface Temperature (°C)', extend='both', orientation='vertical', pad=0.02, fraction=0.05)
 
-  # Getting the file time and date
-  add_seconds = int(file.variables['time'][0])
-  date_satellite = datetime(1981,1,1,0) + timedelta(seconds=add_seconds)
-  date_formatted = date_satellite.strftime('%Y-%m')
-    
-  # Add a title
-  plt.title(f'NOAA Coral Reef Watch Daily 5 km SST - {date_formatted}', fontweight='bold', fontsize=7, loc='left')
+  # Add a title (the date of each month is set by the frames)
+  title = plt.title('', fontweight='bold', fontsize=7, loc='left')
   plt.title('Region: ' + str(extent), fontsize=7, loc='right')
 
   # Add a text inside the plot
   from matplotlib.offsetbox import AnchoredText
   text = AnchoredText("INPE / CGCT / DISSM", loc=4, prop={'size': 7}, frameon=True)
   ax.add_artist(text)
-  #--------------------------------------------------------------------------------------------------------------------------- 
-  # Save the image
-  plt.savefig(f'{output}/SSTAVG_{date}.png', bbox_inches='tight', pad_inches=0, dpi=100)
+  return fig, img, title
+#---------------------------------------------------------------------------------------------------------------------------
+# Function to read a frame: the Sea Surface Temperature and the title of a month (file name)
+def load(file_name):
+  # Open the file using the NetCDF4 library
+  file = Dataset(f'{input}/{file_name}')
+
+  # Latitude and longitude index ranges of the extent (see utilities_grid)
+  lat_slice, lon_slice = grid_slices(file, extent)
+
+  # Extract the Sea Surface Temperature
+  data = file.variables['sea_surface_temperature'][ 0 , lat_slice , lon_slice ]
+
+  # Getting the file time and date
+  add_seconds = int(file.variables['time'][0])
+  date_satellite = datetime(1981,1,1,0) + timedelta(seconds=add_seconds)
+  date_formatted = date_satellite.strftime('%Y-%m')
+  file.close()
+
+  return data, f'NOAA Coral Reef Watch Daily 5 km SST - {date_formatted}'
 #---------------------------------------------------------------------------------------------------------------------------
-import imageio        # Python interface to read and write a wide range of image data
-import glob           # Unix style pathname pattern expansion
-import os             # Miscellaneous operating system interfaces
-
-# Images we want to include in the GIF
-files = sorted(glob.glob(f'{output}/SSTAVG_*.png'), key=os.path.getmtime)
-
-# Create the GIF
-images = []
-for file in files:
-    images.append(imageio.imread(file))
-imageio.mimsave(f'{output}/animation.gif', images, fps=1)
-  
\ No newline at end of file
+if __name__ == '__main__':
+  # Download the files of each month between start and end (the range may span years, -1: failed downloads)
+  files = download_OCEAN_range('SST-Monthly-Mean', date_ini, date_end, input, month_int) # options: 'SST', 'SST-A' (Anomaly), 'SST-T' (Trend), 'CLO' (Ocean Color), 'SLA' (Sea Level Anomaly), 'ASC-A-a', ASC-A-d, ASC-B-a, ASC-B-d, (ASCAT Winds), 'JAS' (JASON-3)
+  files = [file for file in files if file != -1]
+
+  # Create the GIF (each process draws the basemap once, and each month only updates the image and the title)
+  save_animation(f'{output}/animation.gif', basemap, load, files, fps=1, dpi=100)
@@ -8,7 +8,10 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
@@ -16,6 +19,7 @@ import os                                  # Miscellaneous operating system inte
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
 from utilities_ocean import download_OCEAN # Our function for download
+from utilities_grid import grid_slices     # Our function for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
@@ -43,23 +47,14 @@ file2 = Dataset(f'{input}/{file2}')
 extent = [-70.0, -50.00, 25.00, 30.00]  # South America
 #extent = [-180.0, -50.00, 180.00, 50.00]  # South America
 
-# Reading lats and lons 
-lats = file1.variables['lat'][:]
-lons = file1.variables['lon'][:]
-
-# Latitude lower and upper index
-latli = np.argmin( np.abs( lats - extent[1] ) )
-latui = np.argmin( np.abs( lats - extent[3] ) )
- 
-# Longitude lower and upper index
-lonli = np.argmin( np.abs( lons - extent[0] ) )
-lonui = np.argmin( np.abs( lons - extent[2] ) )
+# Latitude and longitude index ranges of the extent (see utilities_grid)
+lat_slice, lon_slice = grid_slices(file1, extent)
  
 # Extract the Sea Surface Temperature - Monthly Mean
-data1 = file1.variables['sea_surface_temperature'][ 0 , latui:latli , lonli:lonui ]
+data1 = file1.variables['sea_surface_temperature'][ 0 , lat_slice , lon_slice ]
 
 # Extract the Sea Surface Temperature - Monthly Mean
-data2 = file2.variables['sea_surface_temperature'][ 0 , latui:latli , lonli:lonui ]
+data2 = file2.variables['sea_surface_temperature'][ 0 , lat_slice , lon_slice ]
 
 # Calculate the difference
 data = data2 - data1
@@ -75,8 +70,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -87,13 +81,13 @@ vmin = -3.0
 vmax = 3.0
 
 # Add a background image
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='upper', extent=img_extent, cmap=cmap)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a colorbar
@@ -16,45 +16,53 @@ import os                                  # Miscellaneous operating system inte
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
 from utilities_ocean import download_OCEAN # Our function for download
+from utilities_ocean import download_OCEAN_many # Our function for parallel downloads (batches)
+from utilities_ocean import plan_OCEAN     # Our function for date ranges
+from utilities_ocean import missing_OCEAN  # Our function for gap detection (files not downloaded)
+from utilities_grid import grid_point      # Our function for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
 output = "Output"; os.makedirs(output, exist_ok=True)
 
 # Time / Date for download
-year = '2021'    # Year
-month_ini = 1    # Starting month
-month_end = 3    # End month
-month_int = 1    # Interval
+date_ini = '202101'  # Starting month (YYYYMM)
+date_end = '202103'  # End month (YYYYMM)
+month_int = 1        # Interval
 
 # Create the lists that will store our data
 data_min = []; data_mean = []; data_max = []; dates = []
 
-# For each month between start and end, increase one month
-for month in range(month_ini, month_end + 1, month_int):
+# Months between start and end (YYYYMM, the range may span years)
+months = [remote.date for remote in plan_OCEAN('SST-Monthly-Mean', date_ini, date_end, month_int)]
 
-  # Time / Date for download
-  month = str(month).zfill(2)    # Convert month to two digit
-  date = year + month # YYYYMM   # Data is year (four digit) + month (two digit)
+# Files of all the products and months: (product, date): file name
+products = ('SST-Monthly-Min', 'SST-Monthly-Mean', 'SST-Monthly-Max')
+files = {(remote.product, remote.date): remote.file_name for product in products for remote in plan_OCEAN(product, date_ini, date_end, month_int)}
+
+# Download the files missing in the input directory, of all the products and months, in a single parallel batch, before processing them
+missing = [(remote.product, remote.date) for product in products for remote in missing_OCEAN(product, date_ini, date_end, input, month_int)]
+results = download_OCEAN_many(missing, input, max_workers=6)
+
+# Split the results per product and month (-1: the file could not be downloaded)
+files.update({(result.product, result.date): -1 if result.status == 'failed' else result.file_name for result in results})
+
+# For each month between start and end
+for date in months:
 
   # MIN SST - MONTHLY
   #---------------------------------------------------------------------------------------------------------------------------
-  # Download the file (product, date, directory)
-  file = download_OCEAN('SST-Monthly-Min', date, input) 
+  # File downloaded above (product, date)
+  file = files[('SST-Monthly-Min', date)]
   
   if os.path.exists(f'{input}/{file}'):
     # Open the file using the NetCDF4 library
     file = Dataset(f'{input}/{file}')
     
-    # Reading lats and lons 
-    lats = file.variables['lat'][:]
-    lons = file.variables['lon'][:]
-
     # Reading the data from a coordinate
     lat_point = -30
     lon_point = -30
-    lat_idx = np.argmin(np.abs(lats - lat_point))
-    lon_idx = np.argmin(np.abs(lons - lon_point))
+    lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
     data_point = file.variables['sea_surface_temperature'][ 0 , lat_idx , lon_idx ].round(2)
     
     # Add the data to the list
@@ -62,22 +70,17 @@ for month in range(month_ini, month_end + 1, month_int):
 
   # MEAN SST - MONTHLY
   #---------------------------------------------------------------------------------------------------------------------------
-  # Download the file (product, date, directory)
-  file = download_OCEAN('SST-Monthly-Mean', date, input) 
+  # File downloaded above (product, date)
+  file = files[('SST-Monthly-Mean', date)]
   
   if os.path.exists(f'{input}/{file}'):
     # Open the file using the NetCDF4 library
     file = Dataset(f'{input}/{file}')
 
-    # Reading lats and lons 
-    lats = file.variables['lat'][:]
-    lons = file.variables['lon'][:]
-
     # Reading the data from a coordinate
     lat_point = -30
     lon_point = -30
-    lat_idx = np.argmin(np.abs(lats - lat_point))
-    lon_idx = np.argmin(np.abs(lons - lon_point))
+    lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
     data_point = file.variables['sea_surface_temperature'][ 0 , lat_idx , lon_idx ].round(2)
 
     # Add the data to the list
@@ -85,22 +88,17 @@ for month in range(month_ini, month_end + 1, month_int):
 
   # MAX SST - MONTHLY
   #---------------------------------------------------------------------------------------------------------------------------
-  # Download the file (product, date, directory)
-  file = download_OCEAN('SST-Monthly-Max', date, input) 
+  # File downloaded above (product, date)
+  file = files[('SST-Monthly-Max', date)]
   
   if os.path.exists(f'{input}/{file}'):
     # Open the file using the NetCDF4 library
     file = Dataset(f'{input}/{file}')
 
-    # Reading lats and lons 
-    lats = file.variables['lat'][:]
-    lons = file.variables['lon'][:]
-
     # Reading the data from a coordinate
     lat_point = -30
     lon_point = -30
-    lat_idx = np.argmin(np.abs(lats - lat_point))
-    lon_idx = np.argmin(np.abs(lons - lon_point))
+    lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
     data_point = file.variables['sea_surface_temperature'][ 0 , lat_idx , lon_idx ].round(2)
 
     # Add the data to the list
@@ -8,7 +8,10 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
@@ -16,6 +19,7 @@ import os                                  # Miscellaneous operating system inte
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
 from utilities_ocean import download_OCEAN # Our function for download
+from utilities_grid import grid_slices     # Our function for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "/content/Samples"; os.makedirs(input, exist_ok=True)
@@ -34,28 +38,19 @@ file = Dataset(f'{input}/{file}')
 #extent = [-93.0, -60.00, -25.00, 18.00] # South America
 extent = [-65.0, -45.00, -42.00, -24.00] # Southeast Coast
 
-# Reading lats and lons 
-lats = file.variables['latitude'][:]
-lons = file.variables['longitude'][:]
- 
-# Latitude lower and upper index
-latli = np.argmin( np.abs( lats - extent[1] ) )
-latui = np.argmin( np.abs( lats - extent[3] ) )
- 
-# Longitude lower and upper index
-lonli = np.argmin( np.abs( lons - extent[0] ) )
-lonui = np.argmin( np.abs( lons - extent[2] ) )
+# Latitude and longitude index ranges of the extent (see utilities_grid)
+lat_slice, lon_slice = grid_slices(file, extent)
  
 # Extract the Sea Level Anomaly
-data = file.variables['sla'][ 0 , latli:latui , lonli:lonui ]
+data = file.variables['sla'][ 0 , lat_slice , lon_slice ]
 
-# Extract the lats and lons again
-lats = file.variables['latitude'][ latli:latui ]
-lons = file.variables['longitude'][ lonli:lonui ]
+# Extract the lats and lons of the extent
+lats = file.variables['latitude'][ lat_slice ]
+lons = file.variables['longitude'][ lon_slice ]
 
 # Extract the Absolute Geostrophic Velocity (azonal and meridian)
-u_geo = file.variables['ugos'][ 0 , latli:latui , lonli:lonui ]
-v_geo = file.variables['vgos'][ 0 , latli:latui , lonli:lonui ]
+u_geo = file.variables['ugos'][ 0 , lat_slice , lon_slice ]
+v_geo = file.variables['vgos'][ 0 , lat_slice , lon_slice ]
 #---------------------------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(9,9))
@@ -68,8 +63,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='10m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='10m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.50, xlocs=np.arange(-180, 180, 1), ylocs=np.arange(-90, 90, 1), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -89,10 +83,10 @@ img2 = ax.quiver(lons[::1], lats[::1], u_geo[::1,::1], v_geo[::1,::1], scale = 2
 qk = ax.quiverkey(img2, 0.65, 0.892, 0.5, '50 cm/s', labelpos='E', coordinates='figure', fontproperties={'size': '7'})
 
 # Add a land mask
-ax.add_feature(cfeature.LAND, zorder=10)
+add_basemap(ax, ('land', dict(zorder=10)))
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3, zorder=11)
 
 # Add a colorbar
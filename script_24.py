@@ -7,13 +7,17 @@ from netCDF4 import Dataset                         # Read / Write NetCDF4 files
 from osgeo import gdal                              # Python bindings for GDAL
 import matplotlib.pyplot as plt                     # Plotting library
 import cartopy, cartopy.crs as ccrs                 # Plot maps
+from utilities_basemap import add_basemap           # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader          # Import shapefiles
+from utilities_shapes import shape_geometries       # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size             # Our function for the map pixel size (shapefile simplification)
 import os                                           # Miscellaneous operating system interfaces
 import numpy as np                                  # Scientific computing with Python
 from matplotlib import cm                           # Colormap handling utilities
 from datetime import timedelta, date, datetime      # Basic Dates and time types
 from utilities_goes import download_CMI             # Our function for download
 from utilities_goes import reproject                # Our function for reproject
+from utilities_goes import warp_plan                # Our function for reproject (precomputed warp)
 from utilities_goes import loadCPT                  # Import the CPT convert function
 gdal.PushErrorHandler('CPLQuietErrorHandler')       # Ignore GDAL warnings
 #---------------------------------------------------------------------------------------------------------------------------
@@ -28,8 +32,11 @@ output = "Output"; os.makedirs(output, exist_ok=True)
 date = datetime.today().strftime('%Y%m%d')
 yyyymmddhhmn = date + '0000'
 #---------------------------------------------------------------------------------------------------------------------------
-# Download the ABI file
-file_ir = download_CMI(yyyymmddhhmn, 13, input)
+# Download the ABI file (closest scan within +/- 30 minutes, in case the 00:00 scan is late)
+ir = download_CMI(yyyymmddhhmn, 13, input, tolerance=30)
+if ir is None:
+  raise SystemExit(f'No band 13 scan within 30 min of {yyyymmddhhmn}, nothing to plot')
+file_ir = ir.file_name
 #---------------------------------------------------------------------------------------------------------------------------
 # Variable
 var = 'CMI'
@@ -50,15 +57,10 @@ ds_cmi = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
 # Apply the scale, offset and convert to celsius
 ds_cmi = (ds_cmi * scale + offset) - 273.15
 
-# Reproject the file
-filename_ret = f'{output}/IR_{yyyymmddhhmn}.nc'
-reproject(filename_ret, img, ds_cmi, extent, undef)
-
-# Open the reprojected GOES-R image
-file = Dataset(filename_ret)
-
-# Get the pixel values
-data = file.variables['Band1'][:]
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_ir}.nc', extent)
+data, _ = reproject(None, img, ds_cmi, extent, undef, plan=plan)
 #--------------------------------------------------------------------------------------------------------------------------- 
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(8,8))
@@ -77,12 +79,11 @@ colormap = "gray_r" # White to black for IR channels
 img1 = ax.imshow(data, origin='upper', vmin=-80, vmax=60, extent=img_extent, cmap=colormap, alpha=1.0)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='10m', color='white', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='white', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='10m', color='white', linewidth=0.8)), ('borders', dict(edgecolor='white', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 5), ylocs=np.arange(-90, 90, 5), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -9,7 +9,10 @@ import matplotlib.pyplot as plt               # Plotting library
 from datetime import datetime, timedelta      # Basic date and time types
 import cartopy, cartopy.crs as ccrs           # Plot maps
 import cartopy.feature as cfeature            # Common drawing and filtering operations
+from utilities_basemap import add_basemap     # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader    # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size       # Our function for the map pixel size (shapefile simplification)
 import numpy as np                            # Import the Numpy package
 import matplotlib.colors                      # Matplotlib colors  
 from datetime import datetime, timedelta      # Basic Dates and time types
@@ -18,7 +21,9 @@ import time as t                              # Time access and conversion
 from ftplib import FTP                        # FTP protocol client
 from utilities_ocean import download_OCEAN    # Our function for download
 from utilities_goes import download_CMI       # Our function for download
+from utilities_fetch import fetch_all         # Our function for simultaneous downloads
 from utilities_goes import reproject          # Our function for reproject
+from utilities_goes import warp_plan          # Our function for reproject (precomputed warp)
 from utilities_goes import loadCPT            # Import the CPT convert function
 from osgeo import gdal                        # Python bindings for GDAL
 gdal.PushErrorHandler('CPLQuietErrorHandler') # Ignore GDAL warnings
@@ -30,8 +35,11 @@ output = "Output"; os.makedirs(output, exist_ok=True)
 # Time / Date for download
 date = '20210628' # YYYYMMDD
 
-# Download the file (product, date, directory)
-file = download_OCEAN('ASC-B-d-nc', date, input)
+# Download the ASCAT file (NOAA FTP) and the GOES-16 Band 13 file (AWS) at the same time (the files that can not
+# be downloaded are reported, see fetch_all, and stop the script)
+file, file_ir = fetch_all([('ocean', 'ASC-B-d-nc', date, input), ('cmi', date + '1250', 13, input)], return_exceptions=True)
+if isinstance(file, Exception) or isinstance(file_ir, Exception):
+  raise SystemExit(f'The ASCAT and band 13 files of {date} are needed, nothing to plot')
 #---------------------------------------------------------------------------------------------------------------------------
 # Open the file using the NetCDF4 library
 file = Dataset(f'{input}/{file}')
@@ -90,8 +98,7 @@ output = "Output"; os.makedirs(output, exist_ok=True)
 # Datetime to process 
 yyyymmddhhmn = date + '1250'
 #---------------------------------------------------------------------------------------------------------------------------
-# Download the ABI file
-file_ir = download_CMI(yyyymmddhhmn, 13, input)
+# ABI file (downloaded above, with the ASCAT file)
 #---------------------------------------------------------------------------------------------------------------------------
 # Variable
 var = 'CMI'
@@ -112,15 +119,10 @@ ds_cmi = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
 # Apply the scale, offset and convert to celsius
 ds_cmi = (ds_cmi * scale + offset) - 273.15
 
-# Reproject the file
-filename_ret = f'{output}/IR_{yyyymmddhhmn}.nc'
-reproject(filename_ret, img, ds_cmi, extent, undef)
-
-# Open the reprojected GOES-R image
-file = Dataset(filename_ret)
-
-# Get the pixel values
-data = file.variables['Band1'][:]
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_ir}.nc', extent)
+data, _ = reproject(None, img, ds_cmi, extent, undef, plan=plan)
 #--------------------------------------------------------------------------------------------------------------------------- 
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(8,7))
@@ -139,8 +141,7 @@ colormap = "gray_r" # White to black for IR channels
 img1 = ax.imshow(data, origin='upper', vmin=-80, vmax=60, extent=img_extent, cmap=colormap, alpha=1.0)
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='10m', color='white', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='white', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='10m', color='white', linewidth=0.8)), ('borders', dict(edgecolor='white', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 5), ylocs=np.arange(-90, 90, 5), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -156,7 +157,7 @@ norm = matplotlib.colors.BoundaryNorm(bounds, cmap.N)
 img2 = ax.barbs(lons[::2], lats[::2], u_wind[::2,::2], v_wind[::2,::2], wspeed[::2,::2], cmap=cmap, norm=norm, length = 3.0, sizes = dict(emptybarb=0.0, spacing=0.2, height=0.5), linewidth=1.0, pivot='middle') #, barbcolor='gray'
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Extract the GOES-16 date
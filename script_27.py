@@ -8,7 +8,10 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
 from datetime import datetime, timedelta   # Basic Dates and time types
@@ -16,6 +19,7 @@ import os                                  # Miscellaneous operating system inte
 import time as t                           # Time access and conversion                                          
 from ftplib import FTP                     # FTP protocol client
 from utilities_ocean import download_OCEAN # Our function for download      
+from utilities_grid import grid_slices, grid_point # Our functions for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
 input = "Samples"; os.makedirs(input, exist_ok=True)
@@ -33,20 +37,11 @@ file = Dataset(f'{input}/{file}')
 # Select the extent [min. lon, min. lat, max. lon, max. lat]
 extent = [-93.0, -60.00, 20.00, 30.00] # South Atlantic
        
-# Reading lats and lons 
-lats = file.variables['lat'][:]
-lons = file.variables['lon'][:]
- 
-# Latitude lower and upper index
-latli = np.argmin( np.abs( lats - extent[1] ) )
-latui = np.argmin( np.abs( lats - extent[3] ) )
- 
-# Longitude lower and upper index
-lonli = np.argmin( np.abs( lons - extent[0] ) )
-lonui = np.argmin( np.abs( lons - extent[2] ) )
+# Latitude and longitude index ranges of the extent (see utilities_grid)
+lat_slice, lon_slice = grid_slices(file, extent)
  
 # Extract the Sea Surface Temperature
-data = file.variables['analysed_sst'][ 0 , latli:latui , lonli:lonui ]
+data = file.variables['analysed_sst'][ 0 , lat_slice , lon_slice ]
 #---------------------------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(25,20))
@@ -59,8 +54,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='10m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='10m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -77,17 +71,17 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a land mask
-ax.add_feature(cfeature.LAND)
+add_basemap(ax, ('land', {}))
 
 # Plot the image
 img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a shapefile
-shapefile = list(shpreader.Reader('Metareas.shp').geometries())
+shapefile = shape_geometries('Metareas.zip', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='black',facecolor='none', linewidth=1.0)
 
 # Add a colorbar
@@ -154,8 +148,7 @@ lat_buoy  = buoy.variables['latitude'][index[0]]
 lat_point = lat_buoy[0]
 lon_point = lon_buoy[0]
 
-lat_idx = np.argmin(np.abs(lats - lat_point))
-lon_idx = np.argmin(np.abs(lons - lon_point))
+lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
 
 temp_sat = file.variables['analysed_sst'][ 0 , lat_idx , lon_idx ].round(2)
 delta = temp_sat - temp_buoy
@@ -194,8 +187,7 @@ lat_buoy  = buoy.variables['latitude'][index[0]]
 lat_point = lat_buoy[0]
 lon_point = lon_buoy[0]
 
-lat_idx = np.argmin(np.abs(lats - lat_point))
-lon_idx = np.argmin(np.abs(lons - lon_point))
+lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
 
 temp_sat = file.variables['analysed_sst'][ 0 , lat_idx , lon_idx ].round(2)
 delta = temp_sat - temp_buoy
@@ -234,8 +226,7 @@ lat_buoy  = buoy.variables['latitude'][index[0]]
 lat_point = lat_buoy[0]
 lon_point = lon_buoy[0]
 
-lat_idx = np.argmin(np.abs(lats - lat_point))
-lon_idx = np.argmin(np.abs(lons - lon_point))
+lat_idx, lon_idx = grid_point(file, lat_point, lon_point)
 
 temp_sat = file.variables['analysed_sst'][ 0 , lat_idx , lon_idx ].round(2)
 delta = temp_sat - temp_buoy
@@ -8,13 +8,21 @@ import matplotlib.pyplot as plt                 # Plotting library
 from datetime import datetime                   # Basic Dates and time types
 import cartopy, cartopy.crs as ccrs             # Plot maps
 import cartopy.feature as cfeature              # Common drawing and filtering operations
+from utilities_basemap import add_basemap       # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader      # Import shapefiles
+from utilities_shapes import shape_geometries   # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size         # Our function for the map pixel size (shapefile simplification)
 import os                                       # Miscellaneous operating system interfaces
 from osgeo import gdal                          # Python bindings for GDAL
 import numpy as np                              # Scientific computing with Python
 import matplotlib.colors                        # Matplotlib colors  
 from utilities_goes import download_PROD        # Our function for download
+from utilities_goes import download_PROD_range  # Our function for parallel downloads
 from utilities_goes import reproject            # Our function for reproject
+from utilities_goes import warp_plan            # Our function for reproject (precomputed warp)
+from utilities_goes import read_GOES            # Our function for chunked reads (extent, DQF)
+from utilities_composite import CompositeAccumulator # Our accumulator for composites (mean, min, max, std)
+from utilities_cache import DataCache           # Our managed download cache
 gdal.PushErrorHandler('CPLQuietErrorHandler')   # Ignore GDAL warnings
 #-----------------------------------------------------------------------------------------------------------
 # Input and output directories
@@ -35,16 +43,20 @@ hour_ini = 0
 hour_end = 23
 hour_int = 1
 
-sum_ds = np.zeros((5424,5424))
-count_ds = np.zeros((5424,5424))
-#-----------------------------------------------------------------------------------------------------------
-for hour in np.arange(hour_ini, hour_end+1, hour_int):
+# Composite of the hours (average of the valid pixels, see utilities_composite)
+composite = CompositeAccumulator()
+
+# Managed download cache (keeps the input directory under 20 GB, removing the least recently used files)
+cache = DataCache(input, max_bytes=20e9)
 
-    # Date structure
-    yyyymmddhhmn = f'{yyyymmdd}{hour:02.0f}00'
+# Download the files of all the hours in parallel (the file names are returned in the same order as the hours,
+# and the files are pinned in the cache until they are released)
+file_names = download_PROD_range(f'{yyyymmdd}{hour_ini:02.0f}00', f'{yyyymmdd}{hour_end:02.0f}00', hour_int * 60, product_name, input, cache=cache)
+#-----------------------------------------------------------------------------------------------------------
+for file_name in file_names:
 
-    # Download the file
-    file_name = download_PROD(yyyymmddhhmn, product_name, input)
+    # Skip the hours without files
+    if file_name == -1: continue
     #-----------------------------------------------------------------------------------------------------------
     # Variable
     var = 'SST'
@@ -52,48 +64,34 @@ for hour in np.arange(hour_ini, hour_end+1, hour_int):
     # Open the GOES-R image
     file = Dataset(f'{input}/{file_name}.nc')        
 
-    # Open the file
+    # Open the file (header metadata and projection)
     img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
 
-    # Data Quality Flag (DQF)
-    dqf = gdal.Open(f'NETCDF:{input}/{file_name}.nc:DQF')
-
     # Read the header metadata
     metadata = img.GetMetadata()
-    scale = float(metadata.get(var + '#scale_factor'))
-    offset = float(metadata.get(var + '#add_offset'))
     undef = float(metadata.get(var + '#_FillValue'))
     dtime = metadata.get('NC_GLOBAL#time_coverage_start')
 
-    # Load the data
-    ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
-    ds_dqf = dqf.ReadAsArray(0, 0, dqf.RasterXSize, dqf.RasterYSize).astype(float)
+    # Load the data of the extent (float32, NaN's where the quality flag is greater than 1, see read_GOES)
+    ds, window = read_GOES(f'{input}/{file_name}.nc', var, extent, dqf=1)
 
-    # Apply the scale, offset and convert to celsius
-    ds = (ds * scale + offset) - 273.15
+    # Convert to celsius
+    ds -= 273.15
 
-    # Apply NaN's where the quality flag is greater than 1
-    ds[ds_dqf > 1] = np.nan
-    
-    # Calculate the sum
-    sum_ds = np.nansum(np.dstack((sum_ds,ds)),2)
-    count_ds = np.nansum(np.dstack((count_ds,(ds/ds))),2)
+    # Add the hour to the composite
+    composite.add(ds)
     #-----------------------------------------------------------------------------------------------------------
     
-# Calculate the sum
-ds_day = np.empty((5424,5424))
-ds_day[::] = np.nan
-ds_day[count_ds!=0] = sum_ds[count_ds!=0]/count_ds[count_ds!=0]
-#-----------------------------------------------------------------------------------------------------------
-# Reproject the file
-filename_ds = f'{output}/{file_name}_ret.nc'
-reproject(filename_ds, img, ds_day, extent, undef)
+# Calculate the average
+ds_day = composite.result('mean')
 #-----------------------------------------------------------------------------------------------------------
-# Open the reprojected GOES-R image
-file = Dataset(filename_ds)
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_name}.nc', extent)
+data_geo, _ = reproject(None, img, ds_day, extent, undef, geotransform=window.geotransform, plan=plan)
 
-# Get the pixel values
-data_geo = file.variables['Band1'][:]
+# Release the files of the hours (the next downloads may evict them)
+cache.release()
 #-----------------------------------------------------------------------------------------------------------
 # Choose the plot size (width x height, in inches)
 plt.figure(figsize=(15,15))
@@ -106,8 +104,7 @@ ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
 # Add coastlines, borders and gridlines
-ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
 gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
 gl.top_labels = False
 gl.right_labels = False
@@ -124,13 +121,13 @@ vmin = -2.0
 vmax = 35.0
 
 # Add a background image
-ax.stock_img()
+add_basemap(ax, ('stock_img', {}))
 
 # Plot the image
 img = ax.imshow(data_geo, vmin=vmin, vmax=vmax, origin='upper', extent=img_extent, cmap=cmap)
    
 # Add a shapefile
-shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
 ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
 # Add a colorbar
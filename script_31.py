@@ -16,9 +16,14 @@ import os                                     # Miscellaneous operating system i
 import time as t                              # Time access and conversion                                          
 from ftplib import FTP                        # FTP protocol client
 from utilities_ocean import download_OCEAN    # Our function for download
-from utilities_goes import download_PROD      # Our function for download
+from utilities_goes import download_PROD_range # Our function for parallel downloads (time ranges)
 from utilities_goes import reproject          # Our function for reproject
+from utilities_goes import warp_plan          # Our function for reproject (precomputed warp)
+from utilities_goes import read_GOES          # Our function for chunked reads (extent, DQF)
+from utilities_composite import CompositeAccumulator # Our accumulator for composites (mean, min, max, std)
 from osgeo import gdal                        # Python bindings for GDAL
+from utilities_grid import grid_slices        # Our function for regional crops (grid indices)
+from utilities_cache import DataCache          # Our managed download cache
 gdal.PushErrorHandler('CPLQuietErrorHandler') # Ignore GDAL warnings
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
@@ -37,20 +42,11 @@ file_leo = Dataset(f'{input}/{file_leo}')
 # Select the extent [min. lon, min. lat, max. lon, max. lat]
 extent = [-93.0, -60.00, -25.00, 18.00] # South America
        
-# Reading lats and lons 
-lats = file_leo.variables['lat'][:]
-lons = file_leo.variables['lon'][:]
-
-# Latitude lower and upper index
-latli = np.argmin( np.abs( lats - extent[1] ) )
-latui = np.argmin( np.abs( lats - extent[3] ) )
- 
-# Longitude lower and upper index
-lonli = np.argmin( np.abs( lons - extent[0] ) )
-lonui = np.argmin( np.abs( lons - extent[2] ) )
+# Latitude and longitude index ranges of the extent (see utilities_grid)
+lat_slice, lon_slice = grid_slices(file_leo, extent)
  
 # Extract the Sea Surface Temperature
-data_leo = file_leo.variables['sea_surface_temperature'][ 0 , latui:latli , lonli:lonui ] - 273.15
+data_leo = file_leo.variables['sea_surface_temperature'][ 0 , lat_slice , lon_slice ] - 273.15
 #---------------------------------------------------------------------------------------------------------------------------
 # Parameters to process
 yyyymmdd = date
@@ -63,56 +59,48 @@ extent = [-93.0, -60.00, -25.00, 18.00] # South America
 # Sea Surface Temperature - "X" Hours
 ########################################################################
 
-sum_ds = np.zeros((5424,5424))
-count_ds = np.zeros((5424,5424))
+# Composite of the hours (average of the valid pixels, see utilities_composite)
+composite = CompositeAccumulator()
 #-----------------------------------------------------------------------------------------------------------
-for hour in np.arange(14,20+1,1):
+# Managed download cache (keeps the input directory under 20 GB, removing the least recently used files)
+cache = DataCache(input, max_bytes=20e9)
 
-    # Date structure
-    yyyymmddhhmn = f'{yyyymmdd}{hour:02.0f}00'
+# Download the files of all the hours in parallel (the file names are returned in the same order as the hours,
+# and the files are pinned in the cache until they are released)
+file_names = download_PROD_range(f'{yyyymmdd}1400', f'{yyyymmdd}2000', 60, product_name, input, cache=cache)
+#-----------------------------------------------------------------------------------------------------------
+for file_name in file_names:
 
-    # Download the file
-    file_name = download_PROD(yyyymmddhhmn, product_name, input)
+    # Skip the hours without files
+    if file_name == -1: continue
     #-----------------------------------------------------------------------------------------------------------
     # Variable
     var = 'SST'
     # Open the GOES-R image
     file = Dataset(f'{input}/{file_name}.nc')        
-    # Open the file
+    # Open the file (header metadata and projection)
     img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
-    # Data Quality Flag (DQF)
-    dqf = gdal.Open(f'NETCDF:{input}/{file_name}.nc:DQF')
     # Read the header metadata
     metadata = img.GetMetadata()
-    scale = float(metadata.get(var + '#scale_factor'))
-    offset = float(metadata.get(var + '#add_offset'))
     undef = float(metadata.get(var + '#_FillValue'))
     dtime = metadata.get('NC_GLOBAL#time_coverage_start')
-    # Load the data
-    ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
-    ds_dqf = dqf.ReadAsArray(0, 0, dqf.RasterXSize, dqf.RasterYSize).astype(float)
-    # Apply the scale, offset and convert to celsius
-    ds = (ds * scale + offset) - 273.15
-    # Apply NaN's where the quality flag is greater than 1
-    ds[ds_dqf > 1] = np.nan
-    # Calculate the sum
-    sum_ds = np.nansum(np.dstack((sum_ds,ds)),2)
-    count_ds = np.nansum(np.dstack((count_ds,(ds/ds))),2)
+    # Load the data of the extent (float32, NaN's where the quality flag is greater than 1, see read_GOES)
+    ds, window = read_GOES(f'{input}/{file_name}.nc', var, extent, dqf=1)
+    # Convert to celsius
+    ds -= 273.15
+    # Add the hour to the composite
+    composite.add(ds)
     #-----------------------------------------------------------------------------------------------------------
-# Calculate the sum
-ds_day = np.empty((5424,5424))
-ds_day[::] = np.nan
-ds_day[count_ds!=0] = sum_ds[count_ds!=0]/count_ds[count_ds!=0]
-#---------------------------------------------------------------------------------------------------------------------------
-# Reproject the file
-filename_ds = f'{output}/{file_name}_ret.nc'
-reproject(filename_ds, img, ds_day, extent, undef)
+# Calculate the average
+ds_day = composite.result('mean')
 #---------------------------------------------------------------------------------------------------------------------------
-# Open the reprojected GOES-R image
-file = Dataset(filename_ds)
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_name}.nc', extent)
+data_geo, _ = reproject(None, img, ds_day, extent, undef, geotransform=window.geotransform, plan=plan)
 
-# Get the pixel values
-data_geo = file.variables['Band1'][:]
+# Release the files of the hours (the next downloads may evict them)
+cache.release()
 
 # Extract date
 date = (datetime.strptime(dtime, '%Y-%m-%dT%H:%M:%S.%fZ'))
@@ -13,8 +13,12 @@ import os                                       # Miscellaneous operating system
 from osgeo import gdal                          # Python bindings for GDAL
 import numpy as np                              # Scientific computing with Python
 import matplotlib.colors                        # Matplotlib colors 
-from utilities_goes import download_PROD        # Our function for download
+from utilities_goes import download_PROD_range  # Our function for parallel downloads (time ranges)
 from utilities_goes import reproject            # Our function for reproject
+from utilities_goes import warp_plan            # Our function for reproject (precomputed warp)
+from utilities_goes import read_GOES            # Our function for chunked reads (extent, DQF)
+from utilities_composite import CompositeAccumulator # Our accumulator for composites (mean, min, max, std)
+from utilities_cache import DataCache            # Our managed download cache
 gdal.PushErrorHandler('CPLQuietErrorHandler')   # Ignore GDAL warnings
 #---------------------------------------------------------------------------------------------------------------------------
 # Input and output directories
@@ -35,16 +39,20 @@ hour_ini = 3
 hour_end = 5
 hour_int = 1
 
-sum_ds = np.zeros((5424,5424))
-count_ds = np.zeros((5424,5424))
-#-----------------------------------------------------------------------------------------------------------
-for hour in np.arange(hour_ini, hour_end+1, hour_int):
+# Composite of the hours (average of the valid pixels, see utilities_composite)
+composite = CompositeAccumulator()
+
+# Managed download cache (keeps the input directory under 20 GB, removing the least recently used files)
+cache = DataCache(input, max_bytes=20e9)
 
-    # Date structure
-    yyyymmddhhmn = f'{yyyymmdd}{hour:02.0f}00'
+# Download the files of all the hours in parallel (the file names are returned in the same order as the hours,
+# and the files are pinned in the cache until they are released)
+file_names = download_PROD_range(f'{yyyymmdd}{hour_ini:02.0f}00', f'{yyyymmdd}{hour_end:02.0f}00', hour_int * 60, product_name, input, cache=cache)
+#-----------------------------------------------------------------------------------------------------------
+for file_name in file_names:
 
-    # Download the file
-    file_name = download_PROD(yyyymmddhhmn, product_name, input)
+    # Skip the hours without files
+    if file_name == -1: continue
     #-----------------------------------------------------------------------------------------------------------
     # Variable
     var = 'SST'
@@ -52,49 +60,35 @@ for hour in np.arange(hour_ini, hour_end+1, hour_int):
     # Open the GOES-R image
     file = Dataset(f'{input}/{file_name}.nc')        
 
-    # Open the file
+    # Open the file (header metadata and projection)
     img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
 
-    # Data Quality Flag (DQF)
-    dqf = gdal.Open(f'NETCDF:{input}/{file_name}.nc:DQF')
-
     # Read the header metadata
     metadata = img.GetMetadata()
-    scale = float(metadata.get(var + '#scale_factor'))
-    offset = float(metadata.get(var + '#add_offset'))
     undef = float(metadata.get(var + '#_FillValue'))
     dtime = metadata.get('NC_GLOBAL#time_coverage_start')
 
-    # Load the data
-    ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
-    ds_dqf = dqf.ReadAsArray(0, 0, dqf.RasterXSize, dqf.RasterYSize).astype(float)
+    # Load the data of the extent (float32, NaN's where the quality flag is greater than 1, see read_GOES)
+    ds, window = read_GOES(f'{input}/{file_name}.nc', var, extent, dqf=1)
 
-    # Apply the scale, offset and convert to celsius
-    ds = (ds * scale + offset) - 273.15
+    # Convert to celsius
+    ds -= 273.15
 
-    # Apply NaN's where the quality flag is greater than 1
-    ds[ds_dqf > 1] = np.nan
-    
-    # Calculate the sum
-    sum_ds = np.nansum(np.dstack((sum_ds,ds)),2)
-    count_ds = np.nansum(np.dstack((count_ds,(ds/ds))),2)
+    # Add the hour to the composite
+    composite.add(ds)
     #-----------------------------------------------------------------------------------------------------------
     
-# Calculate the sum
-ds_day = np.empty((5424,5424))
-ds_day[::] = np.nan
-ds_day[count_ds!=0] = sum_ds[count_ds!=0]/count_ds[count_ds!=0]
+# Calculate the average
+ds_day = composite.result('mean')
 
 #-----------------------------------------------------------------------------------------------------------
-# Reproject the file
-filename_ds = f'{output}/{file_name}_ret.nc'
-reproject(filename_ds, img, ds_day, extent, undef)
-#-----------------------------------------------------------------------------------------------------------
-# Open the reprojected GOES-R image
-file = Dataset(filename_ds)
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_name}.nc', extent)
+data_night, _ = reproject(None, img, ds_day, extent, undef, geotransform=window.geotransform, plan=plan)
 
-# Get the pixel values
-data_night = file.variables['Band1'][:]
+# Release the files of the hours (the next downloads may evict them)
+cache.release()
 #-----------------------------------------------------------------------------------------------------------
 # Parameters to process
 yyyymmdd = '20220101'
@@ -110,16 +104,17 @@ hour_ini = 17
 hour_end = 19
 hour_int = 1
 
-sum_ds = np.zeros((5424,5424))
-count_ds = np.zeros((5424,5424))
-#-----------------------------------------------------------------------------------------------------------
-for hour in np.arange(hour_ini, hour_end+1, hour_int):
+# Composite of the hours (average of the valid pixels, see utilities_composite)
+composite = CompositeAccumulator()
 
-    # Date structure
-    yyyymmddhhmn = f'{yyyymmdd}{hour:02.0f}00'
+# Download the files of all the hours in parallel (the file names are returned in the same order as the hours,
+# and the files are pinned in the cache until they are released)
+file_names = download_PROD_range(f'{yyyymmdd}{hour_ini:02.0f}00', f'{yyyymmdd}{hour_end:02.0f}00', hour_int * 60, product_name, input, cache=cache)
+#-----------------------------------------------------------------------------------------------------------
+for file_name in file_names:
 
-    # Download the file
-    file_name = download_PROD(yyyymmddhhmn, product_name, input)
+    # Skip the hours without files
+    if file_name == -1: continue
     #-----------------------------------------------------------------------------------------------------------
     # Variable
     var = 'SST'
@@ -127,48 +122,34 @@ for hour in np.arange(hour_ini, hour_end+1, hour_int):
     # Open the GOES-R image
     file = Dataset(f'{input}/{file_name}.nc')        
 
-    # Open the file
+    # Open the file (header metadata and projection)
     img = gdal.Open(f'NETCDF:{input}/{file_name}.nc:' + var)
 
-    # Data Quality Flag (DQF)
-    dqf = gdal.Open(f'NETCDF:{input}/{file_name}.nc:DQF')
-
     # Read the header metadata
     metadata = img.GetMetadata()
-    scale = float(metadata.get(var + '#scale_factor'))
-    offset = float(metadata.get(var + '#add_offset'))
     undef = float(metadata.get(var + '#_FillValue'))
     dtime = metadata.get('NC_GLOBAL#time_coverage_start')
 
-    # Load the data
-    ds = img.ReadAsArray(0, 0, img.RasterXSize, img.RasterYSize).astype(float)
-    ds_dqf = dqf.ReadAsArray(0, 0, dqf.RasterXSize, dqf.RasterYSize).astype(float)
+    # Load the data of the extent (float32, NaN's where the quality flag is greater than 1, see read_GOES)
+    ds, window = read_GOES(f'{input}/{file_name}.nc', var, extent, dqf=1)
 
-    # Apply the scale, offset and convert to celsius
-    ds = (ds * scale + offset) - 273.15
+    # Convert to celsius
+    ds -= 273.15
 
-    # Apply NaN's where the quality flag is greater than 1
-    ds[ds_dqf > 1] = np.nan
-    
-    # Calculate the sum
-    sum_ds = np.nansum(np.dstack((sum_ds,ds)),2)
-    count_ds = np.nansum(np.dstack((count_ds,(ds/ds))),2)
+    # Add the hour to the composite
+    composite.add(ds)
     #-----------------------------------------------------------------------------------------------------------
     
-# Calculate the sum
-ds_day = np.empty((5424,5424))
-ds_day[::] = np.nan
-ds_day[count_ds!=0] = sum_ds[count_ds!=0]/count_ds[count_ds!=0]
-#-----------------------------------------------------------------------------------------------------------
-# Reproject the file
-filename_ds = f'{output}/{file_name}_ret.nc'
-reproject(filename_ds, img, ds_day, extent, undef)
+# Calculate the average
+ds_day = composite.result('mean')
 #-----------------------------------------------------------------------------------------------------------
-# Open the reprojected GOES-R image
-file = Dataset(filename_ds)
+# Reproject the data (in memory: pixel values and geotransform, no NetCDF file written)
+# Warp plan of the extent (computed once per satellite and extent, then cached, see warp_plan)
+plan = warp_plan(f'{input}/{file_name}.nc', extent)
+data_day, _ = reproject(None, img, ds_day, extent, undef, geotransform=window.geotransform, plan=plan)
 
-# Get the pixel values
-data_day = file.variables['Band1'][:]
+# Release the files of the hours (the next downloads may evict them)
+cache.release()
 #-----------------------------------------------------------------------------------------------------------
 # Calculate the difference
 data_diff = data_day - data_night
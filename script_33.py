@@ -8,9 +8,15 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
+from PIL import Image                      # Python Imaging Library (PNG files)
+from utilities_grid import grid_slices     # Our function for regional crops (grid indices)
+from utilities_animation import render_frames # Our rendering engine (basemap drawn once, parallel frames)
 #---------------------------------------------------------------------------------------------------------------------------
 
 # File list
@@ -23,50 +29,36 @@ files = ['WW_2021062500_hs_wind.nc',
          'WW_2021070100_hs_wind.nc',
          'WW_2021070200_hs_wind.nc']
 
-for nc_file in files:
-  # Open the file using the NetCDF4 library
-  file = Dataset('Samples/' + nc_file)
-  #---------------------------------------------------------------------------------------------------------------------------
-  # Select the extent [min. lon, min. lat, max. lon, max. lat]
-  extent = [-93.0, -60.00, -25.00, 18.00] # South America
-        
-  # Reading lats and lons 
-  lats = file.variables['lat'][:]
-  lons = file.variables['lon'][:] - 360
-
-  # Latitude lower and upper index
-  latli = np.argmin( np.abs( lats - extent[1] ) )
-  latui = np.argmin( np.abs( lats - extent[3] ) )
-  
-  # Longitude lower and upper index
-  lonli = np.argmin( np.abs( lons - extent[0] ) )
-  lonui = np.argmin( np.abs( lons - extent[2] ) )
-
-  # Extract the lats and lons again
-  lats = file.variables['lat'][ latli:latui ]
-  lons = file.variables['lon'][ lonli:lonui ]
+# Select the extent [min. lon, min. lat, max. lon, max. lat]
+extent = [-93.0, -60.00, -25.00, 18.00] # South America
 
-  # Extract the Significant Height
-  data = file.variables['hs'][ 0, latli:latui , lonli:lonui ]
+# Define the image extent
+img_extent = [extent[0], extent[2], extent[1], extent[3]]
+#---------------------------------------------------------------------------------------------------------------------------
+# Function to draw the static layers of the maps (called once by each process). Returns the figure, the image and the title
+# updated by each map, and the function updating the quiver
+def basemap():
+  # Open the first file using the NetCDF4 library (all the files have the same grid)
+  file = Dataset('Samples/' + files[0])
 
-  # Extract the U and V components
-  u_comp = file.variables['uwnd'][ 0, latli:latui , lonli:lonui ]
-  v_comp = file.variables['vwnd'][ 0, latli:latui , lonli:lonui ]
+  # Latitude and longitude index ranges of the extent (see utilities_grid)
+  lat_slice, lon_slice = grid_slices(file, extent)
+
+  # Extract the lats and lons of the extent
+  lats = file.variables['lat'][ lat_slice ]
+  lons = file.variables['lon'][ lon_slice ]
+  file.close()
 
   #---------------------------------------------------------------------------------------------------------------------------
   # Choose the plot size (width x height, in inches)
-  plt.figure(figsize=(15,15))
+  fig = plt.figure(figsize=(15,15))
 
   # Use the Cilindrical Equidistant projection in cartopy
   ax = plt.axes(projection=ccrs.PlateCarree())
   ax.set_extent([extent[0], extent[2], extent[1], extent[3]], ccrs.PlateCarree())
 
-  # Define the image extent
-  img_extent = [extent[0], extent[2], extent[1], extent[3]]
-
   # Add coastlines, borders and gridlines
-  ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-  ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+  add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
   gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
   gl.top_labels = False
   gl.right_labels = False
@@ -82,16 +74,17 @@ for nc_file in files:
   vmax = 12.0
 
   # Add a background image
-  ax.stock_img()
+  add_basemap(ax, ('stock_img', {}))
 
-  # Plot the image
-  img = ax.imshow(data, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
+  # Plot the image (the data of each file is set by the frames)
+  img = ax.imshow(np.full((2,2), np.nan), vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
 
-  # Plot the quiver
-  img2 = ax.quiver(lons[::8], lats[::8], u_comp[::8,::8], v_comp[::8,::8], scale = 500, color='black')
+  # Plot the quiver (the U and V components of each file are set by the frames)
+  zeros = np.zeros((len(lats[::8]), len(lons[::8])))
+  img2 = ax.quiver(lons[::8], lats[::8], zeros, zeros, scale = 500, color='black')
 
   # Add a shapefile
-  shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+  shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
   ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
   # Define the ticks to be shown
@@ -100,6 +93,31 @@ for nc_file in files:
   # Add a colorbar
   plt.colorbar(img, label='Significant Height (m)', extend='both', orientation='vertical', pad=0.02, fraction=0.05, ticks=ticks)
 
+  # Add a title (the date of each file is set by the frames)
+  title = plt.title('', fontweight='bold', fontsize=13, loc='left')
+  plt.title('WWATCH', fontsize=13, loc='right')
+
+  # Add a text inside the plot
+  from matplotlib.offsetbox import AnchoredText
+  text = AnchoredText("INPE / CGCT / DISSM", loc=4, prop={'size': 12}, frameon=True)
+  ax.add_artist(text)
+  return fig, img, title, lambda u_comp, v_comp: img2.set_UVC(u_comp[::8,::8], v_comp[::8,::8])
+#---------------------------------------------------------------------------------------------------------------------------
+# Function to read a map: the Significant Height, the title and the U and V components of a file
+def load(nc_file):
+  # Open the file using the NetCDF4 library
+  file = Dataset('Samples/' + nc_file)
+
+  # Latitude and longitude index ranges of the extent (see utilities_grid)
+  lat_slice, lon_slice = grid_slices(file, extent)
+
+  # Extract the Significant Height
+  data = file.variables['hs'][ 0, lat_slice , lon_slice ]
+
+  # Extract the U and V components
+  u_comp = file.variables['uwnd'][ 0, lat_slice , lon_slice ]
+  v_comp = file.variables['vwnd'][ 0, lat_slice , lon_slice ]
+
   year = nc_file[-21:-17]
   month = nc_file[-17:-15]
   day = nc_file[-15:-13]
@@ -108,18 +126,11 @@ for nc_file in files:
   add_hours = int(file.variables['time'][0])
   date = datetime(int(year),int(month),int(day),0) + timedelta(hours=add_hours)
   date_formatted = date.strftime('%Y-%m-%d %H:%M UTC')
-    
-  # Add a title
-  plt.title(f'Significant Height (m) and Wind Direction - {date_formatted}', fontweight='bold', fontsize=13, loc='left')
-  plt.title('WWATCH', fontsize=13, loc='right')
+  file.close()
 
-  # Add a text inside the plot
-  from matplotlib.offsetbox import AnchoredText
-  text = AnchoredText("INPE / CGCT / DISSM", loc=4, prop={'size': 12}, frameon=True)
-  ax.add_artist(text)
-  #--------------------------------------------------------------------------------------------------------------------------- 
-  # Save the image
-  plt.savefig('Output/' + nc_file + '.png')
-
-  # Show the image
-  plt.show()
\ No newline at end of file
+  return data, f'Significant Height (m) and Wind Direction - {date_formatted}', u_comp, v_comp
+#---------------------------------------------------------------------------------------------------------------------------
+if __name__ == '__main__':
+  # Render the maps in parallel (each process draws the basemap once) and save the images, in the order of the files
+  for nc_file, frame in zip(files, render_frames(basemap, load, files, tight=False)):
+    Image.fromarray(frame).save('Output/' + nc_file + '.png')
@@ -8,9 +8,13 @@ import matplotlib.pyplot as plt            # Plotting library
 from datetime import datetime, timedelta   # Basic date and time types
 import cartopy, cartopy.crs as ccrs        # Plot maps
 import cartopy.feature as cfeature         # Common drawing and filtering operations
+from utilities_basemap import add_basemap  # Our function for basemap layers (rendered once, cached)
 import cartopy.io.shapereader as shpreader # Import shapefiles
+from utilities_shapes import shape_geometries # Our function for shapefiles (cached, clipped to the extent)
+from utilities_shapes import pixel_size    # Our function for the map pixel size (shapefile simplification)
 import numpy as np                         # Import the Numpy package
 import matplotlib.colors                   # Matplotlib colors  
+from utilities_grid import grid_slices     # Our function for regional crops (grid indices)
 #---------------------------------------------------------------------------------------------------------------------------
 # File list
 files = ['WW_2021062500_hs_dironda.nc',
@@ -29,27 +33,18 @@ for nc_file in files:
   # Select the extent [min. lon, min. lat, max. lon, max. lat]
   extent = [-93.0, -60.00, -25.00, 18.00] # South America
         
-  # Reading lats and lons 
-  lats = file.variables['lat'][:]
-  lons = file.variables['lon'][:] - 360
-
-  # Latitude lower and upper index
-  latli = np.argmin( np.abs( lats - extent[1] ) )
-  latui = np.argmin( np.abs( lats - extent[3] ) )
-  
-  # Longitude lower and upper index
-  lonli = np.argmin( np.abs( lons - extent[0] ) )
-  lonui = np.argmin( np.abs( lons - extent[2] ) )
-
-  # Extract the lats and lons again
-  lats = file.variables['lat'][ latli:latui ]
-  lons = file.variables['lon'][ lonli:lonui ]
+  # Latitude and longitude index ranges of the extent (see utilities_grid)
+  lat_slice, lon_slice = grid_slices(file, extent)
+
+  # Extract the lats and lons of the extent
+  lats = file.variables['lat'][ lat_slice ]
+  lons = file.variables['lon'][ lon_slice ]
 
   # Extract the Significant Height
-  hs = file.variables['hs'][ 0, latli:latui , lonli:lonui ]
+  hs = file.variables['hs'][ 0, lat_slice , lon_slice ]
 
   # Extract the dir
-  dir = file.variables['dir'][ 0, latli:latui , lonli:lonui ]
+  dir = file.variables['dir'][ 0, lat_slice , lon_slice ]
 
   # Calculate the Hx and Hy components
   Hx = hs * np.cos(dir)
@@ -67,8 +62,7 @@ for nc_file in files:
   img_extent = [extent[0], extent[2], extent[1], extent[3]]
 
   # Add coastlines, borders and gridlines
-  ax.coastlines(resolution='50m', color='black', linewidth=0.8)
-  ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+  add_basemap(ax, ('coastlines', dict(resolution='50m', color='black', linewidth=0.8)), ('borders', dict(edgecolor='black', linewidth=0.5)))
   gl = ax.gridlines(crs=ccrs.PlateCarree(), color='white', alpha=1.0, linestyle='--', linewidth=0.25, xlocs=np.arange(-180, 180, 10), ylocs=np.arange(-90, 90, 10), draw_labels=True)
   gl.top_labels = False
   gl.right_labels = False
@@ -84,7 +78,7 @@ for nc_file in files:
   vmax = 12.0
 
   # Add a background image
-  ax.stock_img()
+  add_basemap(ax, ('stock_img', {}))
 
   # Plot the image
   img = ax.imshow(hs, vmin=vmin, vmax=vmax, origin='lower', extent=img_extent, cmap=cmap)
@@ -93,7 +87,7 @@ for nc_file in files:
   img2 = ax.quiver(lons[::8], lats[::8], Hx[::8,::8], Hy[::8,::8], scale = 200, color='black')
 
   # Add a shapefile
-  shapefile = list(shpreader.Reader('ne_10m_admin_1_states_provinces.shp').geometries())
+  shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
   ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
 
   # Define the ticks to be shown
@@ -0,0 +1,115 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Test Fixtures
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import sys                               # System-specific parameters (module path)
+import logging                           # Logging facility (pyftpdlib messages)
+import threading                         # FTP server thread
+from collections import Counter          # Commands received by the FTP server
+import pytest                            # Test framework
+
+# The utilities are modules of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utilities_retry                   # Default circuit breaker
+import utilities_telemetry               # Default telemetry
+
+#-----------------------------------------------------------------------------------------------------------
+# Every test starts with closed circuits and keeps its transfer telemetry in memory
+@pytest.fixture(autouse=True)
+def isolated_downloads(monkeypatch):
+  monkeypatch.setattr(utilities_retry, 'circuit_breaker', utilities_retry.CircuitBreaker())
+  telemetry = utilities_telemetry.Telemetry(None)
+  utilities_telemetry.set_telemetry(telemetry)
+  yield telemetry
+  utilities_telemetry.set_telemetry(None)
+
+#-----------------------------------------------------------------------------------------------------------
+# Local FTP server (pyftpdlib) standing in for the NOAA servers, with fault injection:
+# - "drop": {command: times} the connection is closed, without a reply, when the command is received
+# - anonymous login and a "user" / "secret" account (any other password is refused with 530)
+# - "commands": Counter of the commands received (plus 'CONNECT' for each connection)
+class FTPTestServer:
+
+  def __init__(self, root):
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+    logging.getLogger('pyftpdlib').setLevel(logging.ERROR)
+
+    self.root = root
+    self.drop = {}
+    self.commands = Counter()
+    server = self
+
+    class Handler(FTPHandler):
+      auth_failed_timeout = 0
+
+      def on_connect(self):
+        server.commands['CONNECT'] += 1
+
+      def pre_process_command(self, line, cmd, arg):
+        server.commands[cmd] += 1
+        if server.drop.get(cmd, 0) > 0:
+          server.drop[cmd] -= 1
+          self.close()
+          return
+        return super().pre_process_command(line, cmd, arg)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(root)
+    authorizer.add_user('user', 'secret', root, perm='elr')
+    Handler.authorizer = authorizer
+    self.server = FTPServer(('127.0.0.1', 0), Handler)
+    self.port = self.server.socket.getsockname()[1]
+    self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'timeout': 0.05, 'handle_exit': False}, daemon=True)
+    self.thread.start()
+
+  # Connection pool of the utilities_ocean downloads, with the NOAA hosts mapped to this server
+  def pool(self, **kwargs):
+    from utilities_ocean import FTPPool, FTP_STAR, FTP_COASTWATCH
+    kwargs.setdefault('timeout', 5)
+    return FTPPool(hosts={FTP_STAR: ('127.0.0.1', self.port), FTP_COASTWATCH: ('127.0.0.1', self.port)}, **kwargs)
+
+  # Put a resolved file (utilities_ocean.OceanFile) on the server
+  def add(self, remote, data):
+    folder = os.path.join(self.root, remote.path)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, remote.file_name), 'wb') as f:
+      f.write(data)
+
+  def close(self):
+    self.server.close_all()
+    self.thread.join(5)
+
+@pytest.fixture
+def ftp_server(tmp_path):
+  pytest.importorskip('pyftpdlib')
+  root = tmp_path / 'ftp'
+  root.mkdir()
+  server = FTPTestServer(str(root))
+  yield server
+  server.close()
+
+#-----------------------------------------------------------------------------------------------------------
+# Mocked (moto) "noaa-goes16" bucket, with a fresh shared client and an in-memory listing index
+@pytest.fixture
+def s3(monkeypatch):
+  moto = pytest.importorskip('moto')
+  from utilities_goes import set_s3_client, set_s3_index, S3ListingIndex
+  import boto3
+  for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+    monkeypatch.setenv(name, 'testing')
+  monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+  with moto.mock_aws():
+    s3_client = boto3.client('s3')
+    # Public bucket, as the NOAA buckets (the shared client is not signed)
+    s3_client.create_bucket(Bucket='noaa-goes16', ACL='public-read')
+    set_s3_client(None)
+    set_s3_index(S3ListingIndex(':memory:'))
+    yield s3_client
+    set_s3_client(None)
+    set_s3_index(None)
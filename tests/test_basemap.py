@@ -0,0 +1,37 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Basemap Raster Cache Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import pytest                            # Test framework
+
+pytest.importorskip('cartopy')           # utilities_basemap draws the layers with cartopy
+import matplotlib                        # Plotting library
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt          # Plotting library
+import cartopy.crs as ccrs               # Plot maps
+from utilities_basemap import add_basemap
+
+#-----------------------------------------------------------------------------------------------------------
+# The layers of one call are drawn at their own zorder: one raster per zorder
+def test_layers_grouped_by_zorder():
+  ax = plt.axes(projection=ccrs.PlateCarree())
+  layers = add_basemap(ax, ('coastlines', {}), ('land', {}), ('borders', {}), ('ocean', dict(zorder=3)), path_cache=None)
+  assert [(layer.get_zorder(), [name for name, kwargs in layer.layers]) for layer in layers] == \
+         [(-1, ['land']), (1.5, ['coastlines', 'borders']), (3, ['ocean'])]
+  plt.close('all')
+
+# An explicit zorder draws all the layers in a single raster
+def test_explicit_zorder():
+  ax = plt.axes(projection=ccrs.PlateCarree())
+  layers = add_basemap(ax, ('coastlines', {}), ('land', {}), zorder=3, path_cache=None)
+  assert [(layer.get_zorder(), [name for name, kwargs in layer.layers]) for layer in layers] == \
+         [(3, ['coastlines', 'land'])]
+  plt.close('all')
+
+def test_unknown_layer():
+  ax = plt.axes(projection=ccrs.PlateCarree())
+  with pytest.raises(ValueError):
+    add_basemap(ax, ('rivers', {}))
+  plt.close('all')
@@ -0,0 +1,89 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Managed Local Data Cache Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import json                              # JSON encoder and decoder (cache manifest)
+from utilities_cache import DataCache, file_checksum
+
+# Function to write a file of "size" bytes to the cache directory and add it to the cache
+def add_file(cache, date, size=100, pin=False):
+  file_name = f'file_{date}.nc'
+  with open(os.path.join(cache.directory, file_name), 'wb') as f:
+    f.write(b'x' * size)
+  cache.add('SST', date, file_name, pin=pin)
+  return file_name
+
+def manifest(cache):
+  with open(cache.manifest_path) as f:
+    return json.load(f)
+
+#-----------------------------------------------------------------------------------------------------------
+def test_lookup(tmp_path):
+  cache = DataCache(str(tmp_path))
+  file_name = add_file(cache, '20220101')
+  assert cache.lookup('SST', '20220101') == file_name
+  assert cache.lookup('SST', '20220102') is None
+  assert manifest(cache)['entries']['SST|20220101']['checksum'] == file_checksum(tmp_path / file_name)
+  stats = cache.stats()
+  assert (stats['hits'], stats['misses'], stats['total_hits'], stats['total_misses']) == (1, 1, 1, 1)
+
+# The lookups do not write the manifest: the access times are written in batches
+def test_lookup_batches_access_times(tmp_path):
+  cache = DataCache(str(tmp_path), flush_every=10, flush_after=3600)
+  add_file(cache, '20220101')
+  written = os.stat(cache.manifest_path).st_mtime_ns
+  last_access = manifest(cache)['entries']['SST|20220101']['last_access']
+  for lookup in range(9):
+    cache.lookup('SST', '20220101')
+  assert os.stat(cache.manifest_path).st_mtime_ns == written
+  cache.lookup('SST', '20220101')
+  assert manifest(cache)['counters']['hits'] == 10
+  assert manifest(cache)['entries']['SST|20220101']['last_access'] > last_access
+
+# The pending access times are written before evicting, so the files just read are kept
+def test_eviction_uses_pending_access_times(tmp_path):
+  cache = DataCache(str(tmp_path), max_bytes=250, flush_every=1000, flush_after=3600)
+  first = add_file(cache, '20220101')
+  second = add_file(cache, '20220102')
+  cache.lookup('SST', '20220101')
+  add_file(cache, '20220103')
+  assert os.path.exists(tmp_path / first)
+  assert not os.path.exists(tmp_path / second)
+
+# The entries of the files removed from disk are forgotten
+def test_lookup_missing_file(tmp_path):
+  cache = DataCache(str(tmp_path))
+  file_name = add_file(cache, '20220101')
+  os.remove(tmp_path / file_name)
+  assert cache.lookup('SST', '20220101') is None
+  cache.flush()
+  assert 'SST|20220101' not in manifest(cache)['entries']
+
+#-----------------------------------------------------------------------------------------------------------
+# The pinned files of a batch are not evicted by the other files of the batch, until they are released
+def test_pinned_files(tmp_path):
+  cache = DataCache(str(tmp_path), max_bytes=250)
+  batch = [add_file(cache, f'2022010{day}', pin=True) for day in range(1, 5)]
+  assert all(os.path.exists(tmp_path / file_name) for file_name in batch)
+  cache.release(*batch)
+  assert not cache.pinned
+  add_file(cache, '20220105')
+  assert [file_name for file_name in batch if os.path.exists(tmp_path / file_name)] == [batch[3]]
+
+def test_pin_lookup_and_release(tmp_path):
+  cache = DataCache(str(tmp_path), max_bytes=250)
+  first = add_file(cache, '20220101')
+  assert cache.lookup('SST', '20220101', pin=True) == first
+  cache.pin(first)
+  add_file(cache, '20220102')
+  add_file(cache, '20220103')
+  assert os.path.exists(tmp_path / first)
+  # Each pin needs its own release
+  cache.release(first)
+  assert cache.pinned[first] == 1
+  cache.release()
+  add_file(cache, '20220104')
+  assert not os.path.exists(tmp_path / first)
@@ -0,0 +1,109 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Asynchronous Downloads Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import threading                         # HTTP server thread
+from collections import Counter          # Requests received by the HTTP server
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler # Local HTTP server
+import pytest                            # Test framework
+
+pytest.importorskip('osgeo')             # utilities_goes (S3 downloads) needs the GDAL bindings
+from utilities_fetch import download_HTTP, fetch_all
+from utilities_ocean import resolve
+from utilities_retry import RetryPolicy, FileNotAvailable, LoginRefused, ConnectionFailed
+
+# No waits between the retries
+NO_DELAY = RetryPolicy(attempts=3, base_delay=0, jitter=False)
+
+#-----------------------------------------------------------------------------------------------------------
+# Local HTTP server: "files": path: data, "faults": path: list of HTTP status codes answered before the file
+@pytest.fixture
+def http_server():
+  files, faults, requests = {}, {}, Counter()
+
+  class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+      requests[self.path] += 1
+      if faults.get(self.path):
+        self.send_error(faults[self.path].pop(0))
+      elif self.path in files:
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(files[self.path])))
+        self.end_headers()
+        self.wfile.write(files[self.path])
+      else:
+        self.send_error(404)
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  server.files, server.faults, server.requests = files, faults, requests
+  server.url = f'http://127.0.0.1:{server.server_address[1]}'
+  yield server
+  server.shutdown()
+  server.server_close()
+
+#-----------------------------------------------------------------------------------------------------------
+# download_HTTP raises DownloadError subclasses and retries the temporary errors
+
+def test_http_download(http_server, tmp_path, isolated_downloads):
+  http_server.files['/B20n38w.nc'] = b'x' * 5000
+  assert download_HTTP(http_server.url + '/B20n38w.nc', str(tmp_path), retry=NO_DELAY) == 'B20n38w.nc'
+  assert (tmp_path / 'B20n38w.nc').read_bytes() == b'x' * 5000
+  # The file exists: no new request
+  assert download_HTTP(http_server.url + '/B20n38w.nc', str(tmp_path), retry=NO_DELAY) == 'B20n38w.nc'
+  assert http_server.requests['/B20n38w.nc'] == 1
+  download, hit = isolated_downloads.recent
+  assert (download.source, download.status, download.bytes, hit.cache) == ('http', 'downloaded', 5000, 'hit')
+
+def test_http_missing_file(http_server, tmp_path):
+  with pytest.raises(FileNotAvailable):
+    download_HTTP(http_server.url + '/missing.nc', str(tmp_path), retry=NO_DELAY)
+  assert http_server.requests['/missing.nc'] == 1
+  assert not (tmp_path / 'missing.nc').exists()
+
+def test_http_refused(http_server, tmp_path):
+  http_server.faults['/private.nc'] = [403]
+  with pytest.raises(LoginRefused):
+    download_HTTP(http_server.url + '/private.nc', str(tmp_path), retry=NO_DELAY)
+
+def test_http_retried(http_server, tmp_path, isolated_downloads):
+  http_server.files['/B20n38w.nc'] = b'x' * 100
+  http_server.faults['/B20n38w.nc'] = [503, 502]
+  assert download_HTTP(http_server.url + '/B20n38w.nc', str(tmp_path), retry=NO_DELAY) == 'B20n38w.nc'
+  assert http_server.requests['/B20n38w.nc'] == 3
+  assert isolated_downloads.recent[-1].retries == 2
+
+def test_http_unreachable(tmp_path):
+  with pytest.raises(ConnectionFailed):
+    download_HTTP('http://127.0.0.1:1/B20n38w.nc', str(tmp_path), retry=RetryPolicy(attempts=1))
+
+#-----------------------------------------------------------------------------------------------------------
+# fetch_all reports the failures of every source the same way
+
+def test_fetch_all_failures(http_server, ftp_server, tmp_path, capsys):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  downloads = [('ocean', 'SST', '20220101', str(tmp_path)), ('ocean', 'SST', '20220102', str(tmp_path)),
+               ('http', http_server.url + '/missing.nc', str(tmp_path))]
+  results = fetch_all(downloads, return_exceptions=True, pool=ftp_server.pool())
+  assert results[0] == remote.file_name
+  assert isinstance(results[1], FileNotAvailable) and isinstance(results[2], FileNotAvailable)
+  assert capsys.readouterr().out.count('File not available!') == 2
+
+  # Without return_exceptions, the first error is raised (after all the downloads ran)
+  with pytest.raises(FileNotAvailable):
+    fetch_all(downloads[1:] + [('ocean', 'SST', '20220101', str(tmp_path / 'other'))], pool=ftp_server.pool())
+  assert (tmp_path / 'other' / remote.file_name).exists()
+
+# The S3 downloads without files raise FileNotAvailable instead of returning -1
+def test_s3_not_found(s3, tmp_path):
+  results = fetch_all([('cmi', '202106281250', 13, str(tmp_path)), ('prod', '202201010000', 'ABI-L2-SSTF', str(tmp_path))],
+                      return_exceptions=True)
+  assert all(isinstance(result, FileNotAvailable) for result in results)
+  assert 'Band-13' in str(results[0]) and 'ABI-L2-SSTF' in str(results[1])
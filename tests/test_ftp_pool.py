@@ -0,0 +1,99 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - FTP Connection Pool Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import pytest                            # Test framework
+from utilities_ocean import resolve, fetch_OCEAN, download_OCEAN
+from utilities_retry import RetryPolicy, FileNotAvailable
+
+# No waits between the retries
+NO_DELAY = RetryPolicy(attempts=3, base_delay=0, jitter=False)
+
+# Function to put the SST files of some dates on the server
+def add_files(ftp_server, *dates):
+  for date in dates:
+    ftp_server.add(resolve('SST', date), date.encode() * 100)
+
+#-----------------------------------------------------------------------------------------------------------
+# One session (one connection and login) is reused by the downloads
+def test_session_reused(ftp_server, tmp_path):
+  dates = ['20220101', '20220102', '20220103']
+  add_files(ftp_server, *dates)
+  pool = ftp_server.pool()
+  for date in dates:
+    assert download_OCEAN('SST', date, str(tmp_path), pool=pool, retry=NO_DELAY) == resolve('SST', date).file_name
+  assert ftp_server.commands['CONNECT'] == 1
+  assert ftp_server.commands['USER'] == 1
+  assert ftp_server.commands['RETR'] == 3
+
+# The connect and login latency is only reported by the transfer that opened the session
+def test_session_latency(ftp_server, tmp_path, isolated_downloads):
+  add_files(ftp_server, '20220101', '20220102')
+  pool = ftp_server.pool()
+  fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool)
+  fetch_OCEAN(resolve('SST', '20220102'), str(tmp_path), pool)
+  first, second = isolated_downloads.recent
+  assert first.connect_seconds is not None and first.login_seconds is not None
+  assert second.connect_seconds is None and second.login_seconds is None
+
+#-----------------------------------------------------------------------------------------------------------
+# An idle session dropped by the server is detected (NOOP) and re-established
+def test_dropped_session_reconnected(ftp_server, tmp_path):
+  add_files(ftp_server, '20220101', '20220102')
+  pool = ftp_server.pool(check_after=0)
+  assert fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool, retry=NO_DELAY) == 'downloaded'
+  ftp_server.drop['NOOP'] = 1
+  assert fetch_OCEAN(resolve('SST', '20220102'), str(tmp_path), pool, retry=NO_DELAY) == 'downloaded'
+  assert ftp_server.commands['NOOP'] == 1
+  assert ftp_server.commands['CONNECT'] == 2
+  assert ftp_server.commands['USER'] == 2
+
+# A session dropped while in use (not checked yet) is discarded and the transfer retried on a new session
+def test_dropped_session_retried(ftp_server, tmp_path, isolated_downloads):
+  add_files(ftp_server, '20220101', '20220102')
+  pool = ftp_server.pool()
+  fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool, retry=NO_DELAY)
+  ftp_server.drop['SIZE'] = 1
+  assert fetch_OCEAN(resolve('SST', '20220102'), str(tmp_path), pool, retry=NO_DELAY) == 'downloaded'
+  assert ftp_server.commands['CONNECT'] == 2
+  assert isolated_downloads.recent[-1].retries == 1
+  # The new session is kept
+  fetch_OCEAN(resolve('SST', '20220102'), str(tmp_path), pool, retry=NO_DELAY)
+  assert ftp_server.commands['CONNECT'] == 2
+
+#-----------------------------------------------------------------------------------------------------------
+# Repeated downloads from the same year folder skip the CWD command
+def test_cwd_skipped(ftp_server, tmp_path):
+  add_files(ftp_server, '20220101', '20220102', '20230101', '20220103')
+  pool = ftp_server.pool()
+  for date in ('20220101', '20220102'):
+    fetch_OCEAN(resolve('SST', date), str(tmp_path), pool)
+  assert ftp_server.commands['CWD'] == 1
+
+  # Another folder, and back
+  for date in ('20230101', '20220103'):
+    fetch_OCEAN(resolve('SST', date), str(tmp_path), pool)
+  assert ftp_server.commands['CWD'] == 3
+
+# A failed CWD leaves the working directory unknown, so the next download changes it again
+def test_cwd_after_failure(ftp_server, tmp_path):
+  add_files(ftp_server, '20220101')
+  pool = ftp_server.pool()
+  fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool)
+  with pytest.raises(FileNotAvailable):
+    fetch_OCEAN(resolve('SST', '20210101'), str(tmp_path), pool, retry=NO_DELAY)
+  assert fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool, verify=True) == 'exists'
+  assert ftp_server.commands['CWD'] == 3
+  assert ftp_server.commands['CONNECT'] == 1
+
+#-----------------------------------------------------------------------------------------------------------
+# The idle sessions are closed with the pool
+def test_pool_close(ftp_server, tmp_path):
+  add_files(ftp_server, '20220101')
+  pool = ftp_server.pool()
+  fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), pool)
+  pool.close()
+  assert ftp_server.commands['QUIT'] == 1
+  assert pool._idle == {}
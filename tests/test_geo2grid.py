@@ -0,0 +1,57 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - geo2grid Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import numpy as np                       # Import the Numpy package
+import pytest                            # Test framework
+from netCDF4 import Dataset              # Read / Write NetCDF4 files
+
+pytest.importorskip('osgeo')             # utilities_goes needs the GDAL bindings
+from utilities_goes import geo2grid, latlon2xy, geo2grid_array, latlon2xy_array
+
+# GOES-16 full disk fixed grid (5424 x 5424, 2 km), in memory
+@pytest.fixture
+def nc():
+  nc = Dataset('fixed_grid.nc', 'w', diskless=True)
+  nc.createDimension('x', 5424)
+  nc.createDimension('y', 5424)
+  x = nc.createVariable('x', 'i2', ('x',))
+  x.scale_factor, x.add_offset = np.float32(5.6e-05), np.float32(-0.151844)
+  y = nc.createVariable('y', 'i2', ('y',))
+  y.scale_factor, y.add_offset = np.float32(-5.6e-05), np.float32(0.151844)
+  yield nc
+  nc.close()
+
+# Points over the disk
+POINTS = [(0.0, -75.0), (-22.9, -43.2), (-30.0, -30.0), (18.0, -93.0), (-60.0, -25.0), (45.5, -120.3)]
+
+# The single point version returns plain floats and ints
+def test_scalar_types(nc):
+  x, y = latlon2xy(-22.9, -43.2)
+  assert type(x) is float and type(y) is float
+  line, col = geo2grid(-22.9, -43.2, nc)
+  assert type(line) is int and type(col) is int
+
+# The sub-satellite point is at the center of the grid
+def test_sub_satellite_point(nc):
+  assert latlon2xy(0.0, -75.0) == pytest.approx((0.0, 0.0), abs=1e-9)
+  assert geo2grid(0.0, -75.0, nc) == (2711, 2711)
+
+# The single point and array versions agree
+@pytest.mark.parametrize('lat, lon', POINTS)
+def test_scalar_matches_array(nc, lat, lon):
+  x, y, on_disk = latlon2xy_array(lat, lon)
+  assert on_disk
+  assert latlon2xy(lat, lon) == (float(x), float(y))
+  lines, cols, valid = geo2grid_array(lat, lon, nc)
+  assert valid and geo2grid(lat, lon, nc) == (int(lines), int(cols))
+
+# Same lines and columns for random points over the disk
+def test_scalar_matches_array_random(nc):
+  rng = np.random.default_rng(0)
+  lats, lons = rng.uniform(-75.0, 75.0, 20000), rng.uniform(-150.0, 0.0, 20000)
+  lines, cols, valid = geo2grid_array(lats, lons, nc)
+  points = np.array([geo2grid(lat, lon, nc) for lat, lon in zip(lats[valid], lons[valid])])
+  assert np.array_equal(points, np.column_stack((lines[valid], cols[valid])))
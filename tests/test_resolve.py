@@ -0,0 +1,60 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Product Registry Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import pytest                            # Test framework
+from utilities_ocean import resolve, plan_OCEAN, OCEAN_PRODUCTS
+
+def test_resolve_daily():
+  remote = resolve('SST', '20220103')
+  assert remote.date == '20220103'
+  assert remote.path == 'pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/sst/2022/'
+  assert remote.file_name == 'coraltemp_v3.1_20220103.nc'
+
+def test_resolve_julian_day_and_next_date():
+  assert resolve('CLO', '20221231').file_name == 'V2022365_a1_WW00_chlora.nc'
+  assert resolve('SLA', '20221231').file_name == 'rads_global_nrt_sla_20221231_20230101_001.nc'
+
+# The date is normalized to the product cadence (the extra digits are ignored)
+@pytest.mark.parametrize('product, date, normalized', [('SST-Monthly-Mean', '20220115', '202201'),
+                                                       ('SST-Monthly-Mean', '202201', '202201'),
+                                                       ('DHW-Annual-Max', '20220115', '2022'),
+                                                       ('SST', '2022011512', '20220115')])
+def test_resolve_normalized_date(product, date, normalized):
+  remote = resolve(product, date)
+  assert remote.date == normalized
+  assert remote == resolve(product, normalized)
+
+# Every product raises the same error for an invalid date
+def products(cadence=None):
+  return sorted(name for name, product in OCEAN_PRODUCTS.items() if cadence in (None, product.cadence))
+
+def check_invalid(product, date):
+  cadence = OCEAN_PRODUCTS[product].cadence
+  with pytest.raises(ValueError, match=f'^Invalid date for the {cadence} product {product}: {date}$'):
+    resolve(product, date)
+
+@pytest.mark.parametrize('product', products())
+@pytest.mark.parametrize('date', ['2022-1-1', '202', 'abcd1234'])
+def test_resolve_invalid_date(product, date):
+  check_invalid(product, date)
+
+@pytest.mark.parametrize('product', products('daily'))
+@pytest.mark.parametrize('date', ['20221340', '20220230', '2022013'])
+def test_resolve_invalid_day(product, date):
+  check_invalid(product, date)
+
+@pytest.mark.parametrize('product', products('monthly'))
+@pytest.mark.parametrize('date', ['202213', '20220001', '20221'])
+def test_resolve_invalid_month(product, date):
+  check_invalid(product, date)
+
+def test_resolve_unknown_product():
+  with pytest.raises(ValueError, match='Unknown product'):
+    resolve('SST-X', '20220101')
+
+def test_plan_dates():
+  assert [remote.date for remote in plan_OCEAN('SST-Monthly-Max', '20211115', '20220201')] == ['202111', '202112', '202201', '202202']
+  assert [remote.date for remote in plan_OCEAN('SST', '2021365', '20220102')] == ['20211231', '20220101', '20220102']
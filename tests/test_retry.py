@@ -0,0 +1,156 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Download Errors and Retries Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import time as t                         # Time access and conversion
+import pytest                            # Test framework
+import utilities_retry                   # Default circuit breaker
+from utilities_retry import (retry_call, RetryPolicy, CircuitBreaker, DownloadError, FileNotAvailable,
+                             LoginRefused, ConnectionFailed, HostUnavailable)
+from utilities_ocean import resolve, fetch_OCEAN, download_OCEAN, FTP_STAR
+
+# No waits between the retries
+NO_DELAY = RetryPolicy(attempts=3, base_delay=0, jitter=False)
+
+#-----------------------------------------------------------------------------------------------------------
+# ftp_error: each fault of the server is raised as its DownloadError subclass
+
+def test_missing_file_is_not_available(ftp_server, tmp_path):
+  with pytest.raises(FileNotAvailable) as error:
+    fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), ftp_server.pool(), retry=NO_DELAY)
+  assert error.value.host == FTP_STAR
+  assert error.value.file_name == 'coraltemp_v3.1_20220101.nc'
+
+def test_refused_login(ftp_server, tmp_path):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  with pytest.raises(LoginRefused):
+    fetch_OCEAN(remote, str(tmp_path), ftp_server.pool(user='user', passwd='wrong'), retry=NO_DELAY)
+
+def test_dropped_connection(ftp_server, tmp_path):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  ftp_server.drop['RETR'] = 3
+  with pytest.raises(ConnectionFailed):
+    fetch_OCEAN(remote, str(tmp_path), ftp_server.pool(), retry=NO_DELAY)
+  assert not (tmp_path / remote.file_name).exists()
+
+# download_OCEAN reports every fault as -1
+@pytest.mark.parametrize('fault', ['missing', 'login', 'drop'])
+def test_download_OCEAN_fails_with_minus_one(ftp_server, tmp_path, fault):
+  remote = resolve('SST', '20220101')
+  if fault != 'missing':
+    ftp_server.add(remote, b'x' * 100)
+  if fault == 'drop':
+    ftp_server.drop['RETR'] = 3
+  pool = ftp_server.pool(user='user', passwd='wrong') if fault == 'login' else ftp_server.pool()
+  assert download_OCEAN('SST', '20220101', str(tmp_path), pool=pool, retry=NO_DELAY) == -1
+
+#-----------------------------------------------------------------------------------------------------------
+# RetryPolicy: only the retryable errors (lost connections, timeouts) are retried
+
+def test_retry_policy_retries_dropped_connections(ftp_server, tmp_path):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100000)
+  ftp_server.drop['RETR'] = 2
+  assert fetch_OCEAN(remote, str(tmp_path), ftp_server.pool(), retry=NO_DELAY) == 'downloaded'
+  assert ftp_server.commands['RETR'] == 3
+  assert (tmp_path / remote.file_name).read_bytes() == b'x' * 100000
+
+def test_retry_policy_gives_up(ftp_server, tmp_path):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  ftp_server.drop['RETR'] = 10
+  with pytest.raises(ConnectionFailed):
+    fetch_OCEAN(remote, str(tmp_path), ftp_server.pool(), retry=RetryPolicy(attempts=4, base_delay=0))
+  assert ftp_server.commands['RETR'] == 4
+
+def test_retry_policy_does_not_retry_missing_files(ftp_server, tmp_path):
+  with pytest.raises(FileNotAvailable):
+    fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), ftp_server.pool(), retry=NO_DELAY)
+  # The year folder does not exist either: a single CWD
+  assert ftp_server.commands['CWD'] == 1
+  ftp_server.add(resolve('SST', '20220102'), b'x' * 100)
+  with pytest.raises(FileNotAvailable):
+    fetch_OCEAN(resolve('SST', '20220101'), str(tmp_path), ftp_server.pool(), retry=NO_DELAY)
+  assert ftp_server.commands['SIZE'] == 1
+
+def test_retry_policy_does_not_retry_refused_logins(ftp_server, tmp_path):
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  with pytest.raises(LoginRefused):
+    fetch_OCEAN(remote, str(tmp_path), ftp_server.pool(user='user', passwd='wrong'), retry=NO_DELAY)
+  assert ftp_server.commands['PASS'] == 1
+
+def test_retry_call_counts_retries():
+  calls = []
+  def function():
+    calls.append(1)
+    raise ConnectionFailed('lost', 'host')
+  retries = []
+  with pytest.raises(ConnectionFailed):
+    retry_call(function, 'host', NO_DELAY, CircuitBreaker(), on_retry=lambda: retries.append(1))
+  assert len(calls) == 3 and len(retries) == 2
+
+@pytest.mark.parametrize('attempt', [0, 1, 5, 20])
+def test_retry_policy_delay(attempt):
+  policy = RetryPolicy(base_delay=1.0, factor=2.0, max_delay=30.0)
+  assert 0 <= policy.delay(attempt) <= min(30.0, 2.0 ** attempt)
+  assert RetryPolicy(jitter=False).delay(attempt) == min(30.0, 2.0 ** attempt)
+
+#-----------------------------------------------------------------------------------------------------------
+# CircuitBreaker: after 5 consecutive failures the host fails at once, without contacting the server,
+# until "reset_after" has passed
+
+def test_circuit_breaker_opens(ftp_server, tmp_path, monkeypatch):
+  breaker = CircuitBreaker(failures=5, reset_after=0.5)
+  monkeypatch.setattr(utilities_retry, 'circuit_breaker', breaker)
+  remote = resolve('SST', '20220101')
+  ftp_server.add(remote, b'x' * 100)
+  ftp_server.drop['RETR'] = 5
+  pool = ftp_server.pool()
+  once = RetryPolicy(attempts=1)
+
+  for failure in range(5):
+    assert breaker.state(FTP_STAR) == 'closed'
+    with pytest.raises(ConnectionFailed):
+      fetch_OCEAN(remote, str(tmp_path), pool, retry=once)
+  assert breaker.state(FTP_STAR) == 'open'
+
+  # The requests fail at once, the server is not contacted
+  commands = sum(ftp_server.commands.values())
+  with pytest.raises(HostUnavailable):
+    fetch_OCEAN(remote, str(tmp_path), pool, retry=once)
+  assert download_OCEAN('SST', '20220101', str(tmp_path), pool=pool, retry=once) == -1
+  assert sum(ftp_server.commands.values()) == commands
+
+  # After "reset_after", one request is let through and closes the circuit
+  t.sleep(0.5)
+  assert fetch_OCEAN(remote, str(tmp_path), pool, retry=once) == 'downloaded'
+  assert breaker.state(FTP_STAR) == 'closed'
+
+def test_circuit_breaker_ignores_missing_files(ftp_server, tmp_path, monkeypatch):
+  breaker = CircuitBreaker(failures=5, reset_after=60)
+  monkeypatch.setattr(utilities_retry, 'circuit_breaker', breaker)
+  for day in range(1, 8):
+    with pytest.raises(FileNotAvailable):
+      fetch_OCEAN(resolve('SST', f'202201{day:02d}'), str(tmp_path), ftp_server.pool(), retry=NO_DELAY)
+  assert breaker.state(FTP_STAR) == 'closed'
+
+def test_circuit_breaker_half_open_failure():
+  breaker = CircuitBreaker(failures=2, reset_after=0.1)
+  for failure in range(2):
+    breaker.failure('host')
+  with pytest.raises(HostUnavailable):
+    breaker.check('host')
+  t.sleep(0.1)
+  # Half-open: one request is let through, the next ones wait for a new period
+  breaker.check('host')
+  with pytest.raises(HostUnavailable):
+    breaker.check('host')
+  breaker.failure('host')
+  assert breaker.state('host') == 'open'
+  with pytest.raises(DownloadError):
+    breaker.check('host')
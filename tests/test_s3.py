@@ -0,0 +1,160 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - AWS S3 Downloads Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+from datetime import datetime, timedelta # Basic Dates and time types
+import pytest                            # Test framework
+
+pytest.importorskip('osgeo')             # utilities_goes needs the GDAL bindings
+import boto3                             # Amazon Web Services (AWS) SDK for Python
+import utilities_goes
+from utilities_cache import DataCache
+from utilities_goes import (get_s3_client, set_s3_client, get_s3_index, set_s3_index, S3ListingIndex,
+                            s3_transfer_config, download_PROD, download_PROD_range)
+
+PRODUCT = 'ABI-L2-SSTF'
+
+# Function to put the scan of a time (YYYYMMDDHHMN) in the bucket. Returns the file name (without ".nc")
+def put_scan(s3_client, yyyymmddhhmn, data=b'x' * 100):
+  date = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M')
+  file_name = f'OR_{PRODUCT}-M6_G16_s{date:%Y%j%H%M}000_e{date:%Y%j%H%M}599_c{date:%Y%j%H%M}599'
+  s3_client.put_object(Bucket='noaa-goes16', Key=f'{PRODUCT}/{date:%Y/%j/%H}/{file_name}.nc', Body=data, ACL='public-read')
+  return file_name
+
+# Function to count the requests of a client, by operation
+def count_requests(s3_client):
+  requests = []
+  s3_client.meta.events.register('before-call.s3.*', lambda model, **kwargs: requests.append(model.name))
+  return requests
+
+#-----------------------------------------------------------------------------------------------------------
+# One client is created and shared by all the downloads
+def test_shared_client(s3, tmp_path, monkeypatch):
+  for minute in ('00', '10', '20', '30'):
+    put_scan(s3, f'2022010100{minute}')
+
+  created = []
+  client = boto3.client
+  def counted_client(*args, **kwargs):
+    created.append(args)
+    return client(*args, **kwargs)
+  monkeypatch.setattr(utilities_goes.boto3, 'client', counted_client)
+
+  download_PROD('202201010000', PRODUCT, str(tmp_path))
+  shared = get_s3_client()
+  requests = count_requests(shared)
+  download_PROD('202201010010', PRODUCT, str(tmp_path))
+  download_PROD_range('202201010000', '202201010030', 10, PRODUCT, str(tmp_path), max_workers=4)
+  assert get_s3_client() is shared
+  assert len(created) == 1
+  # The new files of the range (20 and 30 minutes) were downloaded with the shared client
+  assert requests.count('GetObject') == 3
+
+# A client installed with set_s3_client is used instead
+def test_set_s3_client(s3, tmp_path):
+  file_name = put_scan(s3, '202201010000')
+  set_s3_client(s3)
+  requests = count_requests(s3)
+  assert download_PROD('202201010000', PRODUCT, str(tmp_path)) == file_name
+  assert get_s3_client() is s3
+  assert 'GetObject' in requests
+
+#-----------------------------------------------------------------------------------------------------------
+# The file names are returned in the order of the timestamps, -1 for the timestamps without files
+def test_range_order(s3, tmp_path):
+  file_names = {minute: put_scan(s3, f'2022010100{minute}') for minute in ('00', '10', '30', '50')}
+  result = download_PROD_range('202201010000', '202201010050', 10, PRODUCT, str(tmp_path), max_workers=8)
+  assert result == [file_names['00'], file_names['10'], -1, file_names['30'], -1, file_names['50']]
+  for file_name in file_names.values():
+    assert os.path.exists(tmp_path / f'{file_name}.nc')
+
+# With a cache, the files of a range are pinned: the range does not evict its own files
+def test_range_pinned(s3, tmp_path):
+  file_names = [put_scan(s3, f'2022010100{minute}') for minute in ('00', '10', '20', '30')]
+  cache = DataCache(str(tmp_path), max_bytes=250)
+  assert download_PROD_range('202201010000', '202201010030', 10, PRODUCT, str(tmp_path), cache=cache) == file_names
+  assert all(os.path.exists(tmp_path / f'{file_name}.nc') for file_name in file_names)
+  # The second run is served by the cache
+  assert download_PROD_range('202201010000', '202201010030', 10, PRODUCT, str(tmp_path), cache=cache) == file_names
+  assert cache.hits == 4
+  cache.release()
+  cache.evict()
+  assert sum(os.path.exists(tmp_path / f'{file_name}.nc') for file_name in file_names) == 2
+
+#-----------------------------------------------------------------------------------------------------------
+# Files larger than the multipart threshold are downloaded in parts (ranged GETs) and written complete
+def test_multipart_download(s3, tmp_path, isolated_downloads):
+  size = s3_transfer_config.multipart_threshold + 3 * 1024 * 1024 + 17
+  data = os.urandom(size)
+  file_name = put_scan(s3, '202201010000', data)
+  set_s3_client(s3)
+  ranges = []
+  s3.meta.events.register('before-parameter-build.s3.GetObject', lambda params, **kwargs: ranges.append(params.get('Range')))
+
+  assert download_PROD('202201010000', PRODUCT, str(tmp_path)) == file_name
+  assert len(ranges) == 2 and all(ranges)
+  assert (tmp_path / f'{file_name}.nc').read_bytes() == data
+  record = isolated_downloads.recent[-1]
+  assert record.status == 'downloaded' and record.bytes == size
+
+#-----------------------------------------------------------------------------------------------------------
+# The listing index lists one folder per hour of the downloads
+def test_index_lists_hours(s3, tmp_path):
+  for hour in ('00', '01', '02', '03'):
+    put_scan(s3, f'20220101{hour}00')
+  set_s3_client(s3)
+  requests = count_requests(s3)
+  download_PROD_range('202201010000', '202201010330', 30, PRODUCT, str(tmp_path))
+  assert requests.count('ListObjectsV2') == 4
+
+# The nearest scan lists only the hours covered by the tolerance, all of them
+def test_index_nearest_hours(s3):
+  file_name = put_scan(s3, '202201010210')
+  put_scan(s3, '202201010500')
+  requests = count_requests(s3)
+  found = get_s3_index().nearest(s3, 'noaa-goes16', PRODUCT, f'OR_{PRODUCT}-M6_G16', datetime(2022, 1, 1, 2, 30), timedelta(minutes=10))
+  assert found is None
+  assert requests.count('ListObjectsV2') == 1
+  # Hours 01 to 05: the scan of the middle hour (02) is found
+  found = get_s3_index().nearest(s3, 'noaa-goes16', PRODUCT, f'OR_{PRODUCT}-M6_G16', datetime(2022, 1, 1, 3, 0), timedelta(minutes=120))
+  assert found[0] == f'{PRODUCT}/2022/001/02/{file_name}.nc'
+  assert requests.count('ListObjectsV2') == 5
+
+# A scan published after the listing of a recent folder is found: the miss lists the folder again
+def test_index_scan_published_after_listing(s3, tmp_path):
+  set_s3_index(S3ListingIndex(':memory:', archive_after=float('inf')))
+  set_s3_client(s3)
+  requests = count_requests(s3)
+  put_scan(s3, '202201010000')
+  download_PROD('202201010000', PRODUCT, str(tmp_path))
+  file_name = put_scan(s3, '202201010010')
+  assert download_PROD('202201010010', PRODUCT, str(tmp_path)) == file_name
+  assert requests.count('ListObjectsV2') == 2
+  file_name = put_scan(s3, '202201010020')
+  found = get_s3_index().nearest(s3, 'noaa-goes16', PRODUCT, f'OR_{PRODUCT}-M6_G16', datetime(2022, 1, 1, 0, 20))
+  assert found[0] == f'{PRODUCT}/2022/001/00/{file_name}.nc'
+  assert requests.count('ListObjectsV2') == 3
+
+# The folders of the archive are not listed again
+def test_index_archived_miss(s3, tmp_path):
+  put_scan(s3, '202201010000')
+  set_s3_client(s3)
+  requests = count_requests(s3)
+  download_PROD('202201010000', PRODUCT, str(tmp_path))
+  assert download_PROD('202201010010', PRODUCT, str(tmp_path)) == -1
+  assert requests.count('ListObjectsV2') == 1
+
+# A listing taken before the requested scan start is stale
+def test_index_listing_before_scan(s3):
+  put_scan(s3, '202201010000')
+  requests = count_requests(s3)
+  index = S3ListingIndex(':memory:', archive_after=float('inf'))
+  prefix = f'{PRODUCT}/2022/001/00/'
+  index.list_objects(s3, 'noaa-goes16', prefix)
+  index.list_objects(s3, 'noaa-goes16', prefix, datetime(2022, 1, 1))
+  assert requests.count('ListObjectsV2') == 1
+  index.list_objects(s3, 'noaa-goes16', prefix, datetime.now() + timedelta(hours=1))
+  assert requests.count('ListObjectsV2') == 2
@@ -0,0 +1,63 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Transfer Telemetry Tests
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import json                              # JSON encoder and decoder (transfer manifest)
+import pytest                            # Test framework
+from utilities_telemetry import Telemetry, Transfer, _reversed_lines
+
+# Function to build a record of a given time (minute of 2022-01-01)
+def transfer(minute, status='downloaded'):
+  return Transfer('ftp', 'host', 'SST', f'file_{minute}.nc', status, 'miss', 100, 1.0,
+                  time=f'2022-01-01T00:{minute:02d}:00+00:00')
+
+# Without a manifest, the records are only kept in memory
+def test_memory_only(tmp_path):
+  telemetry = Telemetry(None)
+  for minute in range(5):
+    telemetry.record(transfer(minute))
+  assert [record['file_name'] for record in telemetry.history('2022-01-01T00:03:00+00:00')] == ['file_3.nc', 'file_4.nc']
+  assert list(tmp_path.iterdir()) == []
+
+def test_manifest_history(tmp_path):
+  telemetry = Telemetry(str(tmp_path / 'telemetry.jsonl'))
+  for minute in range(50):
+    telemetry.record(transfer(minute))
+  assert [record['file_name'] for record in telemetry.history()] == [f'file_{minute}.nc' for minute in range(50)]
+  assert [record['file_name'] for record in telemetry.history('2022-01-01T00:47:00+00:00')] == ['file_47.nc', 'file_48.nc', 'file_49.nc']
+  assert telemetry.summary()[('ftp', 'host')]['transfers'] == 50
+
+# The manifest is rotated past "max_bytes", and the backup is still part of the history
+def test_manifest_rotation(tmp_path):
+  path = tmp_path / 'telemetry.jsonl'
+  line = len(json.dumps(transfer(0).to_dict())) + 1
+  telemetry = Telemetry(str(path), max_bytes=10 * line)
+  for minute in range(25):
+    telemetry.record(transfer(minute))
+  assert path.stat().st_size <= 10 * line
+  assert (tmp_path / 'telemetry.jsonl.1').exists()
+  files = [record['file_name'] for record in telemetry.history()]
+  assert files == [f'file_{minute}.nc' for minute in range(25 - len(files), 25)]
+  assert len(files) > 10
+
+# The history stops reading at the first record older than "since"
+def test_history_stops_reading(tmp_path):
+  path = tmp_path / 'telemetry.jsonl'
+  telemetry = Telemetry(str(path))
+  for minute in range(10):
+    telemetry.record(transfer(minute))
+  # A newer record at the start of the manifest is not reached
+  with open(path) as f:
+    lines = f.readlines()
+  lines[0] = json.dumps(transfer(59).to_dict()) + '\n'
+  path.write_text(''.join(lines))
+  assert [record['file_name'] for record in telemetry.history('2022-01-01T00:08:00+00:00')] == ['file_8.nc', 'file_9.nc']
+
+@pytest.mark.parametrize('block_size', [1, 7, 65536])
+def test_reversed_lines(tmp_path, block_size):
+  path = tmp_path / 'lines.txt'
+  path.write_bytes(b'first\nsecond\n\nthird\nlast')
+  assert list(_reversed_lines(str(path), block_size)) == ['last', 'third', 'second', 'first']
+  assert list(_reversed_lines(str(tmp_path / 'missing.txt'))) == []
@@ -0,0 +1,258 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Animations
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import subprocess                        # Subprocess management (ffmpeg)
+from collections import deque            # Frames being rendered (process pool)
+from concurrent.futures import ProcessPoolExecutor # Parallel rendering
+import numpy as np                       # Import the Numpy package
+import matplotlib                        # Plotting library (ffmpeg path)
+import matplotlib.pyplot as plt          # Plotting library
+from matplotlib.axis import Axis         # Axes ticks (overlay layers)
+from PIL import Image                    # Python Imaging Library (GIF and APNG encoding)
+
+#-----------------------------------------------------------------------------------------------------------
+# Animation engine: the figure, the map axes and the static layers (coastlines, borders, gridlines,
+# background image, shapefiles, colorbar, ...) are drawn once, by a "basemap" function. Each frame only
+# changes the image data (set_data) and the title, and is rendered to an RGB array, which goes straight to
+# the encoder (GIF, APNG or MP4) instead of a PNG file read back later. With "blit", the layers below the image
+# and the rest of the figure (ticks, colorbar, other titles, ...) are rendered once, and each frame only draws
+# the image, the layers above it (e.g. coastlines, borders, shapefiles) and the title. The basemap function
+# returns the figure, the image and the title updated by the frames, e.g.:
+#
+#   def basemap():
+#     fig = plt.figure(figsize=(7,7))
+#     ax = plt.axes(projection=ccrs.PlateCarree())
+#     ax.coastlines(...)
+#     img = ax.imshow(np.full((2, 2), np.nan), vmin=vmin, vmax=vmax, origin='upper', extent=img_extent, cmap=cmap)
+#     title = plt.title('', loc='left')
+#     return fig, img, title
+#
+#   animation = MapAnimation(basemap)
+#   animation.save(f'{output}/animation.gif', frames, fps=1)   # frames: (data, title) of each frame
+#   animation.close()
+#
+# Other artists updated by the frames (e.g. a quiver) are handled by an "update" function, returned as a
+# fourth item by the basemap function, and called with the items of each frame after the data and the title,
+# e.g. "return fig, img, title, lambda u, v: quiver.set_UVC(u, v)" and frames of (data, title, u, v).
+#
+# Parallel rendering (render_frames / save_animation): the frames are spread over a pool of processes. Each
+# process draws its own basemap once, and reads and renders the frames of the items it receives (a "load"
+# function returns the (data, title, ...) of an item, e.g. a file name), so only the items and the rendered
+# frames go through the pool. The frames are returned in the order of the items. The basemap and load
+# functions must be defined at the top level of a module, and scripts must run under
+# "if __name__ == '__main__':" (the processes may import the script).
+#-----------------------------------------------------------------------------------------------------------
+
+# Encoder of RGB frames: GIF and APNG (".png") with Pillow, MP4 with ffmpeg (frames piped to ffmpeg as they are
+# rendered, "animation.ffmpeg_path" of matplotlib: ffmpeg binary)
+class FrameWriter:
+
+  def __init__(self, path, fps=1, loop=0):
+    self.path = path                                  # Output file (.gif, .png or .mp4)
+    self.fps = fps                                    # Frames per second
+    self.loop = loop                                  # Number of loops of the GIF / APNG (0: forever)
+    self.format = os.path.splitext(path)[1].lower()
+    if self.format not in ('.gif', '.png', '.apng', '.mp4'):
+      raise ValueError(f'Unknown animation format: {path} (.gif, .png / .apng or .mp4)')
+    self.frames = 0                                   # Frames written
+    self._images = []                                 # GIF / APNG frames (Pillow)
+    self._ffmpeg = None                               # MP4: ffmpeg process
+
+  # Function to write a frame: an RGB array, or a frame already converted by prepare_frame
+  def write(self, frame):
+    if isinstance(frame, Image.Image):
+      self._images.append(frame)
+      self.frames += 1
+      return
+    if self.format == '.mp4':
+      if self._ffmpeg is None:
+        self._ffmpeg = subprocess.Popen([matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+                                         '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{frame.shape[1]}x{frame.shape[0]}',
+                                         '-r', str(self.fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                                         '-pix_fmt', 'yuv420p', self.path], stdin=subprocess.PIPE)
+      self._ffmpeg.stdin.write(np.ascontiguousarray(frame[:, :, :3]).tobytes())
+    elif self.format == '.gif':
+      self._images.append(prepare_frame(frame, self.format))
+    else:
+      self._images.append(Image.fromarray(frame[:, :, :3]))
+    self.frames += 1
+
+  def close(self):
+    if self._ffmpeg is not None:
+      self._ffmpeg.stdin.close()
+      if self._ffmpeg.wait() != 0:
+        raise RuntimeError(f'ffmpeg could not write {self.path}')
+      self._ffmpeg = None
+    elif self._images:
+      self._images[0].save(self.path, format='GIF' if self.format == '.gif' else 'PNG', save_all=True,
+                           append_images=self._images[1:], duration=int(1000 / self.fps), loop=self.loop)
+      self._images = []
+
+  # Discard the frames (e.g. after an error)
+  def abort(self):
+    if self._ffmpeg is not None:
+      self._ffmpeg.kill()
+      self._ffmpeg.wait()
+      self._ffmpeg = None
+    self._images = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+# Function to convert an RGB frame for the encoder of a format: GIF frames are quantized to a palette (1 byte
+# per pixel, instead of 3, until the file is written). Other formats: the frame itself. Used by the rendering
+# processes, so the encoder only appends the frames
+def prepare_frame(frame, format):
+  if format == '.gif':
+    return Image.fromarray(frame[:, :, :3]).quantize(method=Image.Quantize.FASTOCTREE)
+  return frame
+
+#-----------------------------------------------------------------------------------------------------------
+# Map animation (see above). "tight": crop the frames to the drawn area, as savefig(bbox_inches='tight',
+# pad_inches=0) (the crop is computed once, from the basemap, so all the frames have the same size). "decimate": take every n-th row and column
+# of the data when it has at least n times the pixels of the axes (the image is resampled to the axes anyway,
+# and resampling the full grid takes most of the time of a frame)
+class MapAnimation:
+
+  def __init__(self, basemap, dpi=100, tight=True, blit=True, decimate=True):
+    self.fig, self.image, self.title, *update = basemap()
+    self.update = update[0] if update else None   # Function updating other artists (extra items of the frames)
+    self.fig.set_dpi(dpi)
+    self.tight = tight
+    self.blit = blit
+    self.decimate = decimate
+    self._crop = (slice(None), slice(None))       # Rows and columns of the frames (tight)
+    self._background = None                       # Static layers (blit)
+    self._overlay = []                            # Layers above the image (blit)
+    if tight:
+      self._crop = self._tight_crop()
+
+  # Function to get the rows and columns of the drawn area of the figure
+  def _tight_crop(self):
+    self.fig.canvas.draw()
+    height, width = np.asarray(self.fig.canvas.buffer_rgba()).shape[:2]
+    # Tight box (inches, from the bottom) to rows and columns (from the top)
+    box = self.fig.get_tightbbox(self.fig.canvas.get_renderer())
+    dpi = self.fig.dpi
+    return (slice(max(int(height - box.y1 * dpi), 0), min(int(np.ceil(height - box.y0 * dpi)), height)),
+            slice(max(int(box.x0 * dpi), 0), min(int(np.ceil(box.x1 * dpi)), width)))
+
+  # Function to render the static layers (blit): the figure without the image, the layers above it and the title
+  def _draw_background(self):
+    ax = self.image.axes
+    def above(artist):
+      if isinstance(artist, Axis):
+        # Ticks and labels are static, unless the grid lines are drawn over the image
+        return artist.zorder > self.image.zorder and any(line.get_visible() for line in artist.get_gridlines())
+      return artist.zorder > self.image.zorder and artist.get_visible()
+    self._overlay = sorted([artist for artist in ax.get_children() if artist not in (self.image, self.title, ax.patch) and above(artist)],
+                           key=lambda artist: artist.zorder)
+    dynamic = [self.image, self.title] + self._overlay
+    for artist in dynamic:
+      artist.set_visible(False)
+    self.fig.canvas.draw()
+    self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+    for artist in dynamic:
+      artist.set_visible(True)
+
+  # Function to render one frame ("args": items passed to the update function). Returns an RGB array (uint8)
+  def render(self, data, title=None, *args):
+    if self.decimate:
+      box = self.image.axes.bbox
+      step = max(1, min(int(data.shape[0] // box.height), int(data.shape[1] // box.width)))
+      data = data[::step, ::step]
+    self.image.set_data(data)
+    if title is not None:
+      self.title.set_text(title)
+    if self.update is not None:
+      self.update(*args)
+    if self.blit:
+      if self._background is None:
+        self._draw_background()
+      ax = self.image.axes
+      self.fig.canvas.restore_region(self._background)
+      for artist in [self.image] + self._overlay + [self.title]:
+        ax.draw_artist(artist)
+    else:
+      self.fig.canvas.draw()
+    frame = np.asarray(self.fig.canvas.buffer_rgba())
+    # A copy: the buffer of the canvas is reused by the next frame
+    return frame[self._crop[0], self._crop[1], :3].copy()
+
+  # Function to render the frames of an iterable / generator of (data, title, ...)
+  def frames(self, frames):
+    for data, title, *args in frames:
+      yield self.render(data, title, *args)
+
+  # Function to render and encode the frames (see FrameWriter). Returns the number of frames
+  def save(self, path, frames, fps=1, loop=0):
+    with FrameWriter(path, fps, loop) as writer:
+      for frame in self.frames(frames):
+        writer.write(frame)
+    return writer.frames
+
+  def close(self):
+    plt.close(self.fig)
+
+#-----------------------------------------------------------------------------------------------------------
+# Parallel rendering (see above)
+
+# Animation of a rendering process (drawn once, by the pool initializer)
+_animation = None
+
+def _start_worker(basemap, kwargs):
+  global _animation
+  # The processes only render to arrays (no windows)
+  plt.switch_backend('Agg')
+  _animation = MapAnimation(basemap, **kwargs)
+
+def _render_worker(load, item, format):
+  return prepare_frame(_animation.render(*load(item)), format)
+
+# Function to render the frames of a list of items with a pool of "processes" (None: number of CPUs, 1: no
+# pool, in this process). "load(item)" returns the (data, title, ...) of each item. "format": prepare the
+# frames for an encoder (see prepare_frame, None: RGB arrays). The other arguments go to MapAnimation.
+# Generator of the frames, in the order of the items. At most two frames per process are rendered ahead of
+# the consumer, so a slow encoder does not pile up the frames in memory
+def render_frames(basemap, load, items, processes=None, format=None, **kwargs):
+
+  processes = processes or os.cpu_count() or 1
+  if processes == 1:
+    animation = MapAnimation(basemap, **kwargs)
+    try:
+      for item in items:
+        yield prepare_frame(animation.render(*load(item)), format)
+    finally:
+      animation.close()
+    return
+
+  executor = ProcessPoolExecutor(processes, initializer=_start_worker, initargs=(basemap, kwargs))
+  pending = deque()
+  try:
+    for item in items:
+      pending.append(executor.submit(_render_worker, load, item, format))
+      if len(pending) >= 2 * processes:
+        yield pending.popleft().result()
+    while pending:
+      yield pending.popleft().result()
+  finally:
+    # Frames not rendered yet are discarded if the consumer stops (or fails)
+    executor.shutdown(wait=True, cancel_futures=True)
+
+# Function to render (render_frames) and encode (FrameWriter) the frames of a list of items. Returns the
+# number of frames
+def save_animation(path, basemap, load, items, fps=1, loop=0, processes=None, **kwargs):
+  with FrameWriter(path, fps, loop) as writer:
+    for frame in render_frames(basemap, load, items, processes, writer.format, **kwargs):
+      writer.write(frame)
+  return writer.frames
@@ -0,0 +1,155 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Basemap Raster Cache
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import math                              # Mathematical functions
+import hashlib                           # Secure hashes (cache file names)
+import threading                         # Lock of the raster cache
+import numpy as np                       # Import the Numpy package
+import cartopy.feature as cfeature       # Common drawing and filtering operations
+from matplotlib.artist import Artist     # Matplotlib artists (basemap layer)
+from matplotlib.figure import Figure     # Figures (off-screen rendering)
+from matplotlib.backends.backend_agg import FigureCanvasAgg # Anti-Grain Geometry renderer (off-screen rendering)
+
+#-----------------------------------------------------------------------------------------------------------
+# Basemap raster cache: the vector layers of the maps (coastlines, borders, land, ocean and the stock image)
+# are the same for every figure with the same projection, extent, size and dpi, so they are rendered once,
+# off-screen, to an RGBA array with the pixels of the map, and each figure only pastes the array. The arrays
+# are cached in memory and on disk (.npy, "BASEMAP_CACHE" environment variable: directory), by projection,
+# map limits, map size (pixels), dpi and layers (style). The layer is rendered when the figure is drawn (the
+# map size is only known then, e.g. after the colorbar is added). The layers are grouped by drawing order
+# (zorder), one raster per group, so each raster takes the place of its vector layers: the land, ocean and
+# stock image below the data, the coastlines and borders above it, even when added in the same call.
+# Each layer is a (name, keyword arguments) pair (see LAYERS), e.g. instead of:
+#   ax.coastlines(resolution='10m', color='black', linewidth=0.8)
+#   ax.add_feature(cartopy.feature.BORDERS, edgecolor='black', linewidth=0.5)
+# use:
+#   add_basemap(ax, ('coastlines', dict(resolution='10m', color='black', linewidth=0.8)),
+#                   ('borders', dict(edgecolor='black', linewidth=0.5)))
+#-----------------------------------------------------------------------------------------------------------
+BASEMAP_CACHE_PATH = os.environ.get('BASEMAP_CACHE', os.path.expanduser('~/.cache/basemaps'))
+
+# Layers: function drawing the layer on a map (GeoAxes) and default drawing order (zorder, as cartopy)
+LAYERS = {
+  'coastlines': (lambda ax, **kwargs: ax.coastlines(**kwargs), 1.5),
+  'borders': (lambda ax, **kwargs: ax.add_feature(cfeature.BORDERS, **kwargs), 1.5),
+  'land': (lambda ax, **kwargs: ax.add_feature(cfeature.LAND, **kwargs), -1),
+  'ocean': (lambda ax, **kwargs: ax.add_feature(cfeature.OCEAN, **kwargs), -1),
+  'stock_img': (lambda ax, **kwargs: ax.stock_img(**kwargs), 0),
+}
+
+# Rasters already rendered: key: RGBA array
+_rasters = {}
+_rasters_lock = threading.Lock()
+MAX_RASTERS = 64
+
+# Function to render layers (see LAYERS) on a map of a projection, with the limits (projection coordinates)
+# of a map. The raster has "width" x "height" pixels, and the map is at "bounds" (left, bottom, width,
+# height, pixels) within the raster (the map may start between two pixels of the figure). Returns an RGBA
+# array (uint8, first row at the top, transparent background)
+def render_basemap(projection, xlim, ylim, bounds, width, height, dpi, layers):
+
+  fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+  canvas = FigureCanvasAgg(fig)
+  fig.patch.set_alpha(0)
+  ax = fig.add_axes([bounds[0] / width, bounds[1] / height, bounds[2] / width, bounds[3] / height], projection=projection)
+  ax.set_aspect('auto')
+  ax.set_xlim(xlim)
+  ax.set_ylim(ylim)
+  ax.set_axis_off()
+  ax.patch.set_visible(False)
+  for name, kwargs in layers:
+    LAYERS[name][0](ax, **kwargs)
+  canvas.draw()
+  raster = np.asarray(canvas.buffer_rgba())
+
+  # The figure size (inches) may round to one pixel less
+  image = np.zeros((height, width, 4), dtype=np.uint8)
+  image[:min(height, raster.shape[0]), :min(width, raster.shape[1])] = raster[:height, :width]
+  return image
+
+# Function to get the raster of layers on a map (cached in memory and on disk, "path_cache": directory)
+def basemap_raster(projection, xlim, ylim, bounds, width, height, dpi, layers, path_cache=BASEMAP_CACHE_PATH):
+
+  key = (projection.proj4_init, tuple(round(float(value), 6) for value in tuple(xlim) + tuple(ylim)),
+         tuple(round(float(value), 3) for value in bounds), width, height, float(dpi), repr(layers))
+  with _rasters_lock:
+    raster = _rasters.get(key)
+  if raster is not None:
+    return raster
+
+  file_name = None
+  if path_cache is not None:
+    file_name = f"{path_cache}/basemap_{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.npy"
+  if file_name is not None and os.path.exists(file_name):
+    raster = np.load(file_name)
+  else:
+    raster = render_basemap(projection, xlim, ylim, bounds, width, height, dpi, layers)
+    if file_name is not None:
+      # Written to a temporary file and renamed (other processes may be reading the cache)
+      os.makedirs(path_cache, exist_ok=True)
+      tmp_name = file_name[:-4] + f'.{os.getpid()}.tmp.npy'
+      np.save(tmp_name, raster)
+      os.replace(tmp_name, file_name)
+
+  with _rasters_lock:
+    if len(_rasters) >= MAX_RASTERS:
+      _rasters.clear()
+    _rasters[key] = raster
+  return raster
+
+#-----------------------------------------------------------------------------------------------------------
+# Basemap layer of a map: the raster of the layers, pasted on the map when the figure is drawn
+class BasemapLayer(Artist):
+
+  def __init__(self, layers, path_cache=BASEMAP_CACHE_PATH):
+    super().__init__()
+    self.layers = tuple((name, dict(kwargs)) for name, kwargs in layers)
+    self.path_cache = path_cache
+
+  def draw(self, renderer):
+    if not self.get_visible():
+      return
+    ax = self.axes
+    box = ax.bbox
+    # Pixels of the figure covered by the map
+    x0, y0 = math.floor(box.x0), math.floor(box.y0)
+    width, height = math.ceil(box.x1) - x0, math.ceil(box.y1) - y0
+    if box.width <= 0 or box.height <= 0:
+      return
+    bounds = (box.x0 - x0, box.y0 - y0, box.width, box.height)
+    raster = basemap_raster(ax.projection, ax.get_xlim(), ax.get_ylim(), bounds, width, height, renderer.dpi,
+                            self.layers, self.path_cache)
+    gc = renderer.new_gc()
+    gc.set_clip_rectangle(box)
+    gc.set_alpha(self.get_alpha())
+    # The renderer takes the rows from the bottom
+    renderer.draw_image(gc, x0, y0, raster[::-1])
+    gc.restore()
+    self.stale = False
+
+# Function to add layers to a map (see LAYERS), as cached rasters: one raster per drawing order (the
+# "zorder" of the layer, or its default), e.g. the land below the data and the coastlines above it.
+# "zorder": drawing order of all the layers, in a single raster (None: the zorder of each layer).
+# Returns the BasemapLayer of each zorder (lowest first)
+def add_basemap(ax, *layers, zorder=None, path_cache=BASEMAP_CACHE_PATH):
+
+  for name, kwargs in layers:
+    if name not in LAYERS:
+      raise ValueError(f'Unknown basemap layer: {name} (available: {", ".join(LAYERS)})')
+
+  # Layers of each drawing order (in the order of the call)
+  groups = {}
+  for name, kwargs in layers:
+    groups.setdefault(kwargs.get('zorder', LAYERS[name][1]) if zorder is None else zorder, []).append((name, kwargs))
+
+  basemap_layers = []
+  for order, group in sorted(groups.items()):
+    layer = BasemapLayer(group, path_cache)
+    layer.set_zorder(order)
+    ax.add_artist(layer)
+    basemap_layers.append(layer)
+  return basemap_layers
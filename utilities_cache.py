@@ -0,0 +1,234 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Managed Local Data Cache
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import json                              # JSON encoder and decoder (cache manifest)
+import hashlib                           # Secure hashes (file checksums)
+import threading                         # Locks (threads of the same process)
+import time as t                         # Time access and conversion
+import atexit                            # Write the pending access times at exit
+import weakref                           # Caches flushed at exit (without keeping them alive)
+from collections import Counter          # Pinned files
+from contextlib import contextmanager    # Context managers
+try:
+  import fcntl                           # File locks (Linux / macOS)
+except ImportError:
+  fcntl = None
+  import msvcrt                          # File locks (Windows)
+
+#-----------------------------------------------------------------------------------------------------------
+# Managed cache of a download directory (e.g. "Samples"). Every file downloaded through the cache is
+# recorded in a manifest (product, date, size, checksum, last access), so the directory can be kept under
+# a byte budget ("max_bytes", least recently used files are removed first) and / or a maximum age
+# ("max_age", seconds since the last access). The files keep their original names (the scripts open them
+# by name), the checksum (sha256) identifies their contents. The manifest is shared by all the processes
+# using the same directory and is only changed while holding a file lock. The lookups do not write it: the
+# access times and counters are kept in memory and written every "flush_every" lookups or "flush_after"
+# seconds (and with the next add, evict or stats, and at exit). Files being used by the process can be
+# pinned (see pin / release, e.g. the files of a download_PROD_range batch until they are processed), so
+# the downloads that follow do not evict them.
+#-----------------------------------------------------------------------------------------------------------
+
+class DataCache:
+
+  def __init__(self, directory, max_bytes=None, max_age=None, checksum=True, flush_every=64, flush_after=30):
+    self.directory = directory           # Download directory
+    self.max_bytes = max_bytes           # Byte budget of the directory (None: no limit)
+    self.max_age = max_age               # Maximum time since the last access (seconds, None: no limit)
+    self.checksum = checksum             # Compute the sha256 of the files added to the cache
+    self.flush_every = flush_every       # Lookups between two writes of the access times
+    self.flush_after = flush_after       # Maximum time (seconds) the access times are kept in memory
+    self.manifest_path = os.path.join(directory, '.cache_manifest.json')
+    self.lock_path = os.path.join(directory, '.cache.lock')
+    self.hits = 0                        # Cache hits of this process
+    self.misses = 0                      # Cache misses of this process
+    self.evictions = 0                   # Files removed by this process
+    self.pinned = Counter()              # Pinned files of this process: file name: number of pins
+    self._accessed = {}                  # Access times not written yet: key: time
+    self._missing = set()                # Keys of the files no longer on disk (removed by the next write)
+    self._pending = Counter()            # Hits and misses not written yet
+    self._flushed_at = t.time()
+    self._thread_lock = threading.Lock()
+    os.makedirs(directory, exist_ok=True)
+    atexit.register(_flush_at_exit, weakref.ref(self))
+
+  #---------------------------------------------------------------------------------------------------------
+  # Manifest access (exclusive lock between threads and processes)
+  @contextmanager
+  def _locked(self):
+    with self._thread_lock, open(self.lock_path, 'a+') as lock_file:
+      if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+      else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+      try:
+        yield
+      finally:
+        if fcntl is not None:
+          fcntl.flock(lock_file, fcntl.LOCK_UN)
+        else:
+          lock_file.seek(0)
+          msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+  def _load(self):
+    try:
+      with open(self.manifest_path) as f:
+        return json.load(f)
+    except (FileNotFoundError, ValueError):
+      return {'entries': {}, 'counters': {'hits': 0, 'misses': 0, 'evictions': 0}}
+
+  def _save(self, manifest):
+    # Write to a temporary file and rename it, so a crash never leaves a broken manifest
+    tmp_path = self.manifest_path + f'.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(manifest, f)
+    os.replace(tmp_path, self.manifest_path)
+
+  @staticmethod
+  def _key(product, date):
+    return f'{product}|{date}'
+
+  # Function to write the pending access times, counters and removed entries to a loaded manifest (called
+  # while holding the lock)
+  def _merge(self, manifest):
+    entries = manifest['entries']
+    for key, accessed in self._accessed.items():
+      if key in entries:
+        entries[key]['last_access'] = max(entries[key]['last_access'], accessed)
+    for key in self._missing:
+      if key in entries and not os.path.exists(os.path.join(self.directory, entries[key]['file_name'])):
+        del entries[key]
+    for counter, value in self._pending.items():
+      manifest['counters'][counter] += value
+    self._accessed.clear()
+    self._missing.clear()
+    self._pending.clear()
+    self._flushed_at = t.time()
+
+  #---------------------------------------------------------------------------------------------------------
+  # Function to look for a (product, date) in the cache. Returns the file name (hit) or None (miss). With
+  # pin=True, the file of a hit is pinned (see pin)
+  def lookup(self, product, date, pin=False):
+    key = self._key(product, date)
+    # The manifest is replaced, never rewritten in place (see _save): no lock needed to read it
+    entry = self._load()['entries'].get(key)
+    with self._thread_lock:
+      # The file must still be on disk
+      if entry is not None and not os.path.exists(os.path.join(self.directory, entry['file_name'])):
+        self._missing.add(key)
+        entry = None
+      if entry is None:
+        self.misses += 1
+        self._pending['misses'] += 1
+      else:
+        self.hits += 1
+        self._pending['hits'] += 1
+        self._accessed[key] = t.time()
+        if pin:
+          self.pinned[entry['file_name']] += 1
+      flush = sum(self._pending.values()) >= self.flush_every or t.time() - self._flushed_at > self.flush_after
+    if flush:
+      self.flush()
+    return None if entry is None else entry['file_name']
+
+  # Function to add a file (already in the cache directory) to the manifest, evicting old files if needed.
+  # With pin=True, the file is pinned (see pin)
+  def add(self, product, date, file_name, pin=False):
+    path = os.path.join(self.directory, file_name)
+    size = os.path.getsize(path)
+    checksum = file_checksum(path) if self.checksum else None
+    with self._locked():
+      if pin:
+        self.pinned[file_name] += 1
+      manifest = self._load()
+      self._merge(manifest)
+      now = t.time()
+      manifest['entries'][self._key(product, date)] = {'product': product, 'date': date, 'file_name': file_name,
+                                                       'size': size, 'checksum': checksum,
+                                                       'added': now, 'last_access': now}
+      self._evict(manifest, keep=file_name)
+      self._save(manifest)
+
+  # Function to write the pending access times and counters to the manifest
+  def flush(self):
+    with self._locked():
+      if not (self._accessed or self._missing or self._pending):
+        return
+      manifest = self._load()
+      self._merge(manifest)
+      self._save(manifest)
+
+  # Function to remove files, oldest access first, until the directory is within the budget and age
+  def evict(self):
+    with self._locked():
+      manifest = self._load()
+      self._merge(manifest)
+      self._evict(manifest)
+      self._save(manifest)
+
+  #---------------------------------------------------------------------------------------------------------
+  # Pinned files are never evicted by this process, until they are released (e.g. the files of a batch,
+  # from the download until they are processed). Each pin needs its own release
+  def pin(self, *file_names):
+    with self._thread_lock:
+      self.pinned.update(file_names)
+
+  # Function to release pinned files (no file names: all the pinned files)
+  def release(self, *file_names):
+    with self._thread_lock:
+      if not file_names:
+        self.pinned.clear()
+      self.pinned.subtract(file_names)
+      self.pinned = +self.pinned
+
+  def _evict(self, manifest, keep=None):
+    entries = manifest['entries']
+    now = t.time()
+    total = sum(entry['size'] for entry in entries.values())
+    for key, entry in sorted(entries.items(), key=lambda item: item[1]['last_access']):
+      expired = self.max_age is not None and now - entry['last_access'] > self.max_age
+      over_budget = self.max_bytes is not None and total > self.max_bytes
+      if entry['file_name'] == keep or entry['file_name'] in self.pinned or not (expired or over_budget):
+        continue
+      try:
+        os.remove(os.path.join(self.directory, entry['file_name']))
+      except FileNotFoundError:
+        pass
+      del entries[key]
+      total -= entry['size']
+      self.evictions += 1
+      manifest['counters']['evictions'] += 1
+
+  #---------------------------------------------------------------------------------------------------------
+  # Cache statistics: counters of this process and of all the processes (manifest), files and bytes
+  def stats(self):
+    self.flush()
+    with self._locked():
+      manifest = self._load()
+    return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'total_hits': manifest['counters']['hits'], 'total_misses': manifest['counters']['misses'],
+            'total_evictions': manifest['counters']['evictions'],
+            'files': len(manifest['entries']), 'bytes': sum(entry['size'] for entry in manifest['entries'].values())}
+
+# Function to write the pending access times of a cache at exit
+def _flush_at_exit(reference):
+  cache = reference()
+  if cache is not None:
+    try:
+      cache.flush()
+    except OSError:
+      # The directory was removed
+      pass
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to compute the sha256 of a file, reading it in blocks
+def file_checksum(path, block_size=4*1024*1024):
+  sha = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(block_size), b''):
+      sha.update(block)
+  return sha.hexdigest()
@@ -0,0 +1,112 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Multi-Hour Composites
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import numpy as np                       # Import the Numpy package
+
+#-----------------------------------------------------------------------------------------------------------
+# Streaming composites (e.g. the daily SST average of the hourly GOES-16 images): each image is added to
+# float32 / uint16 buffers in place, only where it is valid, instead of stacking the running sum with the new
+# image (np.dstack + np.nansum) every hour. The buffers are allocated with the first image, so the same
+# accumulator works for the full disk or for an extent window (see utilities_goes.read_GOES). Statistics:
+#   'mean': average of the valid values
+#   'min', 'max': minimum / maximum of the valid values
+#   'std': standard deviation of the valid values (Welford's running mean and sum of squared differences)
+#   'last': last valid value of each pixel
+#-----------------------------------------------------------------------------------------------------------
+
+STATISTICS = ('mean', 'min', 'max', 'std', 'last')
+
+class CompositeAccumulator:
+
+  def __init__(self, statistics=('mean',)):
+    unknown = set(statistics) - set(STATISTICS)
+    if unknown:
+      raise ValueError(f'Unknown statistics: {", ".join(sorted(unknown))} (available: {", ".join(STATISTICS)})')
+    self.statistics = tuple(statistics)   # Statistics to accumulate
+    self.images = 0                       # Number of images added
+    self.count = None                     # Valid values of each pixel (uint16)
+    self._buffers = {}                    # Accumulation buffers (float32): 'sum', 'mean', 'm2', 'min', 'max', 'last'
+    self._scratch = None                  # Temporaries of the Welford update
+
+  # Shape of the composite (None: no image added yet)
+  @property
+  def shape(self):
+    return None if self.count is None else self.count.shape
+
+  # Function to allocate the buffers with the shape of the first image
+  def _allocate(self, shape):
+    self.count = np.zeros(shape, dtype=np.uint16)
+    if 'std' in self.statistics:
+      # The Welford mean also gives the 'mean'
+      self._buffers['mean'] = np.zeros(shape, dtype=np.float32)
+      self._buffers['m2'] = np.zeros(shape, dtype=np.float32)
+      self._scratch = (np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32))
+    elif 'mean' in self.statistics:
+      self._buffers['sum'] = np.zeros(shape, dtype=np.float32)
+    for statistic in ('min', 'max', 'last'):
+      if statistic in self.statistics:
+        self._buffers[statistic] = np.full(shape, np.nan, dtype=np.float32)
+
+  #---------------------------------------------------------------------------------------------------------
+  # Function to add an image: only the finite values are added, and only where "mask" is True (if given)
+  def add(self, data, mask=None):
+
+    if self.count is None:
+      self._allocate(data.shape)
+    elif data.shape != self.count.shape:
+      raise ValueError(f'Image shape {data.shape} does not match the composite shape {self.count.shape}')
+    if self.images == np.iinfo(np.uint16).max:
+      raise OverflowError(f'A composite takes at most {self.images} images')
+
+    valid = np.isfinite(data)
+    if mask is not None:
+      valid &= mask
+    np.add(self.count, 1, out=self.count, where=valid)
+
+    buffers = self._buffers
+    if 'sum' in buffers:
+      np.add(buffers['sum'], data, out=buffers['sum'], where=valid)
+    if 'm2' in buffers:
+      # Welford: delta = x - mean, mean += delta / n, m2 += delta * (x - new mean)
+      delta, update = self._scratch
+      np.subtract(data, buffers['mean'], out=delta, where=valid)
+      np.divide(delta, self.count, out=update, where=valid)
+      np.add(buffers['mean'], update, out=buffers['mean'], where=valid)
+      np.subtract(data, buffers['mean'], out=update, where=valid)
+      np.multiply(update, delta, out=update, where=valid)
+      np.add(buffers['m2'], update, out=buffers['m2'], where=valid)
+    # np.fmin / np.fmax ignore the NaN's of the empty pixels
+    if 'min' in buffers:
+      np.fmin(buffers['min'], data, out=buffers['min'], where=valid)
+    if 'max' in buffers:
+      np.fmax(buffers['max'], data, out=buffers['max'], where=valid)
+    if 'last' in buffers:
+      np.copyto(buffers['last'], data, where=valid)
+    self.images += 1
+
+  #---------------------------------------------------------------------------------------------------------
+  # Function to get a statistic (float32, NaN where less than "min_count" values were added). "ddof": delta
+  # degrees of freedom of the 'std' (0: population, 1: sample)
+  def result(self, statistic='mean', min_count=1, ddof=0):
+
+    if statistic not in self.statistics:
+      raise ValueError(f"'{statistic}' was not accumulated (statistics: {', '.join(self.statistics)})")
+    if self.count is None:
+      raise ValueError('No images were added to the composite')
+
+    valid = self.count >= max(min_count, ddof + 1, 1)
+    result = np.full(self.count.shape, np.nan, dtype=np.float32)
+    if statistic == 'mean':
+      if 'sum' in self._buffers:
+        np.divide(self._buffers['sum'], self.count, out=result, where=valid)
+      else:
+        np.copyto(result, self._buffers['mean'], where=valid)
+    elif statistic == 'std':
+      np.divide(self._buffers['m2'], self.count - np.float32(ddof), out=result, where=valid)
+      np.sqrt(np.maximum(result, 0, out=result, where=valid), out=result, where=valid)
+    else:
+      np.copyto(result, self._buffers[statistic], where=valid)
+    return result
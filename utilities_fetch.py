@@ -0,0 +1,160 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Asynchronous Downloads
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                     # Miscellaneous operating system interfaces
+import asyncio                                # Asynchronous I/O
+import urllib.request                         # HTTP client
+import urllib.error                           # HTTP client (error classes)
+import urllib.parse                           # URL parsing (host names)
+from utilities_ocean import resolve           # Product registry (NOAA FTP)
+from utilities_ocean import fetch_OCEAN       # Our function for download (NOAA FTP)
+from utilities_ocean import locate_OCEAN      # Versioned file names (NOAA FTP)
+from utilities_goes import download_CMI       # Our function for download (AWS S3)
+from utilities_goes import download_PROD      # Our function for download (AWS S3)
+from utilities_goes import s3_host            # S3 bucket host names
+from utilities_telemetry import get_telemetry # Transfer telemetry
+from utilities_retry import retry_call, DownloadError, FileNotAvailable, LoginRefused, ConnectionFailed, TransferTimeout # Typed errors and retries
+
+#-----------------------------------------------------------------------------------------------------------
+# Asynchronous download engine: FTP (NOAA), S3 (GOES-16 on AWS) and HTTP (e.g. PIRATA buoys) inputs are
+# downloaded at the same time, so a multi-sensor plot waits for the slowest download instead of the sum of
+# all of them. Each source has its own concurrency limit. The FTP, S3 and HTTP clients are blocking, so the
+# transfers run in worker threads (asyncio.to_thread) and the engine only schedules and limits them.
+# An engine must be used inside a single event loop (e.g. one asyncio.run). Every source reports a failed
+# download the same way: a DownloadError subclass (see utilities_retry), e.g. FileNotAvailable when there is
+# no FTP file, S3 scan or HTTP file for the request.
+#-----------------------------------------------------------------------------------------------------------
+
+class FetchEngine:
+
+  def __init__(self, limits=None, pool=None, s3_client=None, cache=None):
+    self.limits = {'ftp': 4, 's3': 8, 'http': 4}   # Maximum number of simultaneous downloads per source
+    self.limits.update(limits or {})
+    self.pool = pool                               # FTP connection pool (None: utilities_ocean.ftp_pool)
+    self.s3_client = s3_client                     # S3 client (None: utilities_goes shared client)
+    self.cache = cache                             # Managed cache (see utilities_cache.DataCache)
+    self._semaphores = {}
+
+  # Function to run a blocking download function of a source, within the source limit
+  async def run(self, source, function, *args, **kwargs):
+    if source not in self._semaphores:
+      self._semaphores[source] = asyncio.Semaphore(self.limits[source])
+    async with self._semaphores[source]:
+      return await asyncio.to_thread(function, *args, **kwargs)
+
+  # NOAA FTP product (see utilities_ocean.download_OCEAN). Returns the file name
+  async def ocean(self, product, date, path_dest):
+    os.makedirs(path_dest, exist_ok=True)
+    remote = await self.run('ftp', locate_OCEAN, resolve(product, date), self.pool)
+    await self.run('ftp', fetch_OCEAN, remote, path_dest, self.pool, cache=self.cache)
+    return remote.file_name
+
+  # GOES-16 ABI band (see utilities_goes.download_CMI). Returns the file name (a GOESFile with "tolerance")
+  async def cmi(self, yyyymmddhhmn, band, path_dest, **kwargs):
+    file_name = await self.run('s3', download_CMI, yyyymmddhhmn, band, path_dest, self.s3_client, **kwargs)
+    return s3_found(file_name, f'{yyyymmddhhmn}, Band-{band}')
+
+  # GOES-16 product (see utilities_goes.download_PROD). Returns the file name (a GOESFile with "tolerance")
+  async def prod(self, yyyymmddhhmn, product_name, path_dest, **kwargs):
+    file_name = await self.run('s3', download_PROD, yyyymmddhhmn, product_name, path_dest, self.s3_client, **kwargs)
+    return s3_found(file_name, f'{yyyymmddhhmn}, Product-{product_name}')
+
+  # File on an HTTP server (see download_HTTP)
+  async def http(self, url, path_dest, file_name=None):
+    return await self.run('http', download_HTTP, url, path_dest, file_name)
+
+  # Wait for a list of downloads. The results are returned in the same order
+  async def gather(self, *downloads, return_exceptions=False):
+    return await asyncio.gather(*downloads, return_exceptions=return_exceptions)
+
+# Function to check the result of an S3 download function (-1 or None: no file for the request)
+def s3_found(file_name, request):
+  if file_name == -1 or file_name is None:
+    host = s3_host('noaa-goes16')
+    raise FileNotAvailable(f'{host}: no files found for the date: {request}', host)
+  return file_name
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to download a file from an HTTP server (skipped if it exists). The file is written to a
+# temporary name and renamed when complete. Returns the file name. HTTP errors are raised as DownloadError
+# subclasses, and the connection failures, timeouts and temporary errors (5xx, 408, 429) are retried with
+# the "retry" policy (see utilities_retry.retry_call). Every call is recorded in the transfer telemetry
+def download_HTTP(url, path_dest, file_name=None, timeout=60, retry=None):
+
+  os.makedirs(path_dest, exist_ok=True)
+  file_name = file_name or url.split('?')[0].split('/')[-1]
+  local_file = f'{path_dest}/{file_name}'
+  host = urllib.parse.urlsplit(url).netloc
+
+  # Check if the file exists
+  if os.path.exists(local_file):
+    get_telemetry().hit('http', host, None, file_name)
+    return file_name
+
+  # If not, download the file
+  with get_telemetry().transfer('http', host, None, file_name) as record:
+    record.cache = 'miss'
+
+    def attempt():
+      record.bytes = 0
+      try:
+        with urllib.request.urlopen(url, timeout=timeout) as response, open(local_file + '.part', 'wb') as f:
+          for block in iter(lambda: response.read(1024 * 1024), b''):
+            f.write(block)
+            record.bytes += len(block)
+      except OSError as e:
+        raise http_error(e, host, file_name) from e
+
+    def count_retry():
+      record.retries += 1
+
+    retry_call(attempt, host, retry, on_retry=count_retry)
+    os.replace(local_file + '.part', local_file)
+    record.status = 'downloaded'
+  return file_name
+
+# Function to translate an urllib error to a DownloadError subclass
+def http_error(e, host, file_name=None):
+  message = f'{host}: {e}'
+  if isinstance(e, urllib.error.HTTPError):
+    if e.code in (404, 410):
+      return FileNotAvailable(message, host, file_name)
+    if e.code in (401, 403):
+      return LoginRefused(message, host, file_name)
+    if e.code >= 500 or e.code in (408, 429):
+      return ConnectionFailed(message, host, file_name)
+    return DownloadError(message, host, file_name)
+  if isinstance(e, TimeoutError) or isinstance(getattr(e, 'reason', None), TimeoutError):
+    return TransferTimeout(message, host, file_name)
+  # Refused or lost connections, unknown hosts
+  return ConnectionFailed(message, host, file_name)
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to download a list of inputs at the same time, from a synchronous script. Each input is a tuple
+# with the engine method and its arguments, e.g.:
+#   ('ocean', 'ASC-B-d-nc', '20210628', 'Samples')
+#   ('cmi', '202106281250', 13, 'Samples')
+#   ('prod', '202201010000', 'ABI-L2-SSTF', 'Samples')
+#   ('http', 'http://goosbrasil.org:8080/pirata/B20n38w.nc', 'Samples')
+# The results are returned in the same order as the inputs. All the downloads run to the end, and each
+# failure is reported the same way, whatever the source ("File not available!" and the DownloadError, see
+# utilities_retry). Then the first error is raised, or, with return_exceptions=True, the errors are returned
+# in place of the failed results.
+def fetch_all(downloads, limits=None, return_exceptions=False, **kwargs):
+
+  async def main():
+    engine = FetchEngine(limits, **kwargs)
+    return await engine.gather(*[getattr(engine, method)(*args) for method, *args in downloads], return_exceptions=True)
+
+  results = asyncio.run(main())
+  errors = [result for result in results if isinstance(result, Exception)]
+  for (method, *args), result in zip(downloads, results):
+    if isinstance(result, Exception):
+      print(f"\nFile not available! ({method}: {', '.join(str(arg) for arg in args)})")
+      print(f'{type(result).__name__}: {result}')
+  if errors and not return_exceptions:
+    raise errors[0]
+  return results
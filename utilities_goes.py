@@ -3,14 +3,26 @@
 # Required modules
 import os                                # Miscellaneous operating system interfaces
 import numpy as np                       # Import the Numpy package
-import colorsys                          # To make convertion of colormaps
+from matplotlib.colors import LinearSegmentedColormap, hsv_to_rgb # To make convertion of colormaps
 import boto3                             # Amazon Web Services (AWS) SDK for Python
 from botocore import UNSIGNED            # boto3 config
 from botocore.config import Config       # boto3 config
+from botocore.exceptions import BotoCoreError, ClientError, ConnectTimeoutError, ReadTimeoutError # boto3 errors
+from boto3.s3.transfer import TransferConfig # Multipart transfers
+import threading                         # Lock for the shared S3 client
+import sqlite3                           # Local index of the S3 listings
+import re                                # Regular expressions
+import time as t                         # Time access and conversion
+from dataclasses import dataclass        # Data classes
+from concurrent.futures import ThreadPoolExecutor # Parallel downloads
 import math                              # Mathematical functions
-from datetime import datetime            # Basic Dates and time types
+import hashlib                           # Names of the cached warp plans
+from datetime import datetime, timedelta, timezone # Basic Dates and time types
+from utilities_telemetry import get_telemetry # Transfer telemetry
+from utilities_retry import retry_call, DownloadError, FileNotAvailable, LoginRefused, ConnectionFailed, TransferTimeout # Typed errors and retries
 from osgeo import osr                    # Python bindings for GDAL
 from osgeo import gdal                   # Python bindings for GDAL
+from netCDF4 import Dataset              # Read / Write NetCDF4 files (chunked reads)
 
 #from netCDF4 import Dataset          # Read / Write NetCDF4 files
 #import matplotlib.pyplot as plt      # Plotting library
@@ -19,76 +31,351 @@ from osgeo import gdal                   # Python bindings for GDAL
 #from datetime import timedelta, date, datetime   # Manipulate dates
 
 #-----------------------------------------------------------------------------------------------------------
+# CPT color tables (e.g. IR4AVHRR6.cpt, SVGAWVX_TEMP.cpt). Each line is a segment "x0 r0 g0 b0 x1 r1 g1 b1"
+# (RGB 0-255, or HSV with "COLOR_MODEL = HSV"), plus the background (B), foreground (F) and NaN (N) colors.
+# The tables are parsed once per file (path and modification time), so loops that load the same table for
+# every frame only read it the first time.
+_cpt_cache = {}
+_cpt_lock = threading.Lock()
+
+# Function to read a CPT file. Returns the colormap data (see LinearSegmentedColormap) and the B / F / N colors
+def parseCPT(path):
+
+    segments = []
+    special = {}
+    colorModel = 'RGB'
+    with open(path) as f:
+        for l in f:
+            ls = l.split()
+            if not ls:
+                continue
+            if ls[0].startswith('#'):
+                if ls[-1] == 'HSV':
+                    colorModel = 'HSV'
+                continue
+            if ls[0] in ('B', 'F', 'N'):
+                if len(ls) >= 4:
+                    special[ls[0]] = [float(value) for value in ls[1:4]]
+                continue
+            segments.append([float(value) for value in ls[:8]])
+
+    # Segment limits and colors (rows: x0, r0, g0, b0, x1, r1, g1, b1)
+    segments = np.array(segments)
+    x = np.append(segments[:, 0], segments[-1, 4])
+    names = [name for name in ('B', 'F', 'N') if name in special]
+    colors = np.concatenate((segments[:, 1:4], segments[:, 5:8], np.array([special[name] for name in names]).reshape(-1, 3)))
+    if colorModel == 'HSV':
+        colors = hsv_to_rgb(np.column_stack((colors[:, 0] / 360.0, colors[:, 1:3])))
+    else:
+        colors = colors / 255.0
+    n = segments.shape[0]
+    start, end = colors[:n], colors[n:2 * n]
+    special = {name: tuple(color) for name, color in zip(names, colors[2 * n:])}
+
+    # Each limit takes the color at the end of the previous segment (below) and at the start of the next
+    # segment (above), so discontinuities between segments are kept
+    below = np.concatenate((start[:1], end))
+    above = np.concatenate((start, end[-1:]))
+    xNorm = (x - x[0])/(x[-1] - x[0])
+
+    colorDict = {}
+    for i, color in enumerate(('red', 'green', 'blue')):
+        colorDict[color] = np.column_stack((xNorm, below[:, i], above[:, i])).tolist()
+    return colorDict, special
+
+# Function to load a CPT file as a matplotlib colormap (B / F / N: under / over / bad colors). Returns None
+# if the file does not exist
 def loadCPT(path):
 
     try:
-        f = open(path)
-    except:
+        key = (os.path.abspath(path), os.path.getmtime(path))
+    except OSError:
         print ("File ", path, "not found")
         return None
 
-    lines = f.readlines()
-
-    f.close()
-
-    x = np.array([])
-    r = np.array([])
-    g = np.array([])
-    b = np.array([])
-
-    colorModel = 'RGB'
+    with _cpt_lock:
+        cmap = _cpt_cache.get(key)
+    if cmap is None:
+        colorDict, special = parseCPT(path)
+        cmap = LinearSegmentedColormap(os.path.splitext(os.path.basename(path))[0], colorDict)
+        if 'B' in special:
+            cmap.set_under(special['B'])
+        if 'F' in special:
+            cmap.set_over(special['F'])
+        if 'N' in special:
+            cmap.set_bad(special['N'])
+        with _cpt_lock:
+            _cpt_cache[key] = cmap
+    # A copy, so changes of the caller (e.g. set_under) do not change the cached colormap
+    return cmap.copy()
 
-    for l in lines:
-        ls = l.split()
-        if l[0] == '#':
-            if ls[-1] == 'HSV':
-                colorModel = 'HSV'
-                continue
-            else:
-                continue
-        if ls[0] == 'B' or ls[0] == 'F' or ls[0] == 'N':
-            pass
-        else:
-            x=np.append(x,float(ls[0]))
-            r=np.append(r,float(ls[1]))
-            g=np.append(g,float(ls[2]))
-            b=np.append(b,float(ls[3]))
-            xtemp = float(ls[4])
-            rtemp = float(ls[5])
-            gtemp = float(ls[6])
-            btemp = float(ls[7])
-
-        x=np.append(x,xtemp)
-        r=np.append(r,rtemp)
-        g=np.append(g,gtemp)
-        b=np.append(b,btemp)
+#-----------------------------------------------------------------------------------------------------------
+# S3 client shared by the download functions. It is created on the first download and reused afterwards,
+# so loops over many dates keep the same connection pool. A different client (e.g. a moto or local S3
+# stand-in) can be installed with set_s3_client, or passed to each function with "s3_client".
+_s3_client = None
+_s3_lock = threading.Lock()
+
+# Maximum number of simultaneous connections of the shared client
+S3_MAX_CONNECTIONS = 32
+
+# Multipart download of the large files (full disk files have ~60 to 400 MB)
+s3_transfer_config = TransferConfig(multipart_threshold=16 * 1024 * 1024,
+                                    multipart_chunksize=16 * 1024 * 1024,
+                                    max_concurrency=8,
+                                    use_threads=True)
+
+def get_s3_client():
+  global _s3_client
+  with _s3_lock:
+    if _s3_client is None:
+      _s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED, max_pool_connections=S3_MAX_CONNECTIONS))
+  return _s3_client
+
+def set_s3_client(s3_client):
+  global _s3_client
+  with _s3_lock:
+    _s3_client = s3_client
 
-    if colorModel == 'HSV':
-        for i in range(r.shape[0]):
-            rr, gg, bb = colorsys.hsv_to_rgb(r[i]/360.,g[i],b[i])
-        r[i] = rr ; g[i] = gg ; b[i] = bb
+#-----------------------------------------------------------------------------------------------------------
+# Local index of the S3 listings (SQLite). Instead of one LIST request per download, each folder of a
+# product ("hour": ABI-L2-SSTF/2022/001/00/, the default, or "day": ABI-L2-SSTF/2022/001/) is listed once,
+# with a paginated listing, and stored locally. A day folder has 24 times the objects of an hour folder, so
+# "day" only pays off when the downloads cover most of each day. Key prefix searches and nearest scan start
+# lookups are then B-tree queries on the local database. Listings of recent folders expire after "ttl"
+# seconds, or when they were taken before the requested scan start, and a lookup that misses in a recent
+# folder lists it again once (new scans are still being added to them). Folders older than "archive_after"
+# seconds are complete and never listed again.
+class S3ListingIndex:
+
+  def __init__(self, path, ttl=600, archive_after=2*86400, granularity='hour'):
+    self.path = path                    # SQLite database (':memory:' for a per-process index)
+    self.ttl = ttl                      # Expiration of the listings of recent folders (seconds)
+    self.archive_after = archive_after  # Age of a folder after which its listing never expires (seconds)
+    self.depth = {'day': 3, 'hour': 4}[granularity] # Number of key components of a folder
+    if path != ':memory:':
+      os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    self._lock = threading.Lock()
+    self._folder_locks = {}
+    self._db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+    with self._db:
+      self._db.execute('CREATE TABLE IF NOT EXISTS listings (bucket TEXT, folder TEXT, listed_at REAL, PRIMARY KEY (bucket, folder))')
+      self._db.execute('CREATE TABLE IF NOT EXISTS objects (bucket TEXT, key TEXT, folder TEXT, series TEXT, scan_start REAL, size INTEGER, PRIMARY KEY (bucket, key))')
+      self._db.execute('CREATE INDEX IF NOT EXISTS objects_scan ON objects (bucket, series, scan_start)')
+
+  # Folder of a key or prefix ('ABI-L2-SSTF/2022/001/00/' for an "hour" index)
+  def folder(self, key):
+    return '/'.join(key.split('/')[:self.depth]) + '/'
+
+  # Series ('OR_ABI-L2-SSTF-M6_G16') and scan start (epoch seconds) of a file name
+  @staticmethod
+  def parse_key(key):
+    match = re.match(r'(.*)_s(\d{13})(\d?)_', key.split('/')[-1])
+    if match is None:
+      return None, None
+    scan_start = datetime.strptime(match.group(2), '%Y%j%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+    return match.group(1), scan_start + int(match.group(3) or 0) / 10
+
+  def _archived(self, folder, listed_at):
+    # Date of the folder (product/year/day_of_year[/hour]/)
+    parts = folder.split('/')
+    folder_date = datetime.strptime('/'.join(parts[1:self.depth]), '%Y/%j' if self.depth == 3 else '%Y/%j/%H').replace(tzinfo=timezone.utc)
+    folder_end = folder_date.timestamp() + (86400 if self.depth == 3 else 3600)
+    return listed_at - folder_end > self.archive_after
+
+  def _expired(self, folder, listed_at, since=None):
+    # A listing taken before "since" (epoch seconds, the requested scan start) cannot have the scan
+    if self._archived(folder, listed_at):
+      return False
+    return t.time() - listed_at > self.ttl or (since is not None and listed_at < since)
+
+  def refresh(self, s3_client, bucket, folder):
+    # List the whole folder (paginated) and replace its objects in the index
+    rows = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=folder):
+      for obj in page.get('Contents', []):
+        series, scan_start = self.parse_key(obj['Key'])
+        rows.append((bucket, obj['Key'], folder, series, scan_start, obj['Size']))
+    with self._lock, self._db:
+      self._db.execute('DELETE FROM objects WHERE bucket = ? AND folder = ?', (bucket, folder))
+      self._db.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)', rows)
+      self._db.execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?)', (bucket, folder, t.time()))
+
+  def ensure(self, s3_client, bucket, folder, since=None, recent=False):
+    # List the folder if it is not in the index or if its listing expired ("since": requested scan start,
+    # epoch seconds). With recent=True, list it again unless it is archived (a lookup missed in it). Threads
+    # asking for the same folder wait for a single listing. Returns True if the folder was listed
+    with self._lock:
+      folder_lock = self._folder_locks.setdefault((bucket, folder), threading.Lock())
+    with folder_lock:
+      with self._lock:
+        row = self._db.execute('SELECT listed_at FROM listings WHERE bucket = ? AND folder = ?', (bucket, folder)).fetchone()
+      if row is None or self._expired(folder, row[0], since) or (recent and not self._archived(folder, row[0])):
+        host = s3_host(bucket)
+        retry_call(lambda: s3_request(host, None, self.refresh, s3_client, bucket, folder), host)
+        return True
+    return False
+
+  def list_objects(self, s3_client, bucket, prefix, since=None):
+    # Same result as list_objects_v2(Bucket=bucket, Prefix=prefix) for a prefix inside one folder. "since":
+    # scan start of the prefix (datetime, UTC), a listing taken before it is stale
+    since = since.replace(tzinfo=timezone.utc).timestamp() if since is not None else None
+    folder = self.folder(prefix)
+    listed = self.ensure(s3_client, bucket, folder, since)
+    rows = self._keys(bucket, prefix)
+    # A miss in a folder still being filled: the file may have been published after the listing
+    if not rows and not listed and self.ensure(s3_client, bucket, folder, recent=True):
+      rows = self._keys(bucket, prefix)
+    result = {'KeyCount': len(rows)}
+    if rows:
+      result['Contents'] = [{'Key': key, 'Size': size} for key, size in rows]
+    return result
+
+  def _keys(self, bucket, prefix):
+    with self._lock:
+      return self._db.execute('SELECT key, size FROM objects WHERE bucket = ? AND key >= ? AND key < ? ORDER BY key',
+                              (bucket, prefix, prefix + '\uffff')).fetchall()
+
+  def _nearest(self, bucket, series, target, tolerance):
+    with self._lock:
+      after = self._db.execute('SELECT key, scan_start, size FROM objects WHERE bucket = ? AND series = ? AND scan_start >= ? ORDER BY scan_start LIMIT 1',
+                               (bucket, series, target)).fetchone()
+      before = self._db.execute('SELECT key, scan_start, size FROM objects WHERE bucket = ? AND series = ? AND scan_start < ? ORDER BY scan_start DESC LIMIT 1',
+                                (bucket, series, target)).fetchone()
+    candidates = [row for row in (after, before) if row is not None and abs(row[1] - target) <= tolerance.total_seconds()]
+    return min(candidates, key=lambda row: abs(row[1] - target)) if candidates else None
+
+  def nearest(self, s3_client, bucket, product_name, series, when, tolerance=timedelta(minutes=0)):
+    # Object of the series with the scan start closest to "when" (a datetime, UTC), within +/- tolerance.
+    # Returns (key, scan start (datetime), size) or None.
+    when = when.replace(tzinfo=timezone.utc)
+    # Only the folders of the hours covered by the tolerance are listed
+    folders = []
+    date = (when - tolerance).replace(minute=0, second=0, microsecond=0)
+    while date <= when + tolerance:
+      folder = self.folder(f'{product_name}/{date:%Y/%j/%H}/')
+      if folder not in folders:
+        folders.append(folder)
+      date += timedelta(hours=1)
+    target = when.timestamp()
+    listed = {folder: self.ensure(s3_client, bucket, folder, target) for folder in folders}
+    found = self._nearest(bucket, series, target, tolerance)
+    # A miss: the recent folders not listed now may have scans published after their listing
+    if found is None and any([self.ensure(s3_client, bucket, folder, recent=True) for folder in folders if not listed[folder]]):
+      found = self._nearest(bucket, series, target, tolerance)
+    if found is None:
+      return None
+    key, scan_start, size = found
+    return key, datetime.fromtimestamp(scan_start, timezone.utc), size
+
+# Listing index shared by the download functions
+S3_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'goes_s3_index.sqlite')
+_s3_index = None
+
+def get_s3_index():
+  global _s3_index
+  with _s3_lock:
+    if _s3_index is None:
+      _s3_index = S3ListingIndex(S3_INDEX_PATH)
+  return _s3_index
+
+def set_s3_index(s3_index):
+  global _s3_index
+  with _s3_lock:
+    _s3_index = s3_index
 
-    if colorModel == 'RGB':
-        r = r/255.0
-        g = g/255.0
-        b = b/255.0
+#-----------------------------------------------------------------------------------------------------------
+# S3 errors: the boto3 errors are translated to DownloadError subclasses (see utilities_retry), and the
+# listings and downloads are retried (connection failures, timeouts and 5xx replies) with the circuit
+# breaker of the bucket host.
+def s3_host(bucket_name):
+  return f'{bucket_name}.s3.amazonaws.com'
+
+# Function to translate a boto3 error to a DownloadError subclass
+def s3_error(e, host, file_name=None):
+  message = f'{host}: {e}'
+  if isinstance(e, ClientError):
+    code = str(e.response.get('Error', {}).get('Code'))
+    status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    if code in ('404', 'NoSuchKey', 'NoSuchBucket'):
+      return FileNotAvailable(message, host, file_name)
+    if code in ('403', 'AccessDenied', 'InvalidAccessKeyId', 'SignatureDoesNotMatch'):
+      return LoginRefused(message, host, file_name)
+    if status >= 500 or code in ('SlowDown', 'Throttling', 'RequestTimeout'):
+      return ConnectionFailed(message, host, file_name)
+    return DownloadError(message, host, file_name)
+  if isinstance(e, (ConnectTimeoutError, ReadTimeoutError, TimeoutError)):
+    return TransferTimeout(message, host, file_name)
+  return ConnectionFailed(message, host, file_name)
+
+# Function to call a boto3 function, raising DownloadError subclasses
+def s3_request(host, file_name, function, *args, **kwargs):
+  try:
+    return function(*args, **kwargs)
+  except (ClientError, BotoCoreError, OSError) as e:
+    raise s3_error(e, host, file_name) from e
 
-    xNorm = (x - x[0])/(x[-1] - x[0])
+#-----------------------------------------------------------------------------------------------------------
+# Function to download an S3 object to a local file (skipped if it exists), recording the transfer in the
+# telemetry (see utilities_telemetry). Returns 'exists' or 'downloaded'
+def fetch_S3(s3_client, bucket_name, key, local_file, product_name):
+
+  host = s3_host(bucket_name)
+  if os.path.exists(local_file):
+    get_telemetry().hit('s3', host, product_name, os.path.basename(local_file))
+    return 'exists'
+
+  with get_telemetry().transfer('s3', host, product_name, os.path.basename(local_file)) as record:
+    record.cache = 'miss'
+    # Bytes received (the callback is called by the transfer threads)
+    lock = threading.Lock()
+    def received(size):
+      with lock:
+        record.bytes += size
+    def count_retry():
+      record.retries += 1
+    retry_call(lambda: s3_request(host, os.path.basename(local_file), s3_client.download_file, bucket_name, key, local_file,
+                                  Config=s3_transfer_config, Callback=received), host, on_retry=count_retry)
+    record.status = 'downloaded'
+  return 'downloaded'
 
-    red   = []
-    blue  = []
-    green = []
+#-----------------------------------------------------------------------------------------------------------
+# Nearest available scan: when the scan of the requested time is late or missing, the download functions
+# can take the closest scan within +/- "tolerance" minutes (found with one listing of the folder) and return
+# a GOESFile instead of the file name.
+@dataclass(frozen=True)
+class GOESFile:
+  key: str              # S3 key
+  scan_start: datetime  # Scan start time (UTC)
+  size: int             # Size (bytes)
+  file_name: str        # Local file name, without the ".nc" extension
+
+def download_nearest(yyyymmddhhmn, product_name, series, tolerance, path_dest, s3_client=None, bucket_name='noaa-goes16'):
 
-    for i in range(len(x)):
-        red.append([xNorm[i],r[i],r[i]])
-        green.append([xNorm[i],g[i],g[i]])
-        blue.append([xNorm[i],b[i],b[i]])
+  os.makedirs(path_dest, exist_ok=True)
 
-    colorDict = {'red': red, 'green': green, 'blue': blue}
+  # S3 client (shared by all the calls, unless one is given)
+  s3_client = s3_client or get_s3_client()
+
+  # Closest scan within the tolerance
+  date = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M')
+  found = get_s3_index().nearest(s3_client, bucket_name, product_name, series, date, timedelta(minutes=tolerance))
+  if found is None:
+    print(f'No files found for the date: {yyyymmddhhmn} +/- {tolerance} min, {series}')
+    return None
+  key, scan_start, size = found
+
+  # Download the file (see fetch_S3)
+  file_name = key.split('/')[-1].split('.')[0]
+  if os.path.exists(f'{path_dest}/{file_name}.nc'):
+    print(f'File {path_dest}/{file_name}.nc exists')
+  else:
+    print(f'Downloading file {path_dest}/{file_name}.nc')
+  fetch_S3(s3_client, bucket_name, key, f'{path_dest}/{file_name}.nc', product_name)
+  return GOESFile(key, scan_start, size, file_name)
 
-    return colorDict
 #-----------------------------------------------------------------------------------------------------------
-def download_CMI(yyyymmddhhmn, band, path_dest):
+def download_CMI(yyyymmddhhmn, band, path_dest, s3_client=None, tolerance=None):
 
   os.makedirs(path_dest, exist_ok=True)
 
@@ -102,14 +389,18 @@ def download_CMI(yyyymmddhhmn, band, path_dest):
   bucket_name = 'noaa-goes16'
   product_name = 'ABI-L2-CMIPF'
 
-  # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  # S3 client (shared by all the calls, unless one is given)
+  s3_client = s3_client or get_s3_client()
+
+  # Closest scan within +/- tolerance minutes (returns a GOESFile or None)
+  if tolerance is not None:
+    return download_nearest(yyyymmddhhmn, product_name, f'OR_{product_name}-M6C{int(band):02.0f}_G16', tolerance, path_dest, s3_client, bucket_name)
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6C{int(band):02.0f}_G16_s{year}{day_of_year}{hour}{min}'
 
-  # Seach for the file on the server
-  s3_result = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, Delimiter = "/")
+  # Seach for the file on the server (local listing index, see S3ListingIndex)
+  s3_result = get_s3_index().list_objects(s3_client, bucket_name, prefix, datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M'))
 
   #-----------------------------------------------------------------------------------------------------------
   # Check if there are files available
@@ -124,19 +415,28 @@ def download_CMI(yyyymmddhhmn, band, path_dest):
       # Print the file name
       file_name = key.split('/')[-1].split('.')[0]
 
-      # Download the file
+      # Download the file (see fetch_S3)
       if os.path.exists(f'{path_dest}/{file_name}.nc'):
         print(f'File {path_dest}/{file_name}.nc exists')
       else:
         print(f'Downloading file {path_dest}/{file_name}.nc')
-        s3_client.download_file(bucket_name, key, f'{path_dest}/{file_name}.nc')
+      fetch_S3(s3_client, bucket_name, key, f'{path_dest}/{file_name}.nc', product_name)
   return f'{file_name}'
 
 #-----------------------------------------------------------------------------------------------------------
-def download_PROD(yyyymmddhhmn, product_name, path_dest):
+def download_PROD(yyyymmddhhmn, product_name, path_dest, s3_client=None, tolerance=None, cache=None, pin=False):
 
   os.makedirs(path_dest, exist_ok=True)
 
+  # Managed cache (see utilities_cache.DataCache): no listing needed for the files in the manifest. With
+  # pin=True the file is pinned in the cache (not evicted until released, see DataCache.pin)
+  if cache is not None and tolerance is None:
+    file_name = cache.lookup(product_name, yyyymmddhhmn, pin=pin)
+    if file_name is not None:
+      print(f'File {path_dest}/{file_name} exists')
+      get_telemetry().hit('s3', s3_host('noaa-goes16'), product_name, file_name)
+      return file_name[:-len('.nc')]
+
   year = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%Y')
   day_of_year = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%j')
   hour = datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M').strftime('%H')
@@ -146,14 +446,18 @@ def download_PROD(yyyymmddhhmn, product_name, path_dest):
   # https://noaa-goes16.s3.amazonaws.com/index.html
   bucket_name = 'noaa-goes16'
 
-  # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  # S3 client (shared by all the calls, unless one is given)
+  s3_client = s3_client or get_s3_client()
+
+  # Closest scan within +/- tolerance minutes (returns a GOESFile or None)
+  if tolerance is not None:
+    return download_nearest(yyyymmddhhmn, product_name, f'OR_{product_name}-M6_G16', tolerance, path_dest, s3_client, bucket_name)
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}-M6_G16_s{year}{day_of_year}{hour}{min}'
 
-  # Seach for the file on the server
-  s3_result = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, Delimiter = "/")
+  # Seach for the file on the server (local listing index, see S3ListingIndex)
+  s3_result = get_s3_index().list_objects(s3_client, bucket_name, prefix, datetime.strptime(yyyymmddhhmn, '%Y%m%d%H%M'))
 
   #-----------------------------------------------------------------------------------------------------------
   # Check if there are files available
@@ -168,16 +472,45 @@ def download_PROD(yyyymmddhhmn, product_name, path_dest):
       # Print the file name
       file_name = key.split('/')[-1].split('.')[0]
 
-      # Download the file
+      # Download the file (see fetch_S3)
       if os.path.exists(f'{path_dest}/{file_name}.nc'):
         print(f'File {path_dest}/{file_name}.nc exists')
       else:
         print(f'Downloading file {path_dest}/{file_name}.nc')
-        s3_client.download_file(bucket_name, key, f'{path_dest}/{file_name}.nc')
+      fetch_S3(s3_client, bucket_name, key, f'{path_dest}/{file_name}.nc', product_name)
+
+  # Record the file in the managed cache
+  if cache is not None:
+    cache.add(product_name, yyyymmddhhmn, f'{file_name}.nc', pin=pin)
   return f'{file_name}'
 
 #-----------------------------------------------------------------------------------------------------------
-def download_GLM(yyyymmddhhmnss, path_dest):
+# Function to download a product for every timestamp between "start" and "end" (YYYYMMDDHHMN, inclusive),
+# every "step" minutes. The files are downloaded in parallel and the file names are returned in the same
+# order as the timestamps (-1 for the timestamps without files). With a cache, the files of the range are
+# pinned, so the downloads of the range do not evict each other, until the caller releases them after
+# processing them (see DataCache.release).
+def download_PROD_range(start, end, step, product_name, path_dest, max_workers=8, s3_client=None, cache=None):
+
+  os.makedirs(path_dest, exist_ok=True)
+
+  # S3 client (shared by all the downloads)
+  s3_client = s3_client or get_s3_client()
+
+  # Timestamps to download
+  date = datetime.strptime(start, '%Y%m%d%H%M')
+  date_end = datetime.strptime(end, '%Y%m%d%H%M')
+  dates = []
+  while date <= date_end:
+    dates.append(date.strftime('%Y%m%d%H%M'))
+    date = date + timedelta(minutes=step)
+
+  # Download the files in parallel
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    return list(executor.map(lambda yyyymmddhhmn: download_PROD(yyyymmddhhmn, product_name, path_dest, s3_client, cache=cache, pin=True), dates))
+
+#-----------------------------------------------------------------------------------------------------------
+def download_GLM(yyyymmddhhmnss, path_dest, s3_client=None):
 
   os.makedirs(path_dest, exist_ok=True)
 
@@ -191,15 +524,15 @@ def download_GLM(yyyymmddhhmnss, path_dest):
   # https://noaa-goes16.s3.amazonaws.com/index.html
   bucket_name = 'noaa-goes16'
 
-  # Initializes the S3 client
-  s3_client = boto3.client('s3', config=Config(signature_version=UNSIGNED))
+  # S3 client (shared by all the calls, unless one is given)
+  s3_client = s3_client or get_s3_client()
   #-----------------------------------------------------------------------------------------------------------
   # File structure
   product_name = "GLM-L2-LCFA"
   prefix = f'{product_name}/{year}/{day_of_year}/{hour}/OR_{product_name}_G16_s{year}{day_of_year}{hour}{min}{seg}'
 
-  # Seach for the file on the server
-  s3_result = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, Delimiter = "/")
+  # Seach for the file on the server (local listing index, see S3ListingIndex)
+  s3_result = get_s3_index().list_objects(s3_client, bucket_name, prefix, datetime.strptime(yyyymmddhhmnss, '%Y%m%d%H%M%S'))
 
   #-----------------------------------------------------------------------------------------------------------
   # Check if there are files available
@@ -214,28 +547,29 @@ def download_GLM(yyyymmddhhmnss, path_dest):
       # Print the file name
       file_name = key.split('/')[-1].split('.')[0]
 
-      # Download the file
+      # Download the file (see fetch_S3)
       if os.path.exists(f'{path_dest}/{file_name}.nc'):
         print(f'File {path_dest}/{file_name}.nc exists')
       else:
         print(f'Downloading file {path_dest}/{file_name}.nc')
-        s3_client.download_file(bucket_name, key, f'{path_dest}/{file_name}.nc')
+      fetch_S3(s3_client, bucket_name, key, f'{path_dest}/{file_name}.nc', product_name)
   return f'{file_name}'
 
 #-----------------------------------------------------------------------------------------------------------
 # Functions to convert lat / lon extent to array indices 
+# (single point: thin wrappers of geo2grid_array and latlon2xy_array, with the same results)
 def geo2grid(lat, lon, nc):
-
-    # Apply scale and offset 
-    xscale, xoffset = nc.variables['x'].scale_factor, nc.variables['x'].add_offset
-    yscale, yoffset = nc.variables['y'].scale_factor, nc.variables['y'].add_offset
-    
-    x, y = latlon2xy(lat, lon)
-    col = (x - xoffset)/xscale
-    lin = (y - yoffset)/yscale
-    return int(lin), int(col)
+    lines, cols, valid = geo2grid_array(lat, lon, nc, masked=False)
+    return int(lines), int(cols)
 
 def latlon2xy(lat, lon):
+    x, y, on_disk = latlon2xy_array(lat, lon)
+    return float(x), float(y)
+
+# Function to convert arrays of lat / lon (degrees) to GOES-16 scan angles x, y (radians). Returns x, y and the
+# mask of the points seen by the satellite (False: off-disk points, beyond the Earth's limb). "lon_0": longitude
+# of the satellite (None: GOES-16, -75.0)
+def latlon2xy_array(lat, lon, lon_0=None):
     # goes_imagery_projection:semi_major_axis
     req = 6378137 # meters
     #  goes_imagery_projection:inverse_flattening
@@ -246,28 +580,56 @@ def latlon2xy(lat, lon):
     # goes_imagery_projection:perspective_point_height + goes_imagery_projection:semi_major_axis
     H = 42164160 # meters
     # goes_imagery_projection: longitude_of_projection_origin
-    lambda0 = -1.308996939
+    lambda0 = -1.308996939 if lon_0 is None else lon_0 * (math.pi/180)
 
     # Convert to radians
-    latRad = lat * (math.pi/180)
-    lonRad = lon * (math.pi/180)
+    latRad = np.asarray(lat, dtype=np.float64) * (math.pi/180)
+    lonRad = np.asarray(lon, dtype=np.float64) * (math.pi/180)
 
     # (1) geocentric latitude
-    Phi_c = math.atan(((rpol * rpol)/(req * req)) * math.tan(latRad))
+    Phi_c = np.arctan(((rpol * rpol)/(req * req)) * np.tan(latRad))
+    cos_Phi_c = np.cos(Phi_c)
     # (2) geocentric distance to the point on the ellipsoid
-    rc = rpol/(math.sqrt(1 - ((e * e) * (math.cos(Phi_c) * math.cos(Phi_c)))))
+    rc = rpol/(np.sqrt(1 - ((e * e) * (cos_Phi_c * cos_Phi_c))))
     # (3) sx
-    sx = H - (rc * math.cos(Phi_c) * math.cos(lonRad - lambda0))
+    sx = H - (rc * cos_Phi_c * np.cos(lonRad - lambda0))
     # (4) sy
-    sy = -rc * math.cos(Phi_c) * math.sin(lonRad - lambda0)
+    sy = -rc * cos_Phi_c * np.sin(lonRad - lambda0)
     # (5)
-    sz = rc * math.sin(Phi_c)
+    sz = rc * np.sin(Phi_c)
 
     # x,y
-    x = math.asin((-sy)/math.sqrt((sx*sx) + (sy*sy) + (sz*sz)))
-    y = math.atan(sz/sx)
+    x = np.arcsin((-sy)/np.sqrt((sx*sx) + (sy*sy) + (sz*sz)))
+    y = np.arctan(sz/sx)
+
+    # Points seen by the satellite: the satellite is above the tangent plane of the ellipsoid at the point
+    on_disk = sx * (H - sx) >= (sy * sy) + ((req * req)/(rpol * rpol)) * (sz * sz)
+
+    return x, y, on_disk
+
+# Function to convert arrays of lat / lon to lines and columns of the grid of an ABI file (netCDF4.Dataset),
+# e.g. to extract the values at buoy, ship or station locations:
+#   lines, cols, valid = geo2grid_array(lats, lons, nc)
+#   values = data[lines[valid], cols[valid]]
+# Returns integer arrays and the mask of the valid points (on the disk and inside the grid). With "masked",
+# the lines and columns of the invalid points are set to -1
+def geo2grid_array(lat, lon, nc, masked=True):
+
+    # Apply scale and offset 
+    xscale, xoffset = nc.variables['x'].scale_factor, nc.variables['x'].add_offset
+    yscale, yoffset = nc.variables['y'].scale_factor, nc.variables['y'].add_offset
+
+    x, y, on_disk = latlon2xy_array(lat, lon)
+    col = (x - xoffset)/xscale
+    lin = (y - yoffset)/yscale
+    # Truncated towards zero
+    lines, cols = np.trunc(lin).astype(np.int64), np.trunc(col).astype(np.int64)
 
-    return x, y
+    valid = on_disk & (lines >= 0) & (lines < nc.variables['y'].shape[0]) & (cols >= 0) & (cols < nc.variables['x'].shape[0])
+    if masked:
+        lines = np.where(valid, lines, -1)
+        cols = np.where(valid, cols, -1)
+    return lines, cols, valid
 
 # Function to convert lat / lon extent to GOES-16 extents
 def convertExtent2GOESProjection(extent):
@@ -281,8 +643,118 @@ def convertExtent2GOESProjection(extent):
     return (a * GOES16_HEIGHT, c * GOES16_HEIGHT, b * GOES16_HEIGHT, d * GOES16_HEIGHT)
 
 #-----------------------------------------------------------------------------------------------------------
-# Function to reproject the data
-def reproject(file_name, ncfile, array, extent, undef):
+# Chunked reader of the ABI L2 variables: a full disk variable (5424 x 5424) read with ReadAsArray().astype(float)
+# takes two float64 copies of ~235 MB (data and DQF), plus the temporaries of the scale / offset. read_GOES
+# reads only the rows and columns of the requested extent, in blocks of rows, and decodes the packed values
+# (scale and offset) straight into a float32 output, applying the fill value and DQF masks block by block.
+# The output plus the blocks stay within "max_bytes", so several days can be processed at the same time.
+@dataclass(frozen=True)
+class GOESWindow:
+  row: int              # First row of the window (full disk)
+  col: int              # First column of the window (full disk)
+  rows: int             # Number of rows
+  cols: int             # Number of columns
+  geotransform: tuple   # GDAL geotransform of the window (GOES projection, meters)
+
+# Function to find the window (rows and columns) of a lat / lon extent [min. lon, min. lat, max. lon, max. lat]
+# on the GOES fixed grid of an open ABI L2 file (netCDF4.Dataset). A lat / lon rectangle is not a rectangle in
+# the GOES projection, so the limits are taken from points along its four sides (see
+# convertExtent2GOESProjection), plus a margin of "margin" pixels for the reprojection
+def goes_window(nc, extent=None, margin=2, samples=32):
+
+  x, y = nc.variables['x'], nc.variables['y']
+  height = float(nc.variables['goes_imager_projection'].perspective_point_height)
+  xscale, xoffset = float(x.scale_factor), float(x.add_offset)
+  yscale, yoffset = float(y.scale_factor), float(y.add_offset)
+  n_rows, n_cols = y.shape[0], x.shape[0]
+
+  if extent is None:
+    row1, row2, col1, col2 = 0, n_rows, 0, n_cols
+  else:
+    xs, ys = [], []
+    lats = np.linspace(extent[1], extent[3], samples)
+    if extent[1] < 0 < extent[3]:
+      lats = np.append(lats, 0.0)
+    for lon in np.linspace(extent[0], extent[2], samples):
+      # Bottom and top sides
+      x1, x2, y1, y2 = convertExtent2GOESProjection([lon, extent[1], lon, extent[3]])
+      xs += [x1, x2]; ys += [y1, y2]
+    for lat in lats:
+      # Left and right sides (the widest part of the extent is the latitude nearest to the equator)
+      x1, x2, y1, y2 = convertExtent2GOESProjection([extent[0], lat, extent[2], lat])
+      xs += [x1, x2]; ys += [y1, y2]
+    # Meters (GOES-16 height) to scan angles (radians) to rows / columns
+    cols = (np.array(xs) / 35786023.0 - xoffset) / xscale
+    rows = (np.array(ys) / 35786023.0 - yoffset) / yscale
+    col1 = min(max(int(math.floor(np.nanmin(cols))) - margin, 0), n_cols)
+    col2 = min(max(int(math.ceil(np.nanmax(cols))) + margin + 1, 0), n_cols)
+    row1 = min(max(int(math.floor(np.nanmin(rows))) - margin, 0), n_rows)
+    row2 = min(max(int(math.ceil(np.nanmax(rows))) + margin + 1, 0), n_rows)
+
+  # Corner of the first pixel (the coordinates are the pixel centers)
+  geotransform = ((xoffset + (col1 - 0.5) * xscale) * height, xscale * height, 0.0,
+                  (yoffset + (row1 - 0.5) * yscale) * height, 0.0, yscale * height)
+  return GOESWindow(row1, col1, row2 - row1, col2 - col1, geotransform)
+
+# Function to view packed values as unsigned values if the variable has "_Unsigned" set (e.g. SST, DQF)
+def _unsigned(variable, values):
+  if getattr(variable, '_Unsigned', 'false') == 'true' and values.dtype.kind == 'i':
+    return values.view(f'u{values.dtype.itemsize}')
+  return values
+
+# Function to read an ABI L2 variable (e.g. 'SST', 'CMI') within an extent, e.g.:
+#   data, window = read_GOES(f'{input}/{file_name}.nc', 'SST', extent)
+#   reproject(filename_ret, img, data, extent, undef, geotransform=window.geotransform)
+# Returns the float32 values (NaN: fill values and pixels with DQF > "dqf", None: no DQF mask) and the GOESWindow
+def read_GOES(path, var, extent=None, dqf=1, max_bytes=256e6):
+
+  with Dataset(path) as nc:
+    window = goes_window(nc, extent)
+    variable = nc.variables[var]
+    variable.set_auto_maskandscale(False)
+    scale = np.float32(getattr(variable, 'scale_factor', 1.0))
+    offset = np.float32(getattr(variable, 'add_offset', 0.0))
+    fill = getattr(variable, '_FillValue', None)
+    if fill is not None:
+      fill = _unsigned(variable, np.array(fill, dtype=variable.dtype))
+    flags = None
+    if dqf is not None and 'DQF' in nc.variables:
+      flags = nc.variables['DQF']
+      flags.set_auto_maskandscale(False)
+
+    # Block size: the output plus, per pixel of a block, the packed values, the DQF and two masks
+    data = np.empty((window.rows, window.cols), dtype=np.float32)
+    block_pixel = variable.dtype.itemsize + (flags.dtype.itemsize if flags is not None else 0) + 2
+    block_rows = int((max_bytes - data.nbytes) // (block_pixel * max(window.cols, 1)))
+    if block_rows < 1:
+      raise MemoryError(f'{path}: the {window.rows} x {window.cols} window of {var} does not fit in {max_bytes / 1e6:.0f} MB')
+
+    cols = slice(window.col, window.col + window.cols)
+    for row in range(0, window.rows, block_rows):
+      block = data[row:row + block_rows]
+      rows = slice(window.row + row, window.row + row + block.shape[0])
+      raw = _unsigned(variable, variable[rows, cols])
+      invalid = raw == fill if fill is not None else np.zeros(raw.shape, dtype=bool)
+      np.multiply(raw, scale, out=block, casting='unsafe')
+      del raw
+      block += offset
+      if flags is not None:
+        invalid |= _unsigned(flags, flags[rows, cols]) > dqf
+      block[invalid] = np.nan
+  return data, window
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to reproject the data. Returns the reprojected array (row 0: north, as "Band1" read from the NetCDF
+# file) and its GDAL geotransform (lat / lon). The warp is done in memory (MEM), and the NetCDF file is only
+# written if "file_name" is given (None: no file)
+def reproject(file_name, ncfile, array, extent, undef, geotransform=None, plan=None):
+
+    # Precomputed warp (see warp_plan)
+    if plan is not None:
+        data = plan.apply(array, geotransform, undef)
+        if file_name is not None:
+            write_plan(file_name, plan, data)
+        return data, plan.geotransform
 
     # Read the original file projection and configure the output projection
     source_prj = osr.SpatialReference()
@@ -292,14 +764,15 @@ def reproject(file_name, ncfile, array, extent, undef):
     target_prj.ImportFromProj4("+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs")
    
     # Reproject the data
-    GeoT = ncfile.GetGeoTransform()
+    # (geotransform: window of the array, see read_GOES. None: full disk)
+    GeoT = geotransform or ncfile.GetGeoTransform()
     driver = gdal.GetDriverByName('MEM')
-    raw = driver.Create('raw', array.shape[0], array.shape[1], 1, gdal.GDT_Float32)
+    raw = driver.Create('raw', array.shape[1], array.shape[0], 1, gdal.GDT_Float32)
     raw.SetGeoTransform(GeoT)
     raw.GetRasterBand(1).WriteArray(array)
 
-    # Define the parameters of the output file  
-    kwargs = {'format': 'netCDF', \
+    # Define the parameters of the output  
+    kwargs = {'format': 'MEM', \
             'srcSRS': source_prj, \
             'dstSRS': target_prj, \
             'outputBounds': (extent[0], extent[3], extent[2], extent[1]), \
@@ -309,6 +782,147 @@ def reproject(file_name, ncfile, array, extent, undef):
             'dstNodata': 'nan', \
             'resampleAlg': gdal.GRA_NearestNeighbour}
 
-    # Write the reprojected file on disk
-    gdal.Warp(file_name, raw, **kwargs)
+    # Reproject in memory
+    warped = gdal.Warp('', raw, **kwargs)
+
+    # Write the reprojected file on disk (optional)
+    if file_name is not None:
+        gdal.Translate(file_name, warped, format='netCDF')
 
+    # Reprojected array, with the first row at the north
+    data = warped.GetRasterBand(1).ReadAsArray()
+    GeoT = warped.GetGeoTransform()
+    if GeoT[5] > 0:
+        data = data[::-1]
+        GeoT = (GeoT[0], GeoT[1], GeoT[2], GeoT[3] + GeoT[5] * data.shape[0], GeoT[4], -GeoT[5])
+    return data, GeoT
+
+#-----------------------------------------------------------------------------------------------------------
+# Warp plans: the reprojection of the GOES fixed grid to a lat / lon grid is the same for every image of a
+# satellite and extent, so it is computed once: the (nearest) full disk line and column of each output pixel.
+# Reprojecting an image is then a single gather (array[lines, cols]). The plans are cached in memory and on
+# disk (.npy, "WARP_PLANS" environment variable: directory), by satellite, source grid, extent and resolution.
+#-----------------------------------------------------------------------------------------------------------
+WARP_PLAN_PATH = os.environ.get('WARP_PLANS', os.path.expanduser('~/.cache/warp_plans'))
+
+class WarpPlan:
+
+    def __init__(self, lines, cols, extent, resolution, source_geotransform):
+        self.lines = lines                               # Full disk line of each output pixel (-1: off-disk)
+        self.cols = cols                                 # Full disk column of each output pixel (-1: off-disk)
+        self.extent = tuple(extent)                      # [min. lon, min. lat, max. lon, max. lat]
+        self.resolution = resolution                     # Output resolution (degrees)
+        self.source_geotransform = source_geotransform   # GDAL geotransform of the full disk
+        self._indices = {}                               # Gather indices of each source window
+
+    @property
+    def shape(self):
+        return self.lines.shape
+
+    # GDAL geotransform of the output (lat / lon)
+    @property
+    def geotransform(self):
+        return (self.extent[0], self.resolution, 0.0, self.extent[3], 0.0, -self.resolution)
+
+    # Output pixels with data and their flat indices on a source window (cached per window)
+    def indices(self, shape, geotransform=None):
+        row = col = 0
+        if geotransform is not None:
+            col = int(round((geotransform[0] - self.source_geotransform[0]) / self.source_geotransform[1]))
+            row = int(round((geotransform[3] - self.source_geotransform[3]) / self.source_geotransform[5]))
+        key = (row, col) + tuple(shape)
+        if key not in self._indices:
+            lines, cols = self.lines.astype(np.int64) - row, self.cols.astype(np.int64) - col
+            valid = (self.lines >= 0) & (lines >= 0) & (lines < shape[0]) & (cols >= 0) & (cols < shape[1])
+            self._indices[key] = (np.flatnonzero(valid), lines[valid] * shape[1] + cols[valid])
+        return self._indices[key]
+
+    # Function to reproject an array (full disk, or the window of "geotransform", see read_GOES). Returns float32,
+    # NaN off-disk, outside the window and where the array is "undef"
+    def apply(self, array, geotransform=None, undef=None):
+        pixels, source = self.indices(array.shape, geotransform)
+        data = np.full(self.shape, np.nan, dtype=np.float32)
+        values = data.reshape(-1)
+        values[pixels] = array.reshape(-1)[source]
+        if undef is not None:
+            values[values == undef] = np.nan
+        return data
+
+# Plans already used: key: WarpPlan
+_warp_plans = {}
+_warp_plans_lock = threading.Lock()
+
+# Function to get the warp plan of the grid of an ABI file (file name or netCDF4.Dataset) for a lat / lon
+# extent [min. lon, min. lat, max. lon, max. lat] and resolution (degrees). "path": directory of the .npy
+# plans (None: memory only)
+def warp_plan(nc, extent, resolution=0.02, path=WARP_PLAN_PATH):
+
+    if isinstance(nc, str):
+        with Dataset(nc) as nc:
+            return warp_plan(nc, extent, resolution, path)
+
+    # Satellite and fixed grid of the file
+    projection = nc.variables['goes_imager_projection']
+    lon_0 = float(projection.longitude_of_projection_origin)
+    height = float(projection.perspective_point_height)
+    x, y = nc.variables['x'], nc.variables['y']
+    grid = (float(x.scale_factor), float(x.add_offset), x.shape[0], float(y.scale_factor), float(y.add_offset), y.shape[0])
+    key = (lon_0, height) + grid + tuple(float(value) for value in extent) + (float(resolution),)
+
+    with _warp_plans_lock:
+        plan = _warp_plans.get(key)
+    if plan is not None:
+        return plan
+
+    xscale, xoffset, n_cols, yscale, yoffset, n_rows = grid
+    source_geotransform = ((xoffset - 0.5 * xscale) * height, xscale * height, 0.0,
+                           (yoffset - 0.5 * yscale) * height, 0.0, yscale * height)
+    file_name = None
+    if path is not None:
+        file_name = f"{path}/plan_{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.npy"
+    if file_name is not None and os.path.exists(file_name):
+        lines, cols = np.load(file_name)
+    else:
+        # Centers of the output pixels
+        rows = int(round((extent[3] - extent[1]) / resolution))
+        columns = int(round((extent[2] - extent[0]) / resolution))
+        lats = extent[3] - (np.arange(rows) + 0.5) * resolution
+        lons = extent[0] + (np.arange(columns) + 0.5) * resolution
+        lons, lats = np.meshgrid(lons, lats)
+
+        # Nearest full disk pixel (see latlon2xy_array)
+        x, y, on_disk = latlon2xy_array(lats, lons, lon_0)
+        cols = np.rint((x - xoffset) / xscale)
+        lines = np.rint((y - yoffset) / yscale)
+        valid = on_disk & (lines >= 0) & (lines < n_rows) & (cols >= 0) & (cols < n_cols)
+        lines = np.where(valid, lines, -1).astype(np.int16)
+        cols = np.where(valid, cols, -1).astype(np.int16)
+
+        if file_name is not None:
+            # Written to a temporary file and renamed (other processes may be reading the plans)
+            os.makedirs(path, exist_ok=True)
+            tmp_name = file_name[:-4] + f'.{os.getpid()}.tmp.npy'
+            np.save(tmp_name, np.stack((lines, cols)))
+            os.replace(tmp_name, file_name)
+
+    plan = WarpPlan(lines, cols, extent, resolution, source_geotransform)
+    with _warp_plans_lock:
+        _warp_plans[key] = plan
+    return plan
+
+# Function to write a reprojected array (see WarpPlan.apply) to a NetCDF file (lat / lon, "Band1"). As the
+# files of gdal.Warp in reproject, the raster goes from south to north, so the NetCDF writer (bottom-up) stores
+# the north first
+def write_plan(file_name, plan, data):
+
+    target_prj = osr.SpatialReference()
+    target_prj.ImportFromProj4("+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs")
+
+    driver = gdal.GetDriverByName('MEM')
+    raw = driver.Create('raw', data.shape[1], data.shape[0], 1, gdal.GDT_Float32)
+    data = data[::-1]
+    raw.SetGeoTransform((plan.extent[0], plan.resolution, 0.0, plan.extent[1], 0.0, plan.resolution))
+    raw.SetProjection(target_prj.ExportToWkt())
+    raw.GetRasterBand(1).SetNoDataValue(float('nan'))
+    raw.GetRasterBand(1).WriteArray(data)
+    gdal.Translate(file_name, raw, format='netCDF')
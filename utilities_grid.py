@@ -0,0 +1,125 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Regular Grid Indexing
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import math                              # Mathematical functions
+import threading                         # Lock of the axis cache
+import numpy as np                       # Import the Numpy package
+from dataclasses import dataclass        # Data classes
+from functools import lru_cache          # Memoization of the index ranges
+
+#-----------------------------------------------------------------------------------------------------------
+# Index ranges of an extent on a lat / lon grid. The CRW, SLA, CLO and WW3 products are on regular grids, so
+# each axis is fully described by its signature (start, step, size), read from three values of the
+# coordinate variable (first, second and last) instead of the whole array. The index of a coordinate is then
+# a closed-form expression, and the slices of each (grid, extent) pair are cached. The slices always have
+# increasing indices (both for ascending and descending latitudes) and include the nearest grid points of
+# both limits of the extent, so the data keeps the orientation of the file. The axes of each file are also
+# cached (by path and modification time), so repeated crops of a file do not read the coordinates again.
+#-----------------------------------------------------------------------------------------------------------
+
+# Coordinate variable names (first match)
+LAT_NAMES = ('lat', 'latitude', 'rows')
+LON_NAMES = ('lon', 'longitude', 'cols')
+
+@dataclass(frozen=True)
+class RegularAxis:
+  start: float   # First coordinate
+  step: float    # Coordinate step (negative for descending coordinates)
+  size: int      # Number of coordinates
+
+  @property
+  def end(self):
+    return self.start + self.step * (self.size - 1)
+
+  # Index of the nearest coordinate (clipped to the axis)
+  def index(self, value):
+    # Longitudes from 0 to 360 (values given from -180 to 180)
+    if value < 0 and min(self.start, self.end) >= 0 and max(self.start, self.end) > 180:
+      value += 360
+    # Halfway values (within the float32 precision of the coordinates) go to the lower index, as
+    # np.argmin(np.abs(coordinates - value))
+    return min(max(math.ceil((value - self.start) / self.step - 0.5 - 1e-4), 0), self.size - 1)
+
+  # Slice between the nearest coordinates of two values (inclusive, increasing indices)
+  def slice(self, value1, value2):
+    index1, index2 = self.index(value1), self.index(value2)
+    return slice(min(index1, index2), max(index1, index2) + 1)
+
+# Function to read the signature of a 1D coordinate variable. Returns a RegularAxis, or the coordinate
+# array itself if the coordinates are not evenly spaced (the whole array is read only in this case)
+def read_axis(variable, tolerance=1e-3):
+
+  size = variable.shape[0]
+  if size < 3:
+    return np.asarray(variable[:], dtype=float)
+  first, second = (float(value) for value in variable[0:2])
+  last = float(variable[size - 1])
+  step = (last - first) / (size - 1)
+  if step == 0 or abs((second - first) - step) > tolerance * abs(step):
+    return np.asarray(variable[:], dtype=float)
+  return RegularAxis(first, step, size)
+
+# Function to find the slice between two values on an axis (RegularAxis or coordinate array)
+def _axis_slice(axis, value1, value2):
+  if isinstance(axis, RegularAxis):
+    return axis.slice(value1, value2)
+  index1 = int(np.argmin(np.abs(axis - value1)))
+  index2 = int(np.argmin(np.abs(axis - value2)))
+  return slice(min(index1, index2), max(index1, index2) + 1)
+
+@lru_cache(maxsize=4096)
+def _grid_slices(lat_axis, lon_axis, extent):
+  return lat_axis.slice(extent[1], extent[3]), lon_axis.slice(extent[0], extent[2])
+
+# Axes of the files already read: (path, modification time, variable name): axis
+_axes = {}
+_axes_lock = threading.Lock()
+MAX_AXES = 1024
+
+# Function to get the axis of a coordinate variable of a file (cached, see read_axis)
+def file_axis(file, names):
+
+  name = next((name for name in names if name in file.variables), None)
+  if name is None:
+    raise KeyError(f'No coordinate variable named {" / ".join(names)}')
+  try:
+    path = file.filepath()
+    key = (path, os.path.getmtime(path), name)
+  except (ValueError, OSError):
+    # Files in memory or without a path
+    return read_axis(file.variables[name])
+
+  with _axes_lock:
+    axis = _axes.get(key)
+  if axis is None:
+    axis = read_axis(file.variables[name])
+    with _axes_lock:
+      if len(_axes) >= MAX_AXES:
+        _axes.clear()
+      _axes[key] = axis
+  return axis
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to get the (lat_slice, lon_slice) of an extent [min. lon, min. lat, max. lon, max. lat] on the grid
+# of an open NetCDF file (netCDF4.Dataset), e.g.:
+#   lat_slice, lon_slice = grid_slices(file, extent)
+#   data = file.variables['analysed_sst'][ 0 , lat_slice , lon_slice ]
+def grid_slices(file, extent, lat=None, lon=None):
+
+  lat_axis = file_axis(file, (lat,) if lat else LAT_NAMES)
+  lon_axis = file_axis(file, (lon,) if lon else LON_NAMES)
+
+  # Regular grids: cached per (grid signature, extent)
+  if isinstance(lat_axis, RegularAxis) and isinstance(lon_axis, RegularAxis):
+    return _grid_slices(lat_axis, lon_axis, tuple(float(value) for value in extent))
+  return _axis_slice(lat_axis, extent[1], extent[3]), _axis_slice(lon_axis, extent[0], extent[2])
+
+# Function to get the (lat_index, lon_index) of the grid point nearest to a coordinate
+def grid_point(file, lat_point, lon_point, lat=None, lon=None):
+
+  lat_slice, lon_slice = grid_slices(file, [lon_point, lat_point, lon_point, lat_point], lat, lon)
+  return lat_slice.start, lon_slice.start
@@ -4,14 +4,622 @@
 #-----------------------------------------------------------------------------------------------------------
 
 # Required modules
-from datetime import datetime, timedelta # Basic Dates and time types
+from datetime import datetime, timedelta, timezone # Basic Dates and time types
 import os                                # Miscellaneous operating system interfaces
 import time as t                         # Time access and conversion                                          
 from ftplib import FTP                   # FTP protocol client
+import ftplib                            # FTP protocol client (error classes)
+import posixpath                         # FTP path manipulation
+import threading                         # Locks for the connection pool
+import atexit                            # Close the pooled connections at exit
+from contextlib import contextmanager    # Context managers (borrowed FTP sessions)
+from concurrent.futures import ThreadPoolExecutor # Parallel downloads
+from dataclasses import dataclass, replace # Data classes
+import fnmatch                           # File name patterns (versioned file names)
+import re                                # Regular expressions (version sorting)
+from functools import lru_cache          # Memoization of the product resolution
+import tempfile                          # Temporary directories (full files of regional subsets)
+import numpy as np                       # Import the Numpy package
+from netCDF4 import Dataset              # Read / Write NetCDF4 files (regional subsets)
+from utilities_telemetry import get_telemetry # Transfer telemetry
+from utilities_retry import retry_call, DownloadError, FileNotAvailable, LoginRefused, ConnectionFailed, TransferTimeout # Typed errors and retries
 
 #-----------------------------------------------------------------------------------------------------------
+# Product registry: FTP host, path and file name templates of every product accepted by download_OCEAN.
+# The templates are built once, at import time, so resolving a (product, date) pair is a dict lookup plus a
+# string format. Fields available to the templates: {year}, {month}, {day}, {jday} (julian day, three digit)
+# and {next_date} (YYYYMMDD of the following day, used by the SLA file names).
+# Products whose file names carry a processing version (e.g. "ACSPO_V2.80" in SST-LEO) also have a file name
+# pattern (fnmatch): the name is then taken from the directory listing of the server (see locate_OCEAN).
+#-----------------------------------------------------------------------------------------------------------
+
+# NOAA FTP servers
+FTP_STAR = 'ftp.star.nesdis.noaa.gov'
+FTP_COASTWATCH = 'ftpcoastwatch.noaa.gov'
+
+@dataclass(frozen=True)
+class OceanProduct:
+  name: str            # Product name, as passed to download_OCEAN
+  host: str            # FTP server
+  path: str            # FTP path template
+  file_name: str       # File name template
+  cadence: str         # 'daily', 'monthly' or 'annual'
+  needs_jday: bool     # The templates use the julian day
+  needs_next: bool     # The templates use the following day
+  pattern: str = None  # File name pattern template of versioned names (None: exact file name)
+
+@dataclass(frozen=True)
+class OceanFile:
+  product: str         # Product name
+  date: str            # Date of the file, normalized to the product cadence (YYYYMMDD, YYYYMM or YYYY)
+  host: str            # FTP server
+  path: str            # FTP path
+  file_name: str       # Remote (and local) file name
+  pattern: str = None  # File name pattern of versioned names (None: exact file name)
+
+# Minimum number of date digits needed by each cadence, and their format
+DATE_LENGTH = {'daily': 8, 'monthly': 6, 'annual': 4}
+CADENCE_FORMATS = {'daily': '%Y%m%d', 'monthly': '%Y%m', 'annual': '%Y'}
+
+def _product(name, host, path, file_name, cadence, pattern=None):
+  templates = path + file_name + (pattern or '')
+  return OceanProduct(name, host, path, file_name, cadence, '{jday}' in templates, '{next_date}' in templates, pattern)
+
+def _build_registry():
+
+  products = []
+
+  # Coral Reef Watch (Global - 5 km)
+  crw = 'pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/'
+
+  # Daily products: (name, folder, naming convention)
+  for name, folder, naming_convention in [('SST',   'sst',          'coraltemp_v3.1'),
+                                          ('SST-A', 'ssta',         'ct5km_ssta_v3.1'),
+                                          ('SST-T', 'sst-trend-7d', 'ct5km_sst-trend-7d_v3.1'),
+                                          ('BAA',   'baa',          'ct5km_baa_v3.1'),
+                                          ('BHS',   'hs',           'ct5km_hs_v3.1'),
+                                          ('DHW',   'dhw',          'ct5km_dhw_v3.1')]:
+    products.append(_product(name, FTP_STAR, crw + 'daily/' + folder + '/{year}/', naming_convention + '_{year}{month}{day}.nc', 'daily'))
+
+  # Monthly and annual composites: (name prefix, naming convention prefix, statistics)
+  for name, naming_convention, stats in [('SST',   'ct5km_sst',  ('Min', 'Mean', 'Max')),
+                                         ('SST-A', 'ct5km_ssta', ('Min', 'Mean', 'Max')),
+                                         ('BAA',   'ct5km_baa',  ('Max',)),
+                                         ('BHS',   'ct5km_hs',   ('Max',)),
+                                         ('DHW',   'ct5km_dhw',  ('Max',))]:
+    for stat in stats:
+      products.append(_product(f'{name}-Monthly-{stat}', FTP_STAR, crw + 'monthly/{year}/', f'{naming_convention}-{stat.lower()}_v3.1_' + '{year}{month}.nc', 'monthly'))
+      products.append(_product(f'{name}-Annual-{stat}', FTP_STAR, crw + 'annual/', f'{naming_convention}-{stat.lower()}_v3.1_' + '{year}.nc', 'annual'))
+
+  # Ocean Color [filled] (Global - 9 km)
+  products.append(_product('CLO', FTP_STAR, 'pub/socd1/mecb/coastwatch/viirs/nrt/L3/global/chlora/dineof/{year}/', 'V{year}{jday}_a1_WW00_chlora.nc', 'daily',
+                           'V{year}{jday}_*_WW00_chlora.nc'))
+
+  # Sea Level Anomaly
+  products.append(_product('SLA', FTP_COASTWATCH, 'pub/socd/lsa/rads/sla/daily/nrt/{year}/', 'rads_global_nrt_sla_{year}{month}{day}_{next_date}_001.nc', 'daily'))
+
+  # JASON-3
+  products.append(_product('JAS', FTP_COASTWATCH, 'pub/socd/lsa/johnk/coastwatch/j3/', 'j3_{year}{month}{day}.nc', 'daily'))
+
+  # ASCAT Winds: (satellite, pass) - HDF (4hr folder) and NetCDF (daily folder)
+  for satellite in ('A', 'B', 'C'):
+    for orbit in ('a', 'd'):
+      products.append(_product(f'ASC-{satellite}-{orbit}-hdf', FTP_COASTWATCH, 'pub/socd1/coastwatch/products/ascat/4hr/hdf/', 'AS{year}{jday}' + f'{satellite}{orbit}s_WW.hdf', 'daily',
+                               'AS{year}{jday}' + f'{satellite}{orbit}s_WW*.hdf'))
+      products.append(_product(f'ASC-{satellite}-{orbit}-nc', FTP_COASTWATCH, 'pub/socd7/coastwatch/metop/ascat/netcdf/day/', 'AS{year}{jday}' + f'{satellite}{orbit}s_WW.nc', 'daily'))
+
+  # SST LEO Global (0.02°)
+  products.append(_product('SST-LEO', FTP_COASTWATCH, 'pub/socd2/coastwatch/sst/nrt/l3s/leo/pm/{year}/{jday}', '{year}{month}{day}120000-STAR-L3S_GHRSST-SSTsubskin-LEO_PM_D-ACSPO_V2.80-v02.0-fv01.0.nc', 'daily',
+                           '{year}{month}{day}120000-STAR-L3S_GHRSST-SSTsubskin-LEO_PM_D-ACSPO_V*.nc'))
+
+  return {p.name: p for p in products}
+
+OCEAN_PRODUCTS = _build_registry()
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to resolve the FTP host, path and file name of a product for a given date
+@lru_cache(maxsize=65536)
+def resolve(product, date):
+
+  # Product lookup
+  try:
+    p = OCEAN_PRODUCTS[product]
+  except KeyError:
+    raise ValueError(f'Unknown product: {product}') from None
+
+  # Parse the digits needed by the product cadence (the extra digits are ignored, e.g. the day of a monthly
+  # product), with the same error for every product
+  date_format = CADENCE_FORMATS[p.cadence]
+  try:
+    if len(date) < DATE_LENGTH[p.cadence] or not date.isdigit():
+      raise ValueError
+    dt = datetime.strptime(date[:DATE_LENGTH[p.cadence]], date_format)
+  except ValueError:
+    raise ValueError(f'Invalid date for the {p.cadence} product {product}: {date}') from None
+
+  # Date fields
+  fields = {'year': f'{dt:%Y}', 'month': f'{dt:%m}', 'day': f'{dt:%d}'}
+  if p.needs_jday:
+    fields['jday'] = f'{dt:%j}'
+  if p.needs_next:
+    fields['next_date'] = (dt + timedelta(days=1)).strftime('%Y%m%d')
+
+  return OceanFile(product, dt.strftime(date_format), p.host, p.path.format(**fields), p.file_name.format(**fields),
+                   p.pattern.format(**fields) if p.pattern else None)
+
+#-----------------------------------------------------------------------------------------------------------
+# FTP connection pool: keeps the logged-in sessions of each host open between downloads, so loops over
+# many dates pay the TCP connection and login only once. Sessions idle for more than "check_after" seconds
+# are checked with a NOOP when borrowed and re-established if the server dropped them. Each session also
+# remembers its working directory, so repeated downloads from the same folder skip the CWD command.
+#-----------------------------------------------------------------------------------------------------------
+
+class FTPSession:
+
+  def __init__(self, host, ftp):
+    self.host = host             # Host name used to borrow the session (registry host)
+    self.ftp = ftp               # Logged-in ftplib.FTP object
+    self.home = ftp.pwd()        # Login directory (product paths are relative to it)
+    self.path = None             # Current product path (None: unknown)
+    self.last_used = t.time()    # Time of the last use (for the NOOP check)
+    self.connect_seconds = None  # Connect and login latency (reported by the first transfer, see fetch_OCEAN)
+    self.login_seconds = None
+
+  def cwd(self, path):
+    # Change the working directory only when it is not the current one
+    if path != self.path:
+      self.path = None
+      self.ftp.cwd(posixpath.join(self.home, path))
+      self.path = path
+
+  def alive(self):
+    try:
+      self.ftp.voidcmd('NOOP')
+      return True
+    except ftplib.all_errors:
+      return False
+
+  def close(self):
+    try:
+      self.ftp.quit()
+    except ftplib.all_errors:
+      self.ftp.close()
+
+class FTPPool:
+
+  def __init__(self, user='', passwd='', port=21, timeout=60, max_idle=4, check_after=15, max_per_host=None, hosts=None):
+    self.user = user               # FTP credentials (anonymous by default)
+    self.passwd = passwd
+    self.port = port               # FTP port
+    self.timeout = timeout         # Socket timeout (seconds)
+    self.max_idle = max_idle       # Maximum number of idle sessions kept per host
+    self.check_after = check_after # Idle time (seconds) after which a session is checked with NOOP
+    self.max_per_host = max_per_host # Maximum number of simultaneous sessions per host (None: no limit)
+    self.hosts = hosts or {}       # Optional host remapping, e.g. {'ftp.star.nesdis.noaa.gov': ('127.0.0.1', 2121)}
+    self._idle = {}                # Idle sessions per host
+    self._slots = {}               # Semaphores limiting the sessions in use per host
+    self._lock = threading.Lock()
+
+  def connect(self, host):
+    # Open and log in a new session
+    address, port = self.hosts.get(host, (host, self.port))
+    ftp = FTP()
+    start_time = t.perf_counter()
+    ftp.connect(address, port, timeout=self.timeout)
+    connect_time = t.perf_counter()
+    ftp.login(self.user, self.passwd)
+    session = FTPSession(host, ftp)
+    session.connect_seconds = round(connect_time - start_time, 4)
+    session.login_seconds = round(t.perf_counter() - connect_time, 4)
+    return session
+
+  def _slot(self, host):
+    # Semaphore of the host (None: no limit)
+    if self.max_per_host is None:
+      return None
+    with self._lock:
+      return self._slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+
+  def acquire(self, host):
+    # Wait for a free slot of the host
+    slot = self._slot(host)
+    if slot is not None:
+      slot.acquire()
+    try:
+      # Reuse an idle session of the host, if there is a valid one
+      while True:
+        with self._lock:
+          idle = self._idle.get(host)
+          session = idle.pop() if idle else None
+        if session is None:
+          return self.connect(host)
+        if t.time() - session.last_used < self.check_after or session.alive():
+          return session
+        # The server dropped the session
+        session.close()
+    except BaseException:
+      if slot is not None:
+        slot.release()
+      raise
+
+  def release(self, session):
+    # Give the session back to the pool (or close it, if the pool is full)
+    session.last_used = t.time()
+    with self._lock:
+      idle = self._idle.setdefault(session.host, [])
+      keep = len(idle) < self.max_idle
+      if keep:
+        idle.append(session)
+    if not keep:
+      session.close()
+    self._free(session.host)
+
+  def discard(self, session):
+    # Close a session that can not be reused
+    session.close()
+    self._free(session.host)
+
+  def _free(self, host):
+    slot = self._slot(host)
+    if slot is not None:
+      slot.release()
+
+  @contextmanager
+  def session(self, host):
+    # Borrow a session: "with pool.session(host) as session: ..."
+    session = self.acquire(host)
+    try:
+      yield session
+    except ftplib.error_perm:
+      # Permanent replies (e.g. 550 - file not found) leave the session usable
+      self.release(session)
+      raise
+    except BaseException:
+      # Anything else may leave the control connection in an unknown state
+      self.discard(session)
+      raise
+    else:
+      self.release(session)
+
+  def close(self):
+    # Close all idle sessions
+    with self._lock:
+      sessions = [s for idle in self._idle.values() for s in idle]
+      self._idle.clear()
+    for session in sessions:
+      session.close()
+
+# Default pool, shared by download_OCEAN and the batch functions
+ftp_pool = FTPPool(max_per_host=4)
+atexit.register(ftp_pool.close)
+
+#-----------------------------------------------------------------------------------------------------------
+# Directory listings of the FTP servers (file names only), cached for "ttl" seconds, so each directory is
+# listed once (MLSD, or NLST on the servers without MLSD) for all the versioned files in it.
+class FTPListings:
+
+  def __init__(self, ttl=600):
+    self.ttl = ttl                 # Time (seconds) a listing is kept
+    self._listings = {}            # (host, path): (listing time, file names)
+    self._no_mlsd = set()          # Hosts without the MLSD command
+    self._path_locks = {}          # Locks of the directories being listed
+    self._lock = threading.Lock()
+
+  def names(self, session, path):
+    # File names of a directory (listed with the session, if not cached). Threads asking for the same
+    # directory wait for a single listing
+    key = (session.host, path)
+    with self._lock:
+      path_lock = self._path_locks.setdefault(key, threading.Lock())
+    with path_lock:
+      with self._lock:
+        listing = self._listings.get(key)
+      if listing is not None and t.time() - listing[0] < self.ttl:
+        return listing[1]
+      session.cwd(path)
+      names = self._list(session)
+      with self._lock:
+        self._listings[key] = (t.time(), names)
+      return names
+
+  def _list(self, session):
+    if session.host not in self._no_mlsd:
+      try:
+        return [name for name, facts in session.ftp.mlsd(facts=['type']) if facts.get('type', 'file') == 'file']
+      except ftplib.error_perm as e:
+        # 500 / 502: command not supported
+        if not str(e).startswith(('500', '502')):
+          raise
+        with self._lock:
+          self._no_mlsd.add(session.host)
+    try:
+      return [posixpath.basename(name) for name in session.ftp.nlst()]
+    except ftplib.error_perm as e:
+      # Some servers answer 550 to the NLST of an empty directory
+      if str(e).startswith('550'):
+        return []
+      raise
+
+  def invalidate(self, host=None, path=None):
+    # Forget the listings of a directory, of a host or all of them
+    with self._lock:
+      for key in [key for key in self._listings if host in (None, key[0]) and path in (None, key[1])]:
+        del self._listings[key]
+
+# Default listings, shared by all the downloads
+ftp_listings = FTPListings()
+
+# Function to sort the file names by version ("V2.9" < "V2.10")
+def version_key(file_name):
+  return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', file_name)]
+
+# Function to pick the newest file name matching the pattern of a resolved file (None: no match)
+def newest_match(remote, names):
+  matches = fnmatch.filter(names, remote.pattern)
+  return max(matches, key=version_key) if matches else None
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to find the actual file name of a resolved file (see resolve). Files with exact names are returned
+# as they are, without contacting the server. For versioned names (OceanFile.pattern), the directory is
+# listed (once, see FTPListings) and the newest matching version is returned. Raises FileNotAvailable if
+# there is no match.
+def locate_OCEAN(remote, pool=None, retry=None):
+
+  if remote.pattern is None:
+    return remote
+  pool = pool or ftp_pool
+
+  def attempt():
+    try:
+      with pool.session(remote.host) as session:
+        names = ftp_listings.names(session, remote.path)
+    except ftplib.all_errors as e:
+      raise ftp_error(e, remote) from e
+    file_name = newest_match(remote, names)
+    if file_name is None:
+      raise FileNotAvailable(f'{remote.host}: no file matching {remote.pattern} in {remote.path}', remote.host, remote.file_name)
+    return replace(remote, file_name=file_name)
+
+  return retry_call(attempt, remote.host, retry)
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to read the size (bytes) and modification time (epoch seconds) of a file on the FTP server.
+# Any of them is None when the server does not support the command.
+def stat_OCEAN(session, file_name):
+
+  ftp = session.ftp
+  ftp.voidcmd('TYPE I')
+
+  # File size (SIZE). A 550 reply means the file is not available
+  try:
+    size = ftp.size(file_name)
+  except ftplib.error_perm as e:
+    if str(e).startswith('550'):
+      raise
+    size = None
+
+  # Modification time (MDTM), as "213 YYYYMMDDHHMMSS[.sss]" in UTC
+  try:
+    mdtm = ftp.voidcmd('MDTM ' + file_name).split()[-1][:14]
+    mtime = datetime.strptime(mdtm, '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+  except (ftplib.error_perm, ValueError):
+    mtime = None
+
+  return size, mtime
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to download a resolved file (see resolve) to a local directory, without any printing.
+# Returns 'exists' if the file was already on disk or 'downloaded'. FTP errors are raised to the caller.
+# The file is downloaded to "<file_name>.part" and renamed when complete, so an interrupted transfer never
+# leaves a truncated file under the final name. A ".part" file left by an interrupted transfer is resumed
+# with the REST command. With verify=True, a local file is only skipped if its size matches the server SIZE
+# and it is not older than the server MDTM (if the server can not be reached, the local file is kept).
+# With a "cache" (utilities_cache.DataCache of path_dest), the files are recorded in the cache manifest and
+# the files already recorded are returned without contacting the server.
+# Every call is recorded in the transfer telemetry (see utilities_telemetry).
+# FTP errors are raised as DownloadError subclasses (see utilities_retry). Connection failures and timeouts
+# are retried with the "retry" policy (utilities_retry.RetryPolicy, None: the default policy) and counted by
+# the circuit breaker of the host, so the requests to a host that is down fail at once (HostUnavailable).
+def fetch_OCEAN(remote, path_dest, pool=None, verify=True, cache=None, retry=None):
+
+  def attempt():
+    try:
+      return _fetch_OCEAN(remote, path_dest, pool or ftp_pool, verify, record)
+    except ftplib.all_errors as e:
+      raise ftp_error(e, remote) from e
+
+  def count_retry():
+    record.retries += 1
+
+  with get_telemetry().transfer('ftp', remote.host, remote.product, remote.file_name) as record:
+    # Managed cache (see utilities_cache.DataCache): the files in the manifest are complete
+    if cache is not None and cache.lookup(remote.product, remote.date) == remote.file_name:
+      record.status = 'exists'
+    else:
+      record.status = retry_call(attempt, remote.host, retry, on_retry=count_retry)
+      if cache is not None:
+        cache.add(remote.product, remote.date, remote.file_name)
+    record.cache = 'hit' if record.status == 'exists' else 'miss'
+  return record.status
+
+def _fetch_OCEAN(remote, path_dest, pool, verify, record):
+
+  local_file = path_dest + '//' + remote.file_name
+  part_file = local_file + '.part'
 
-def download_OCEAN(product, date, path_dest):
+  # Check if the file exists
+  exists = os.path.exists(local_file)
+  if exists and not verify:
+    return 'exists'
+
+  downloading = False
+  try:
+    with pool.session(remote.host) as session:
+      # Connect and login latency, if the session was opened for this transfer
+      record.connect_seconds, record.login_seconds = session.connect_seconds, session.login_seconds
+      session.connect_seconds = session.login_seconds = None
+
+      session.cwd(remote.path)
+
+      # Remote size and modification time
+      size, mtime = stat_OCEAN(session, remote.file_name)
+
+      # Check if the local file is complete and up to date
+      if exists:
+        local = os.stat(local_file)
+        if (size is None or local.st_size == size) and (mtime is None or local.st_mtime >= mtime):
+          return 'exists'
+
+      # Resume a partial download, if there is one
+      offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+      if size is None or offset > size:
+        offset = 0
+
+      downloading = True
+      if size is None or offset < size:
+        try:
+          with open(part_file, 'ab' if offset else 'wb') as f:
+            session.ftp.retrbinary("RETR " + remote.file_name, _counted(f, record), rest=offset or None)
+        except (ftplib.error_reply, ftplib.error_perm):
+          # The server refused the REST command: download the whole file
+          if not offset:
+            raise
+          record.retries += 1
+          with open(part_file, 'wb') as f:
+            session.ftp.retrbinary("RETR " + remote.file_name, _counted(f, record))
+  except ftplib.all_errors:
+    # The server can not be reached (or the file is gone): keep the local file
+    if exists and not downloading:
+      return 'exists'
+    raise
+
+  # Check the downloaded size
+  if size is not None and os.path.getsize(part_file) != size:
+    raise ftplib.error_temp(f'Incomplete download of {remote.file_name}: {os.path.getsize(part_file)} of {size} bytes')
+
+  # Keep the server modification time and move the file to its final name
+  if mtime is not None:
+    os.utime(part_file, (mtime, mtime))
+  os.replace(part_file, local_file)
+  return 'downloaded'
+
+# Function to translate an ftplib error to a DownloadError subclass
+def ftp_error(e, remote):
+  message = f'{remote.host}: {e}'
+  if isinstance(e, ftplib.error_perm):
+    if str(e).startswith('530'):
+      return LoginRefused(message, remote.host, remote.file_name)
+    if str(e).startswith('550'):
+      return FileNotAvailable(message, remote.host, remote.file_name)
+    return DownloadError(message, remote.host, remote.file_name)
+  if isinstance(e, TimeoutError):
+    return TransferTimeout(message, remote.host, remote.file_name)
+  # Temporary replies (4xx), unexpected replies, lost or refused connections
+  return ConnectionFailed(message, remote.host, remote.file_name)
+
+# Function to write the blocks of a transfer to a file, counting the bytes of the telemetry record
+def _counted(f, record):
+  def write(block):
+    f.write(block)
+    record.bytes += len(block)
+  return write
+
+#-----------------------------------------------------------------------------------------------------------
+# Regional subsets: the CRW files are global (7200 x 3600), but most plots only use a small region of them.
+# With an "extent", the full file is downloaded to a temporary directory, the region is written to a
+# compressed NetCDF next to the other downloads and the full file is removed. The subset keeps the
+# variables, attributes and orientation of the original file, so it can be read with the same code.
+#-----------------------------------------------------------------------------------------------------------
+
+# Function to build the file name of a regional subset, e.g. "coraltemp_v3.1_20220103_-93_-60_-10_18.nc"
+def subset_file_name(file_name, extent):
+  root = os.path.splitext(file_name)[0]
+  return root + ''.join(f'_{value:g}' for value in extent) + '.nc'
+
+# Function to find the index range (slice) of a coordinate between two values. The range includes the
+# nearest coordinates to both values plus one pixel of margin on each side.
+def subset_slice(coordinate, value1, value2, margin=1):
+  index1 = int(np.argmin(np.abs(coordinate - value1)))
+  index2 = int(np.argmin(np.abs(coordinate - value2)))
+  return slice(max(min(index1, index2) - margin, 0), min(max(index1, index2) + margin + 1, len(coordinate)))
+
+# Function to write the region "extent" [min. lon, min. lat, max. lon, max. lat] of a NetCDF file (with
+# "lat" / "lon" coordinates) to a new compressed NetCDF file
+def subset_OCEAN(path_src, path_dst, extent, complevel=4):
+
+  with Dataset(path_src) as src:
+    # Coordinate names
+    lat_name = next((name for name in ('lat', 'latitude') if name in src.variables), None)
+    lon_name = next((name for name in ('lon', 'longitude') if name in src.variables), None)
+    if lat_name is None or lon_name is None:
+      raise ValueError(f'{path_src} has no lat / lon coordinates')
+
+    # Index range of the region
+    slices = {lat_name: subset_slice(src.variables[lat_name][:], extent[1], extent[3]),
+              lon_name: subset_slice(src.variables[lon_name][:], extent[0], extent[2])}
+
+    # Write to a temporary file and rename it, so an interrupted subset never leaves a broken file
+    with Dataset(path_dst + '.part', 'w', format='NETCDF4') as dst:
+      dst.setncatts({name: src.getncattr(name) for name in src.ncattrs()})
+      dst.setncattr('subset_extent', extent)
+
+      # Dimensions
+      for name, dimension in src.dimensions.items():
+        if name in slices:
+          size = len(range(*slices[name].indices(len(dimension))))
+        else:
+          size = None if dimension.isunlimited() else len(dimension)
+        dst.createDimension(name, size)
+
+      # Variables (raw values, without scale / offset / mask)
+      for name, variable in src.variables.items():
+        variable.set_auto_maskandscale(False)
+        fill_value = variable.getncattr('_FillValue') if '_FillValue' in variable.ncattrs() else None
+        compress = variable.dtype != str and variable.ndim > 0
+        new = dst.createVariable(name, variable.dtype, variable.dimensions, fill_value=fill_value,
+                                 zlib=compress, complevel=complevel, shuffle=compress)
+        new.set_auto_maskandscale(False)
+        new.setncatts({attr: variable.getncattr(attr) for attr in variable.ncattrs() if attr != '_FillValue'})
+        new[...] = variable[tuple(slices.get(dimension, slice(None)) for dimension in variable.dimensions)]
+
+  os.replace(path_dst + '.part', path_dst)
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to download the region "extent" of a resolved file (see resolve) to a local directory, without
+# any printing. Returns the subset file name and 'exists' (the subset was already on disk) or 'downloaded'.
+# If the full file is already in path_dest, the subset is taken from it. Otherwise the full file is
+# downloaded to a temporary directory (see fetch_OCEAN) and removed after the subset is written.
+def fetch_OCEAN_subset(remote, path_dest, extent, pool=None, cache=None, retry=None):
+
+  file_name = subset_file_name(remote.file_name, extent)
+  local_file = path_dest + '//' + file_name
+
+  # Managed cache (see utilities_cache.DataCache): the subsets are recorded as "<product>:<extent>"
+  product = remote.product + ':' + ','.join(f'{value:g}' for value in extent)
+  if cache is not None and cache.lookup(product, remote.date) == file_name:
+    get_telemetry().hit('ftp', remote.host, product, file_name)
+    return file_name, 'exists'
+
+  # Check if the subset exists
+  if os.path.exists(local_file):
+    get_telemetry().hit('ftp', remote.host, product, file_name)
+    status = 'exists'
+  elif os.path.exists(path_dest + '//' + remote.file_name):
+    subset_OCEAN(path_dest + '//' + remote.file_name, local_file, extent)
+    status = 'downloaded'
+  else:
+    with tempfile.TemporaryDirectory(prefix='.subset_', dir=path_dest) as tmp_dir:
+      fetch_OCEAN(remote, tmp_dir, pool, verify=False, retry=retry)
+      subset_OCEAN(tmp_dir + '//' + remote.file_name, local_file, extent)
+    status = 'downloaded'
+
+  if cache is not None:
+    cache.add(product, remote.date, file_name)
+  return file_name, status
+
+#-----------------------------------------------------------------------------------------------------------
+
+def download_OCEAN(product, date, path_dest, pool=None, cache=None, extent=None, retry=None):
 
   #-----------------------------------------------------------------------------------------------------------
   
@@ -92,337 +700,31 @@ def download_OCEAN(product, date, path_dest):
   # 'DHW-Monthly-Max', 'DHW-Annual-Max'
   # 'SST-LEO'
   # 'ASC-A-a-hdf', 'ASC-A-d-hdf', 'ASC-B-a-hdf, 'ASC-B-d-hdf', 'ASC-C-a-hdf, 'ASC-C-d-hdf' (ASCAT Winds)
+  # 'ASC-A-a-nc', 'ASC-A-d-nc', 'ASC-B-a-nc, 'ASC-B-d-nc', 'ASC-C-a-nc, 'ASC-C-d-nc' (ASCAT Winds)
+  # (see OCEAN_PRODUCTS for the full registry)
   
-  # Desired year (four digit)
-  year = date[0:4]
-  #year = '2021'
-
-  # Desired month (two digit)
-  month = date[4:6]
-  #month = '06'
+  # Resolve the FTP host, path and file name from the product registry
+  remote = resolve(product, date)
 
-  # Desired day (two digit)
-  day = date[6:8] 
-  #day = '28' 
+  # FTP connection pool (the sessions are reused between calls)
+  pool = pool or ftp_pool
 
-  #-----------------------------------------------------------------------------------------------------------
-
-  # FTP Address
-  if (product == 'SST' or product == 'SST-A' or product == 'SST-T' or product == 'BAA' or 
-      product == 'BHS' or product == 'DHW' or product == 'CLO' or product == 'SST-Monthly-Min' or product == 'SST-Monthly-Mean' or 
-      product == 'SST-Monthly-Max' or product == 'SST-Annual-Min' or product == 'SST-Annual-Mean' or 
-      product == 'SST-Annual-Max' or product == 'SST-A-Monthly-Min' or product == 'SST-A-Monthly-Mean' or 
-      product == 'SST-A-Monthly-Max' or product == 'SST-A-Annual-Min' or product == 'SST-A-Annual-Mean' or 
-      product == 'SST-A-Annual-Max' or product == 'BAA-Monthly-Max' or product == 'BHA-Annual-Max' or
-      product == 'BHS-Monthly-Max' or product == 'BHS-Annual-Max' or 
-      product == 'DHW-Monthly-Max' or product == 'DHW-Annual-Max'):
-    ftp = FTP('ftp.star.nesdis.noaa.gov') 
-  elif (product == 'ASC-A-a-hdf' or 'ASC-A-d-hdf' or 'ASC-B-a-hdf' or 'ASC-B-d-hdf' or 'ASC-C-a-hdf' or 'ASC-C-d-hdf' or product == 'SLA' or product == 'JAS' or product == 'SST-LEO'):
-    ftp = FTP('ftpcoastwatch.noaa.gov')
-
-  # FTP Credentials 
-  ftp.login('', '') 
+  # Versioned file names: newest version in the directory listing
+  try:
+    remote = locate_OCEAN(remote, pool, retry)
+  except DownloadError as e:
+    print("\nFile not available!")
+    print(f'{type(e).__name__}: {e}')
+    print("")
+    return -1
 
-  #-----------------------------------------------------------------------------------------------------------
+  # FTP Path and file name
+  path = remote.path
+  file_name = remote.file_name
 
-  # Access the FTP folder, based on the desired product
-  if (product == 'SST'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/sst/' + year + '/')
-      naming_convention = 'coraltemp_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Monthly-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Monthly-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_sst-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-Annual-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-Annual-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_sst-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/ssta/' + year + '/')
-      naming_convention = 'ct5km_ssta_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-A-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Monthly-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Monthly-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_ssta-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'SST-A-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A-Annual-Mean'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-mean_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-A-Annual-Min'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_ssta-min_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'SST-T'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/sst-trend-7d/' + year + '/')
-      naming_convention = 'ct5km_sst-trend-7d_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BAA'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/baa/' + year + '/')
-      naming_convention = 'ct5km_baa_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BAA-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_baa-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'BAA-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_baa-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'BHS'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/hs/' + year + '/')
-      naming_convention = 'ct5km_hs_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'BHS-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_hs-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'BHS-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_hs-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'DHW'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/daily/dhw/' + year + '/')
-      naming_convention = 'ct5km_dhw_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'DHW-Monthly-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/monthly/' + year + '/')
-      naming_convention = 'ct5km_dhw-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + extension
-
-  elif (product == 'DHW-Annual-Max'):
-      # FTP Path
-      path = ('pub/socd/mecb/crw/data/5km/v3.1_op/nc/v1.0/annual/')
-      naming_convention = 'ct5km_dhw-max_v3.1'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + extension
-
-  elif (product == 'CLO'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/mecb/coastwatch/viirs/nrt/L3/global/chlora/dineof/' + year + '/')
-      naming_convention = '_a1_WW00_chlora'
-      extension = '.nc'
-      file_name = 'V' + year + jday + naming_convention + extension
-
-  elif (product == 'SLA'):
-      # FTP Path
-      from datetime import datetime, timedelta # Basic Dates and time types
-      path = ('pub/socd/lsa/rads/sla/daily/nrt/' + year + '/')
-      naming_convention = 'rads_global_nrt_sla'
-      extension = '.nc'
-      date_1 = year + month + day
-      date_2 = str(datetime(int(year), int(month), int(day)) + timedelta(days=1))
-      date_2 = datetime.strptime(date_2, '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d')   
-      file_name = naming_convention + '_' + date_1 + '_' + date_2 + '_' + '001' + extension
-
-  elif (product == 'ASC-A-a-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Aas_WW' + extension
-
-  elif (product == 'ASC-A-d-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Ads_WW' + extension
-
-  elif (product == 'ASC-B-a-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Bas_WW' + extension
-
-  elif (product == 'ASC-B-d-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Bds_WW' + extension
-
-  elif (product == 'ASC-C-a-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Cas_WW' + extension
-
-  elif (product == 'ASC-C-d-hdf'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd1/coastwatch/products/ascat/4hr/hdf/')
-      naming_convention = 'AS'
-      extension = '.hdf'
-      file_name = naming_convention + year + jday + 'Cds_WW' + extension
-
-  elif (product == 'JAS'):
-      # FTP Path
-      path = ('pub/socd/lsa/johnk/coastwatch/j3/')
-      naming_convention = 'j3'
-      extension = '.nc'
-      file_name = naming_convention + '_' + year + month + day + extension
-
-  elif (product == 'SST-LEO'):
-      # Converting date to julian day
-      import datetime
-      fmt = '%Y%m%d'
-      s = year + month + day
-      dt = datetime.datetime.strptime(s, fmt)
-      tt = dt.timetuple()
-      jday = str(tt.tm_yday).zfill(3)
-      # FTP Path
-      path = ('pub/socd2/coastwatch/sst/nrt/l3s/leo/pm/' + year + '/' + jday)
-      naming_convention = '120000-STAR-L3S_GHRSST-SSTsubskin-LEO_PM_D-ACSPO_V2.80-v02.0-fv01.0'
-      extension = '.nc'
-      file_name = year + month + day + naming_convention + extension
+  # Regional subset [min. lon, min. lat, max. lon, max. lat] (only the region is kept on disk)
+  if extent is not None:
+    file_name = subset_file_name(file_name, extent)
 
 #-----------------------------------------------------------------------------------------------------------
   
@@ -431,21 +733,20 @@ def download_OCEAN(product, date, path_dest):
   print('Checking the FTP File:') 
   print('---------------------')
   print('Product: ' + product)
-  print('Date: ' + year + month + day)
+  print('Date: ' + date)
   print('File Name: ' + file_name)
 
   try:
-    # Enter the FTP Path
-    ftp.cwd(path)
-    # Check if the file exists
-    if os.path.exists(dir + '//' + file_name):
+    # Check if the file exists. If not (or if it is incomplete), download the file
+    if extent is not None:
+      status = fetch_OCEAN_subset(remote, dir, extent, pool, cache=cache, retry=retry)[1]
+    else:
+      status = fetch_OCEAN(remote, dir, pool, cache=cache, retry=retry)
+    if status == 'exists':
       print("")
       print('The file ' + dir + '/' + file_name + ' already exists.')
       print("")
     else:
-      # If not, download the file
-      print("Downloading the file...")
-      ftp.retrbinary("RETR " + file_name, open(dir + '//' + file_name, 'wb').write)  
       print("")
       print('\n---------------------')
       print('Download Finished.') 
@@ -454,14 +755,142 @@ def download_OCEAN(product, date, path_dest):
       # End the time counter
       print('\nTotal Download Time:', round((t.time() - start_time),2), 'seconds.') 
       print("")
-  except:
+  except DownloadError as e:
     print("\nFile not available!")
+    print(f'{type(e).__name__}: {e}')
     print("")
-
-  # Quit the FPT connection
-  ftp.quit()
+    return -1
 
   #-----------------------------------------------------------------------------------------------------------
   # Return the file name
   return f'{file_name}'
-  #-----------------------------------------------------------------------------------------------------------
\ No newline at end of file
+  #-----------------------------------------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------------------------------------
+# Batch download: fetches a list of (product, date) pairs in parallel, over a bounded thread pool. The number
+# of simultaneous sessions per FTP host is limited by the connection pool (FTPPool.max_per_host). When a host
+# is down, its circuit breaker opens (see utilities_retry) and its remaining requests fail at once.
+#-----------------------------------------------------------------------------------------------------------
+
+@dataclass
+class DownloadResult:
+  product: str             # Product name
+  date: str                # Requested date
+  file_name: str           # Local file name (None if the product / date could not be resolved)
+  status: str              # 'downloaded', 'exists' or 'failed'
+  error: Exception = None  # Error of a failed download
+  seconds: float = 0.0     # Wall time of the download
+
+def download_OCEAN_many(requests, path_dest, max_workers=4, pool=None, cache=None, extent=None, retry=None):
+
+  # Download directory
+  os.makedirs(path_dest, exist_ok=True)
+
+  # FTP connection pool
+  pool = pool or ftp_pool
+
+  def fetch(request):
+    product, date = request
+    start_time = t.time()
+    file_name = None
+    try:
+      remote = locate_OCEAN(resolve(product, date), pool, retry)
+      file_name = remote.file_name
+      if extent is not None:
+        file_name, status = fetch_OCEAN_subset(remote, path_dest, extent, pool, cache=cache, retry=retry)
+      else:
+        status = fetch_OCEAN(remote, path_dest, pool, cache=cache, retry=retry)
+      return DownloadResult(product, date, file_name, status, None, t.time() - start_time)
+    except Exception as e:
+      return DownloadResult(product, date, file_name, 'failed', e, t.time() - start_time)
+
+  # The results are returned in the same order as the requests
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    results = list(executor.map(fetch, requests))
+
+  # Summary
+  for status in ('downloaded', 'exists', 'failed'):
+    print(f'{status.capitalize()}: {sum(r.status == status for r in results)}')
+
+  return results
+
+#-----------------------------------------------------------------------------------------------------------
+# Date-range planner: the remote files of a product between a start and an end date (inclusive), one every
+# "step" periods of the product cadence (days, months or years), so the loops over dates do not build the
+# date strings by hand and can span years. The dates may be strings (YYYYMMDD or YYYYJJJ - julian day -, YYYYMM
+# or YYYY, only the digits needed by the cadence are used) or datetime / date objects.
+#-----------------------------------------------------------------------------------------------------------
+
+# Date formats accepted by the planner (by number of digits)
+PLAN_FORMATS = {4: '%Y', 6: '%Y%m', 7: '%Y%j', 8: '%Y%m%d'}
+
+def _plan_date(value):
+  if hasattr(value, 'year'):
+    return datetime(value.year, value.month, value.day)
+  value = str(value)
+  if len(value) not in PLAN_FORMATS or not value.isdigit():
+    raise ValueError(f'Invalid date: {value} (YYYY, YYYYMM, YYYYJJJ or YYYYMMDD)')
+  return datetime.strptime(value, PLAN_FORMATS[len(value)])
+
+def _add_periods(date, cadence, periods):
+  if cadence == 'daily':
+    return date + timedelta(days=periods)
+  if cadence == 'monthly':
+    months = date.year * 12 + date.month - 1 + periods
+    return datetime(months // 12, months % 12 + 1, 1)
+  return datetime(date.year + periods, 1, 1)
+
+# Function to yield the remote files (OceanFile, see resolve) of a product between "start" and "end"
+def plan_OCEAN(product, start, end, step=1):
+
+  if product not in OCEAN_PRODUCTS:
+    raise ValueError(f'Unknown product: {product}')
+  if step < 1:
+    raise ValueError(f'Invalid step: {step}')
+  cadence = OCEAN_PRODUCTS[product].cadence
+  date_format = CADENCE_FORMATS[cadence]
+
+  # First and last periods (e.g. the months of the dates, for the monthly products)
+  first = _plan_date(start).strftime(date_format)
+  last = _plan_date(end).strftime(date_format)
+  date = datetime.strptime(first, date_format)
+
+  periods = 0
+  while True:
+    current = _add_periods(date, cadence, periods).strftime(date_format)
+    if current > last:
+      return
+    yield resolve(product, current)
+    periods += step
+
+# Function to find the local file of a planned file in a set of local file names (None: not downloaded)
+def local_OCEAN(remote, local_files):
+  if remote.pattern is None:
+    return remote.file_name if remote.file_name in local_files else None
+  return newest_match(remote, local_files)
+
+# Gap detection: function to return the planned files (see plan_OCEAN) that are not in path_dest. The
+# directory is listed once, the remote server is not contacted and the local files are not verified.
+def missing_OCEAN(product, start, end, path_dest, step=1):
+
+  local_files = set(os.listdir(path_dest)) if os.path.isdir(path_dest) else set()
+  return [remote for remote in plan_OCEAN(product, start, end, step) if local_OCEAN(remote, local_files) is None]
+
+# Function to download the files of a product between "start" and "end" (only the missing files are
+# downloaded, in parallel, see download_OCEAN_many). The file names are returned in the same order as the
+# dates (-1 for the files that could not be downloaded).
+def download_OCEAN_range(product, start, end, path_dest, step=1, max_workers=4, pool=None, cache=None, retry=None):
+
+  plan = list(plan_OCEAN(product, start, end, step))
+
+  # Files already downloaded
+  local_files = set(os.listdir(path_dest)) if os.path.isdir(path_dest) else set()
+  file_names = {remote.date: local_OCEAN(remote, local_files) for remote in plan}
+
+  # Download the gaps
+  missing = [(remote.product, remote.date) for remote in plan if file_names[remote.date] is None]
+  if missing:
+    results = download_OCEAN_many(missing, path_dest, max_workers, pool, cache, retry=retry)
+    file_names.update({result.date: -1 if result.status == 'failed' else result.file_name for result in results})
+
+  return [file_names[remote.date] for remote in plan]
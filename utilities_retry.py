@@ -0,0 +1,130 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Download Errors and Retries
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import random                            # Random numbers (backoff jitter)
+import threading                         # Locks (threads of the same process)
+import time as t                         # Time access and conversion
+from dataclasses import dataclass        # Data classes
+
+#-----------------------------------------------------------------------------------------------------------
+# Download errors: the FTP (ftplib) and S3 (botocore) errors are translated to these classes, so the callers
+# can tell a missing file from a timeout, a refused login or a host that is down. "retryable" errors are
+# retried (see retry_call), the others are raised at once.
+#-----------------------------------------------------------------------------------------------------------
+
+class DownloadError(Exception):
+  retryable = False
+
+  def __init__(self, message, host=None, file_name=None):
+    super().__init__(message)
+    self.host = host             # Host of the failed request
+    self.file_name = file_name   # File of the failed request (None: listing, login, ...)
+
+# The file does not exist on the server (e.g. FTP 550, S3 404)
+class FileNotAvailable(DownloadError):
+  pass
+
+# The server refused the credentials (e.g. FTP 530, S3 403)
+class LoginRefused(DownloadError):
+  pass
+
+# The connection could not be opened or was lost, or the server answered with a temporary error
+class ConnectionFailed(DownloadError):
+  retryable = True
+
+# The server did not answer in time
+class TransferTimeout(ConnectionFailed):
+  pass
+
+# The host failed too many times in a row: the requests fail at once until the circuit is closed again
+class HostUnavailable(DownloadError):
+  pass
+
+#-----------------------------------------------------------------------------------------------------------
+# Retries with exponential backoff: the n-th retry waits a random time between 0 and
+# min(max_delay, base_delay * factor ** n) seconds ("full jitter"), so parallel downloads do not retry at the
+# same time.
+@dataclass
+class RetryPolicy:
+  attempts: int = 3              # Maximum number of attempts (1: no retries)
+  base_delay: float = 1.0        # Delay of the first retry (seconds)
+  factor: float = 2.0            # Delay multiplier of each retry
+  max_delay: float = 30.0        # Maximum delay (seconds)
+  jitter: bool = True            # Random delay between 0 and the backoff delay
+
+  def delay(self, retry):
+    delay = min(self.max_delay, self.base_delay * self.factor ** retry)
+    return random.uniform(0, delay) if self.jitter else delay
+
+#-----------------------------------------------------------------------------------------------------------
+# Per-host circuit breaker: after "failures" consecutive retryable failures of a host, the circuit "opens" and
+# the requests to the host fail at once (HostUnavailable) for "reset_after" seconds. Then one request is let
+# through ("half-open"): if it works the circuit is closed, otherwise it opens again.
+class CircuitBreaker:
+
+  def __init__(self, failures=5, reset_after=60):
+    self.failures = failures         # Consecutive failures that open the circuit
+    self.reset_after = reset_after   # Time (seconds) before a new request is let through
+    self._hosts = {}                 # Host: [consecutive failures, time the circuit opened (None: closed)]
+    self._lock = threading.Lock()
+
+  # Raise HostUnavailable if the circuit of the host is open
+  def check(self, host):
+    with self._lock:
+      failures, opened_at = self._hosts.get(host, (0, None))
+      if opened_at is None:
+        return
+      if t.monotonic() - opened_at < self.reset_after:
+        raise HostUnavailable(f'{host} is unavailable ({failures} consecutive failures), retry in {self.reset_after - (t.monotonic() - opened_at):.0f} s', host)
+      # Half-open: let this request through, the others wait for a new period
+      self._hosts[host] = [failures, t.monotonic()]
+
+  def success(self, host):
+    with self._lock:
+      self._hosts.pop(host, None)
+
+  def failure(self, host):
+    with self._lock:
+      state = self._hosts.setdefault(host, [0, None])
+      state[0] += 1
+      if state[0] >= self.failures:
+        state[1] = t.monotonic()
+
+  # State of a host: 'closed' or 'open'
+  def state(self, host):
+    with self._lock:
+      return 'closed' if self._hosts.get(host, (0, None))[1] is None else 'open'
+
+# Default policy and breaker, shared by all the downloads
+retry_policy = RetryPolicy()
+circuit_breaker = CircuitBreaker()
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to call "function" (which raises DownloadError subclasses) with retries and the circuit breaker of
+# "host". "on_retry" is called before each retry (e.g. to count the retries).
+def retry_call(function, host, policy=None, breaker=None, on_retry=None):
+
+  policy = policy or retry_policy
+  breaker = breaker or circuit_breaker
+
+  for attempt in range(policy.attempts):
+    breaker.check(host)
+    try:
+      result = function()
+    except DownloadError as e:
+      if not e.retryable:
+        # The host answered: the failure is not the host's fault
+        breaker.success(host)
+        raise
+      breaker.failure(host)
+      if attempt == policy.attempts - 1:
+        raise
+    else:
+      breaker.success(host)
+      return result
+    if on_retry is not None:
+      on_retry()
+    t.sleep(policy.delay(attempt))
@@ -0,0 +1,126 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Shapefile Geometry Cache
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import io                                # Core tools for working with streams (shapefiles in zip files)
+import pickle                            # Python object serialization (cached geometries)
+import hashlib                           # Secure hashes (cache file names)
+import threading                         # Lock of the geometry caches
+import zipfile                           # Work with ZIP archives
+import shapefile                         # Read shapefiles (pyshp, used by cartopy)
+from shapely import wkb                  # Well-known binary geometries (cached geometries)
+from shapely.geometry import shape       # Shapefile records to geometries
+from shapely.ops import clip_by_rect     # Clip the geometries to an extent
+
+#-----------------------------------------------------------------------------------------------------------
+# Shapefile geometry cache: the shapefiles added to the maps (e.g. the 10 m Natural Earth states, tens of MB,
+# and the METAREAS) are read once per process, instead of once per figure, and the geometries of a map are
+# clipped to its extent and simplified to its pixel size (a 10 m coastline has many vertices per pixel of a
+# continental map). The clipped and simplified geometries are also cached on disk (WKB, "SHAPE_CACHE"
+# environment variable: directory), by shapefile (path, size and modification time), extent and tolerance,
+# so the next runs do not read the shapefile at all. Shapefiles may be read from a zip file (e.g.
+# "Metareas.zip"), without unzipping it. Usage, instead of shpreader.Reader(...).geometries():
+#   shapefile = shape_geometries('ne_10m_admin_1_states_provinces.shp', extent, pixel_size(ax, extent))
+#   ax.add_geometries(shapefile, ccrs.PlateCarree(), edgecolor='gray',facecolor='none', linewidth=0.3)
+#-----------------------------------------------------------------------------------------------------------
+SHAPE_CACHE_PATH = os.environ.get('SHAPE_CACHE', os.path.expanduser('~/.cache/shapes'))
+
+# Function to read the shapes of a shapefile (".shp", or a ".zip" with the shapefile, "member": name of the
+# ".shp" in the zip file if it has more than one). Returns a list of shapefile.Shape (null shapes excluded)
+def read_shapefile(path, member=None):
+
+  if path.lower().endswith('.zip'):
+    with zipfile.ZipFile(path) as archive:
+      # Members of the shapefile, by extension (case insensitive)
+      names = {name.lower(): name for name in archive.namelist()}
+      shp = member or next((name for name in archive.namelist() if name.lower().endswith('.shp')), None)
+      if shp is None:
+        raise FileNotFoundError(f'No shapefile in {path}')
+      base = shp[:-4].lower()
+      files = {extension: io.BytesIO(archive.read(names[f'{base}.{extension}']))
+               for extension in ('shp', 'shx', 'dbf') if f'{base}.{extension}' in names}
+    reader = shapefile.Reader(**files)
+  else:
+    reader = shapefile.Reader(path)
+
+  try:
+    return [record for record in reader.iterShapes() if record.shapeType != shapefile.NULL]
+  finally:
+    reader.close()
+
+# Shapes of the shapefiles already read: (path, modification time, member): shapes
+_shapefiles = {}
+# Clipped and simplified geometries: (path, modification time, extent, tolerance): geometries
+_geometries = {}
+_shapes_lock = threading.Lock()
+
+# Function to get the shapes of a shapefile (read once per process, see read_shapefile)
+def shapefile_shapes(path, member=None):
+
+  key = (os.path.abspath(path), os.path.getmtime(path), member)
+  with _shapes_lock:
+    shapes = _shapefiles.get(key)
+  if shapes is None:
+    shapes = read_shapefile(path, member)
+    with _shapes_lock:
+      _shapefiles[key] = shapes
+  return shapes
+
+# Function to check if a shape (bounding box) intersects limits [min. lon, min. lat, max. lon, max. lat]
+def _intersects(record, limits):
+  bbox = record.bbox if hasattr(record, 'bbox') else record.points[0] * 2
+  return bbox[0] <= limits[2] and bbox[2] >= limits[0] and bbox[1] <= limits[3] and bbox[3] >= limits[1]
+
+#-----------------------------------------------------------------------------------------------------------
+# Function to get the size of a map pixel (degrees), e.g. the simplification tolerance of the geometries of a
+# map with this extent [min. lon, min. lat, max. lon, max. lat] on these axes
+def pixel_size(ax, extent):
+  box = ax.get_window_extent()
+  return min((extent[2] - extent[0]) / box.width, (extent[3] - extent[1]) / box.height)
+
+# Function to get the geometries of a shapefile within an extent [min. lon, min. lat, max. lon, max. lat]
+# (None: all the geometries), simplified with a tolerance (degrees, e.g. pixel_size, 0: no simplification).
+# The geometries are clipped with a margin (degrees) around the extent, so the clipped edges stay outside
+# the map. Returns a list of shapely geometries (cached in memory and on disk, "path_cache": directory)
+def shape_geometries(path, extent=None, tolerance=0.0, margin=1.0, member=None, path_cache=SHAPE_CACHE_PATH):
+
+  stat = os.stat(path)
+  limits = None if extent is None else (extent[0] - margin, extent[1] - margin, extent[2] + margin, extent[3] + margin)
+  key = (os.path.abspath(path), stat.st_size, stat.st_mtime, member, limits, float(tolerance))
+
+  with _shapes_lock:
+    geometries = _geometries.get(key)
+  if geometries is not None:
+    return geometries
+
+  file_name = None
+  if path_cache is not None:
+    file_name = f"{path_cache}/shapes_{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.pkl"
+  if file_name is not None and os.path.exists(file_name):
+    with open(file_name, 'rb') as f:
+      geometries = [wkb.loads(geometry) for geometry in pickle.load(f)]
+  else:
+    shapes = shapefile_shapes(path, member)
+    if limits is None:
+      geometries = [shape(record) for record in shapes]
+    else:
+      # Only the shapes that intersect the extent are converted to geometries (most of them are far away)
+      geometries = [clip_by_rect(shape(record), *limits) for record in shapes if _intersects(record, limits)]
+    if tolerance > 0:
+      geometries = [geometry.simplify(tolerance) for geometry in geometries]
+    geometries = [geometry for geometry in geometries if not geometry.is_empty]
+
+    if file_name is not None:
+      # Written to a temporary file and renamed (other processes may be reading the cache)
+      os.makedirs(path_cache, exist_ok=True)
+      tmp_name = file_name[:-4] + f'.{os.getpid()}.tmp'
+      with open(tmp_name, 'wb') as f:
+        pickle.dump([geometry.wkb for geometry in geometries], f, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp_name, file_name)
+
+  with _shapes_lock:
+    _geometries[key] = geometries
+  return geometries
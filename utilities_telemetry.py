@@ -0,0 +1,220 @@
+#-----------------------------------------------------------------------------------------------------------
+# INPE / CGCT / DISSM - Training: Oceanography Data Processing With Python - Transfer Telemetry
+# Author: Diego Souza (INPE / CGCT / DISSM)
+#-----------------------------------------------------------------------------------------------------------
+
+# Required modules
+import os                                # Miscellaneous operating system interfaces
+import json                              # JSON encoder and decoder (transfer manifest)
+import threading                         # Locks (threads of the same process)
+import time as t                         # Time access and conversion
+from collections import deque            # Recent transfers of the process
+from contextlib import contextmanager    # Context managers
+from dataclasses import dataclass, asdict # Data classes
+from datetime import datetime, timezone  # Basic Dates and time types
+
+#-----------------------------------------------------------------------------------------------------------
+# Transfer telemetry: every file requested from the NOAA FTP servers (download_OCEAN), from AWS S3
+# (download_CMI, download_PROD, download_GLM) or over HTTP (download_HTTP) produces one record, with the
+# bytes transferred, wall time, throughput, connect / login latency (FTP sessions opened by the transfer),
+# cache hit (no transfer needed) or miss, and retries. The records of the process are kept in memory and, if the "DOWNLOAD_TELEMETRY"
+# environment variable is set (manifest path), appended to a JSONL manifest (one JSON object per line),
+# shared by all the processes. The manifest is rotated (one ".1" backup) when it grows past "max_bytes".
+# The records can be exported in the Prometheus text format (e.g. for the node_exporter "textfile"
+# collector), so the throughput of each host can be followed over time.
+#-----------------------------------------------------------------------------------------------------------
+
+@dataclass
+class Transfer:
+  source: str                    # 'ftp', 's3' or 'http'
+  host: str                      # FTP host or S3 bucket host
+  product: str                   # Product name
+  file_name: str                 # Local file name
+  status: str = None             # 'downloaded', 'exists' or 'failed'
+  cache: str = None              # 'hit' (the file was already available) or 'miss'
+  bytes: int = 0                 # Bytes transferred
+  seconds: float = 0.0           # Wall time
+  connect_seconds: float = None  # Connect latency (None: no new connection)
+  login_seconds: float = None    # Login latency (None: no new connection)
+  retries: int = 0               # Retries of the transfer
+  error: str = None              # Error of a failed transfer
+  time: str = None               # Start of the transfer (UTC, ISO 8601)
+
+  # Throughput (bytes / second)
+  @property
+  def throughput(self):
+    return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+  def to_dict(self):
+    record = asdict(self)
+    record['throughput'] = round(self.throughput, 1)
+    return record
+
+class Telemetry:
+
+  def __init__(self, path=None, keep=1000, max_bytes=64e6):
+    self.path = path                     # JSONL manifest (None: records are only kept in memory)
+    self.recent = deque(maxlen=keep)     # Most recent transfers of this process
+    self.max_bytes = max_bytes           # Size of the manifest (bytes) after which it is rotated
+    self._lock = threading.Lock()
+    if path is not None:
+      os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+  #---------------------------------------------------------------------------------------------------------
+  # Measure a transfer: "with telemetry.transfer('ftp', host, product, file_name) as record: ...". The wall
+  # time is measured and the record is written when the block ends. An exception marks it as failed.
+  @contextmanager
+  def transfer(self, source, host, product, file_name):
+    record = Transfer(source, host, product, file_name, time=datetime.now(timezone.utc).isoformat(timespec='seconds'))
+    start_time = t.perf_counter()
+    try:
+      yield record
+    except BaseException as e:
+      record.status = 'failed'
+      record.error = repr(e)
+      raise
+    finally:
+      record.seconds = round(t.perf_counter() - start_time, 4)
+      self.record(record)
+
+  # Record a file that was already available (no transfer)
+  def hit(self, source, host, product, file_name):
+    self.record(Transfer(source, host, product, file_name, 'exists', 'hit',
+                         time=datetime.now(timezone.utc).isoformat(timespec='seconds')))
+
+  # Add a record to the manifest
+  def record(self, record):
+    line = json.dumps(record.to_dict()) + '\n'
+    with self._lock:
+      self.recent.append(record)
+      if self.path is not None:
+        # One write per record, in append mode, so the lines of several processes are not mixed
+        with open(self.path, 'a') as f:
+          f.write(line)
+          size = f.tell()
+        # Rotate the manifest (the previous backup is replaced)
+        if size > self.max_bytes:
+          try:
+            os.replace(self.path, self.path + '.1')
+          except FileNotFoundError:
+            # Already rotated by another process
+            pass
+
+  #---------------------------------------------------------------------------------------------------------
+  # Records of the manifest and its backup (or of this process, without a manifest), optionally since a
+  # given time. The manifest is read backwards, from the newest record, and the reading stops at the first
+  # record older than "since"
+  def history(self, since=None):
+    if since is not None:
+      since = since.isoformat(timespec='seconds') if isinstance(since, datetime) else since
+    if self.path is None:
+      return [record.to_dict() for record in self.recent if since is None or record.time >= since]
+    records = []
+    for path in (self.path, self.path + '.1'):
+      for line in _reversed_lines(path):
+        try:
+          record = json.loads(line)
+        except ValueError:
+          continue
+        if since is not None and record['time'] < since:
+          return records[::-1]
+        records.append(record)
+    return records[::-1]
+
+  # Totals per (source, host): transfers, failures, cache hits / misses, retries, bytes, seconds, throughput
+  def summary(self, records=None):
+    totals = {}
+    for record in (self.history() if records is None else records):
+      total = totals.setdefault((record['source'], record['host']),
+                                {'transfers': 0, 'failed': 0, 'hits': 0, 'misses': 0, 'retries': 0,
+                                 'bytes': 0, 'seconds': 0.0, 'connections': 0, 'connect_seconds': 0.0,
+                                 'login_seconds': 0.0})
+      total['transfers'] += 1
+      total['failed'] += record['status'] == 'failed'
+      total['hits'] += record['cache'] == 'hit'
+      total['misses'] += record['cache'] == 'miss'
+      total['retries'] += record['retries']
+      if record['connect_seconds'] is not None:
+        total['connections'] += 1
+        total['connect_seconds'] += record['connect_seconds']
+        total['login_seconds'] += record['login_seconds'] or 0.0
+      # Throughput of the actual downloads only
+      if record['status'] == 'downloaded':
+        total['bytes'] += record['bytes']
+        total['seconds'] += record['seconds']
+    for total in totals.values():
+      total['throughput'] = total['bytes'] / total['seconds'] if total['seconds'] > 0 else 0.0
+    return totals
+
+  # Prometheus text format of the totals (see summary)
+  def prometheus(self, records=None):
+    metrics = [('transfers', 'transfers_total', 'counter', 'Files requested'),
+               ('failed', 'failures_total', 'counter', 'Failed transfers'),
+               ('hits', 'cache_hits_total', 'counter', 'Files already available (no transfer)'),
+               ('misses', 'cache_misses_total', 'counter', 'Files transferred'),
+               ('retries', 'retries_total', 'counter', 'Retries'),
+               ('bytes', 'bytes_total', 'counter', 'Bytes downloaded'),
+               ('seconds', 'seconds_total', 'counter', 'Wall time of the downloads (seconds)'),
+               ('connections', 'connections_total', 'counter', 'Connections opened'),
+               ('connect_seconds', 'connect_seconds_total', 'counter', 'Connect latency (seconds)'),
+               ('login_seconds', 'login_seconds_total', 'counter', 'Login latency (seconds)'),
+               ('throughput', 'throughput_bytes_per_second', 'gauge', 'Average download throughput (bytes / second)')]
+    totals = self.summary(records)
+    lines = []
+    for key, name, kind, description in metrics:
+      lines.append(f'# HELP download_{name} {description}')
+      lines.append(f'# TYPE download_{name} {kind}')
+      for (source, host), total in sorted(totals.items()):
+        lines.append(f'download_{name}{{source="{source}",host="{host}"}} {total[key]}')
+    return '\n'.join(lines) + '\n'
+
+  # Write the Prometheus text format to a file (written to a temporary file and renamed)
+  def write_prometheus(self, path, records=None):
+    tmp_path = path + f'.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+      f.write(self.prometheus(records))
+    os.replace(tmp_path, path)
+
+# Function to yield the lines of a file from the last one to the first (nothing if the file does not exist)
+def _reversed_lines(path, block_size=65536):
+  try:
+    f = open(path, 'rb')
+  except FileNotFoundError:
+    return
+  with f:
+    position = f.seek(0, os.SEEK_END)
+    head = b''
+    while position > 0:
+      size = min(block_size, position)
+      position -= size
+      f.seek(position)
+      lines = (f.read(size) + head).split(b'\n')
+      # The first line may continue in the previous block
+      head = lines.pop(0)
+      for line in reversed(lines):
+        if line:
+          yield line.decode()
+    if head:
+      yield head.decode()
+
+#-----------------------------------------------------------------------------------------------------------
+# Default telemetry, shared by all the downloads ("DOWNLOAD_TELEMETRY" environment variable: manifest path,
+# not set: the records are only kept in memory, e.g. DOWNLOAD_TELEMETRY=~/.cache/download_telemetry.jsonl)
+TELEMETRY_PATH = os.environ.get('DOWNLOAD_TELEMETRY')
+if TELEMETRY_PATH is not None:
+  TELEMETRY_PATH = os.path.expanduser(TELEMETRY_PATH)
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry():
+  global _telemetry
+  with _telemetry_lock:
+    if _telemetry is None:
+      _telemetry = Telemetry(TELEMETRY_PATH)
+    return _telemetry
+
+# Use another telemetry (e.g. Telemetry('downloads.jsonl') to write the records to a manifest)
+def set_telemetry(telemetry):
+  global _telemetry
+  with _telemetry_lock:
+    _telemetry = telemetry